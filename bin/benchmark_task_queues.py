@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+"""
+Benchmark the queue wait time of fast tasks under a flood of slow tasks.
+
+Requires a running broker and workers, e.g.:
+    ./celery_worker.sh celery pulls stacks sync
+    ./celery_worker.sh containers
+
+Usage:
+    python bin/benchmark_task_queues.py                 # fast tasks on their dedicated queue
+    python bin/benchmark_task_queues.py --single-queue  # all tasks on the default queue (before)
+
+Slow tasks (long_running_task) are sent to the 'sync' queue, fast tasks (echo_task) to the 'containers' queue.
+With --single-queue, both are sent to the default queue and the fast tasks wait behind the slow tasks.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from kontainer.celery import CELERY_QUEUE_DEFAULT, CELERY_QUEUE_CONTAINERS, CELERY_QUEUE_SYNC  # noqa: E402
+from kontainer.admin.tasks import long_running_task, echo_task  # noqa: E402
+
+
+def percentile(values: list, p: float) -> float:
+    values = sorted(values)
+    return values[min(int(len(values) * p), len(values) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--slow", type=int, default=20, help="Number of slow tasks")
+    parser.add_argument("--slow-seconds", type=int, default=10, help="Duration of each slow task")
+    parser.add_argument("--fast", type=int, default=50, help="Number of fast tasks")
+    parser.add_argument("--single-queue", action="store_true", help="Send all tasks to the default queue")
+    parser.add_argument("--timeout", type=int, default=600, help="Max seconds to wait for the fast tasks")
+    args = parser.parse_args()
+
+    slow_queue = CELERY_QUEUE_DEFAULT if args.single_queue else CELERY_QUEUE_SYNC
+    fast_queue = CELERY_QUEUE_DEFAULT if args.single_queue else CELERY_QUEUE_CONTAINERS
+
+    print(f"Sending {args.slow} slow tasks ({args.slow_seconds}s) to queue '{slow_queue}'")
+    slow_results = [long_running_task.apply_async(args=[args.slow_seconds], queue=slow_queue) for _ in range(args.slow)]
+    time.sleep(1)
+
+    print(f"Sending {args.fast} fast tasks to queue '{fast_queue}'")
+    pending = dict()
+    for i in range(args.fast):
+        pending[echo_task.apply_async(args=[f"ping {i}"], queue=fast_queue)] = time.time()
+
+    latencies = []
+    deadline = time.time() + args.timeout
+    while pending and time.time() < deadline:
+        for result in list(pending):
+            if result.ready():
+                latencies.append(time.time() - pending.pop(result))
+        time.sleep(0.05)
+
+    for result in slow_results:
+        result.revoke(terminate=True)
+
+    if pending:
+        print(f"{len(pending)} fast tasks did not finish within {args.timeout}s")
+    if latencies:
+        print(f"Fast task latency (submit -> result) of {len(latencies)} tasks:")
+        print(f"  p50: {statistics.median(latencies):.3f}s")
+        print(f"  p95: {percentile(latencies, 0.95):.3f}s")
+        print(f"  max: {max(latencies):.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -28,6 +28,17 @@ GROUP=$(whoami)
 # how many worker processes should Gunicorn spawn
 NUM_WORKERS=${KONTAINER_WORKERS:-3}
 
+# the local task executor keeps task results and events in memory of the web process,
+# other worker processes would not see them
+if [ "${KONTAINER_TASK_EXECUTOR:-celery}" = "local" ] && [ "${NUM_WORKERS}" != "1" ]; then
+  echo "KONTAINER_TASK_EXECUTOR=local requires a single worker process, ignoring KONTAINER_WORKERS=${NUM_WORKERS}"
+  NUM_WORKERS=1
+fi
+
+# how many threads per worker process
+# long-lived requests (task event streams) occupy a thread each
+NUM_THREADS=${KONTAINER_THREADS:-16}
+
 # Gunicorn log level
 LOG_LEVEL=${LOG_LEVEL:-info}
 LOG_FILE=${LOG_FILE:--}
@@ -49,6 +60,8 @@ exec gunicorn ${WSGI_APP} \
   --capture-output \
   --name ${NAME} \
   --workers ${NUM_WORKERS} \
+  --worker-class gthread \
+  --threads ${NUM_THREADS} \
   --bind=${BIND} \
   --log-level=${LOG_LEVEL} \
   --log-file=${LOG_FILE}
@@ -0,0 +1,24 @@
+#!/bin/bash
+#
+# Start celery beat, which schedules the periodic jobs (see src/kontainer/jobs.py)
+#
+# Run exactly one beat process per installation. The jobs are run by the celery workers (queue 'celery').
+# The schedules are configured with the KONTAINER_JOB_*_SCHEDULE environment variables.
+
+CELERY=$(which celery)
+
+echo "Initialize celery beat as $(whoami)"
+echo "Found celery at: $CELERY"
+sleep 3
+
+# Add src/ to PYTHONPATH
+export PYTHONPATH=$PYTHONPATH:$(pwd)/src
+echo "PYTHONPATH: $PYTHONPATH"
+
+SCHEDULE_FILE=${KONTAINER_DATA_DIR:-./data}/celerybeat-schedule
+mkdir -p "$(dirname "$SCHEDULE_FILE")"
+
+echo "Starting celery beat (schedule: $SCHEDULE_FILE) ..."
+$CELERY -A main.celery beat --loglevel=INFO --schedule "$SCHEDULE_FILE"
+
+echo "Celery beat exited"
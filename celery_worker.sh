@@ -1,4 +1,20 @@
 #!/bin/bash
+#
+# Start a celery worker
+#
+# Usage:
+#   celery_worker.sh                  # one worker for all queues
+#   celery_worker.sh containers       # dedicated worker for fast container actions
+#   celery_worker.sh pulls stacks     # one worker for the given queues
+#   celery_worker.sh --context prod1 --context prod2 containers stacks
+#                                     # dedicated worker for the queues of isolated contexts
+#
+# Queues: celery (default), containers, pulls, stacks, sync (see src/kontainer/celery.py)
+# Tasks of isolated contexts (KONTAINER_ISOLATED_CONTEXTS) are routed to per-context queues,
+# e.g. 'containers.prod1', which are only consumed by workers started with --context.
+#
+# Environment:
+#   CELERY_WORKER_CONCURRENCY  Number of worker processes (default: depends on the queues)
 
 CELERY=$(which celery)
 
@@ -11,7 +27,63 @@ echo "PYTHONPATH: $PYTHONPATH"
 export PYTHONPATH=$PYTHONPATH:$(pwd)/src
 echo "PYTHONPATH: $PYTHONPATH"
 
-echo "Starting celery worker ..."
-$CELERY -A main.celery worker --loglevel=INFO
+CONTEXTS=""
+ARGS=()
+while [ $# -gt 0 ]; do
+  case "$1" in
+    --context) CONTEXTS="$CONTEXTS $2"; shift 2 ;;
+    --context=*) CONTEXTS="$CONTEXTS ${1#--context=}"; shift ;;
+    *) ARGS+=("$1"); shift ;;
+  esac
+done
+
+ALL_QUEUES="celery containers pulls stacks sync"
+CONTEXT_QUEUES="containers pulls stacks sync"
+if [ -n "$CONTEXTS" ]; then
+  QUEUES=${ARGS[*]:-$CONTEXT_QUEUES}
+else
+  QUEUES=${ARGS[*]:-$ALL_QUEUES}
+fi
+
+# Default concurrency per queue
+# Container actions are short and mostly wait for the docker daemon, so run more of them in parallel.
+concurrency_for_queue() {
+  case "$1" in
+    containers) echo 8 ;;
+    pulls) echo 2 ;;
+    stacks) echo 2 ;;
+    sync) echo 2 ;;
+    *) echo 2 ;;
+  esac
+}
+
+CONCURRENCY=${CELERY_WORKER_CONCURRENCY:-}
+if [ -z "$CONCURRENCY" ]; then
+  CONCURRENCY=0
+  for QUEUE in $QUEUES; do
+    CONCURRENCY=$((CONCURRENCY + $(concurrency_for_queue "$QUEUE")))
+  done
+fi
+
+WORKER_NAME=$(echo "$QUEUES" | tr ' ' '-')
+WORKER_QUEUES=$QUEUES
+if [ -n "$CONTEXTS" ]; then
+  # consume the per-context queues and connect to the contexts when the worker processes start
+  WORKER_QUEUES=""
+  for CTX in $CONTEXTS; do
+    for QUEUE in $QUEUES; do
+      WORKER_QUEUES="$WORKER_QUEUES $QUEUE.$CTX"
+    done
+  done
+  WORKER_QUEUES=$(echo $WORKER_QUEUES)
+  export KONTAINER_WORKER_CONTEXTS=$(echo $CONTEXTS | tr ' ' ',')
+  WORKER_NAME="$(echo $CONTEXTS | tr ' ' '-')-$WORKER_NAME"
+fi
+
+echo "Starting celery worker for queues: $WORKER_QUEUES (concurrency: $CONCURRENCY) ..."
+$CELERY -A main.celery worker --loglevel=INFO \
+  --queues "$(echo "$WORKER_QUEUES" | tr ' ' ',')" \
+  --concurrency "$CONCURRENCY" \
+  --hostname "${WORKER_NAME}@%h"
 
 echo "Celery worker exited"
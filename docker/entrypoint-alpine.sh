@@ -149,6 +149,11 @@ case $1 in
     ;;
 
 
+  "celery-beat")
+    exec /app/celery_beat.sh
+    ;;
+
+
   *)
     echo "Executing arbitrary command: $@"
     # exec su -c "$@" $KUSER
@@ -72,8 +72,17 @@ USER=$(whoami)
 GROUP=$(whoami)
 WSGI_APP=wsgi:app
 NUM_WORKERS=${KONTAINER_WORKERS:-3}
+# long-lived requests (task event streams, ?wait=) occupy a thread each, not a whole worker process
+NUM_THREADS=${KONTAINER_THREADS:-16}
 LOG_LEVEL=${LOG_LEVEL:-info}
 
+# the local task executor keeps task results and events in memory of the web process,
+# other worker processes would not see them
+if [ "${KONTAINER_TASK_EXECUTOR:-celery}" = "local" ] && [ "${NUM_WORKERS}" != "1" ]; then
+  echo "KONTAINER_TASK_EXECUTOR=local requires a single worker process, ignoring KONTAINER_WORKERS=${NUM_WORKERS}"
+  NUM_WORKERS=1
+fi
+
 case $1 in
 
   "devserver")
@@ -98,6 +107,8 @@ case $1 in
     exec gunicorn ${WSGI_APP} \
       --name ${NAME} \
       --workers ${NUM_WORKERS} \
+      --worker-class gthread \
+      --threads ${NUM_THREADS} \
       --bind=${BIND} \
       --log-level=${LOG_LEVEL} \
       --log-file=-
@@ -113,6 +124,8 @@ case $1 in
     exec gunicorn ${WSGI_APP} \
       --name ${NAME} \
       --workers ${NUM_WORKERS} \
+      --worker-class gthread \
+      --threads ${NUM_THREADS} \
       --bind=${BIND} \
       --log-level=${LOG_LEVEL} \
       --log-file=-
@@ -124,6 +137,11 @@ case $1 in
     exec /app/celery_worker.sh
     ;;
 
+  "celery-beat")
+    echo "Starting celery beat ..."
+    exec /app/celery_beat.sh
+    ;;
+
   *)
     echo "Executing arbitrary command: $@"
     # exec su -c "$@" $KUSER
@@ -9,6 +9,8 @@ from kontainer.celery import celery
 from kontainer.admin.tasks import *
 from kontainer.docker.tasks import *
 from kontainer.stacks.tasks import *
+from kontainer.environments.tasks import *
+from kontainer.jobs import periodic_job_task
 
 
 if __name__ == '__main__':
@@ -0,0 +1,153 @@
+import os
+import re
+
+from kontainer.util.download_util import download_cached
+from kontainer.util.jsonscan_util import iter_json_array_entries, read_json_entry
+
+# Portainer app template catalogs
+# https://docs.portainer.io/advanced/app-templates/format
+#
+# Catalogs are downloaded through the download cache and scanned incrementally.
+# The index (template name -> byte offset and length of the entry) is cached per catalog file and mtime,
+# so only the selected entry is parsed when a stack is created from a catalog.
+
+PORTAINER_TEMPLATE_TYPE_CONTAINER = 1
+PORTAINER_TEMPLATE_TYPE_SWARM_STACK = 2
+PORTAINER_TEMPLATE_TYPE_COMPOSE_STACK = 3
+
+portainer_index_cache = {}
+
+
+def _catalog_array_key(catalog_file: str) -> str | None:
+    """
+    Version 1 catalogs are a plain array of templates, version 2 and 3 catalogs have a 'templates' array.
+    """
+    with open(catalog_file, "rb") as f:
+        head = f.read(1024).lstrip()
+    return None if head.startswith(b"[") else "templates"
+
+
+def get_portainer_catalog_index(catalog_file: str) -> dict:
+    """
+    Get the index of a portainer catalog file.
+    The catalog is only scanned again, if the file has changed.
+
+    Templates are indexed by 'name' and 'title'. If a name is used more than once, the first template wins.
+
+    :param catalog_file: Path to the catalog file
+    :return: Dictionary of template name -> (offset, length)
+    """
+    st = os.stat(catalog_file)
+    cached = portainer_index_cache.get(catalog_file)
+    if cached is not None and cached[0] == (st.st_mtime_ns, st.st_size):
+        return cached[1]
+
+    index = dict()
+    for offset, length, entry in iter_json_array_entries(catalog_file, _catalog_array_key(catalog_file)):
+        if not isinstance(entry, dict):
+            continue
+        for key in ("name", "title"):
+            name = entry.get(key, None)
+            if isinstance(name, str) and name not in index:
+                index[name] = (offset, length)
+
+    portainer_index_cache[catalog_file] = ((st.st_mtime_ns, st.st_size), index)
+    return index
+
+
+def load_portainer_template(template_url: str, template_name: str) -> dict:
+    """
+    Load a single template from a portainer catalog url.
+
+    :param template_url: Url of the catalog
+    :param template_name: Name or title of the template
+    :return: The template entry
+    """
+    catalog_file = download_cached(template_url)
+    index = get_portainer_catalog_index(catalog_file)
+    if template_name not in index:
+        raise ValueError(f"Template {template_name} not found in {template_url}")
+
+    offset, length = index[template_name]
+    return read_json_entry(catalog_file, offset, length)
+
+
+def _get_env_value(env: dict, parameters: dict) -> str:
+    name = env.get("name")
+    # preset variables are not editable in portainer
+    if name in parameters and not env.get("preset", False):
+        return str(parameters[name])
+    if env.get("default", None) is not None:
+        return str(env.get("default"))
+    for option in env.get("select", []) or []:
+        if option.get("default", False):
+            return str(option.get("value", ""))
+    return ""
+
+
+def portainer_container_to_compose(template: dict, parameters=None) -> dict:
+    """
+    Convert a portainer container template (type 1) to compose data.
+
+    :param template: The template entry
+    :param parameters: Values for the template env variables (name -> value)
+    :return: Compose data
+    """
+    if parameters is None:
+        parameters = dict()
+
+    image = template.get("image", None)
+    if not image:
+        raise ValueError("Container template has no image")
+
+    service_name = template.get("name", None) or template.get("title", None) or "app"
+    service_name = re.sub(r"[^a-z0-9_-]+", "-", service_name.lower()).strip("-") or "app"
+
+    service = {"image": image}
+    volumes = dict()
+
+    if template.get("command", None):
+        service["command"] = template.get("command")
+    if template.get("hostname", None):
+        service["hostname"] = template.get("hostname")
+    if template.get("network", None):
+        service["network_mode"] = template.get("network")
+    if template.get("restart_policy", None):
+        service["restart"] = template.get("restart_policy")
+    if template.get("privileged", False):
+        service["privileged"] = True
+    if template.get("interactive", False):
+        service["stdin_open"] = True
+        service["tty"] = True
+    if template.get("ports", None):
+        service["ports"] = [str(port) for port in template.get("ports")]
+
+    env = [e for e in template.get("env", []) or [] if isinstance(e, dict) and e.get("name")]
+    if env:
+        service["environment"] = {e["name"]: _get_env_value(e, parameters) for e in env}
+
+    labels = [label for label in template.get("labels", []) or [] if isinstance(label, dict) and label.get("name")]
+    if labels:
+        service["labels"] = {label["name"]: str(label.get("value", "")) for label in labels}
+
+    service_volumes = []
+    for i, volume in enumerate(template.get("volumes", []) or []):
+        container_path = volume.get("container", None)
+        if not container_path:
+            continue
+        source = volume.get("bind", None)
+        if not source:
+            # unnamed portainer volumes become named volumes, so they survive re-creation of the stack
+            source = f"{service_name}-data{i}"
+            volumes[source] = dict()
+        mount = f"{source}:{container_path}"
+        if volume.get("readonly", False):
+            mount += ":ro"
+        service_volumes.append(mount)
+    if service_volumes:
+        service["volumes"] = service_volumes
+
+    compose_data = {"services": {service_name: service}}
+    if volumes:
+        compose_data["volumes"] = volumes
+    return compose_data
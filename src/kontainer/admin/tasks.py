@@ -1,22 +1,25 @@
 import time
 
 from kontainer.celery import celery
+from kontainer.taskevents import report_progress
+from kontainer.taskexecutor import get_task_executor
 
 
 def resolve_task(task_name: str, data: dict):
     """
-    Resolve a task name to a Celery task function.
+    Resolve a task name to a Celery task function and submit it with the configured task executor.
 
     Currently only a small hard-coded list of tasks is supported.
 
     :param task_name: The name of the task to resolve.
+    :return: The task id or None, if the task is unknown
     """
     if task_name == 'long_running_task':
         duration = data.get('duration', '10')
-        return long_running_task.apply_async(args=[duration])
+        return get_task_executor().submit(long_running_task, args=[duration])
     elif task_name == 'echo_task':
         message = data.get('message', None)
-        return echo_task.apply_async(args=[message])
+        return get_task_executor().submit(echo_task, args=[message])
 
 
 @celery.task(bind=True)
@@ -24,7 +27,7 @@ def long_running_task(self, duration):
     """A simple task that simulates a long-running process."""
     for i in range(duration):
         time.sleep(1)  # Simulate work
-        self.update_state(state='PROGRESS', meta={'current': i + 1, 'total': duration})
+        report_progress(self, i + 1, duration)
     return {'status': 'Task completed!', 'duration': duration}
 
 
@@ -2,27 +2,39 @@ import json
 import os.path
 from os import scandir
 
-import requests
-
 from kontainer import settings
+from kontainer.util.download_util import download_cached
+from kontainer.util.gitmirror_util import git_cached_checkout
 
 TEMPLATES_DIR = os.path.join(settings.KONTAINER_DATA_DIR, 'templates')
 TEMPLATES_FILE_SUFFIX = '.templates.json'
+COMPOSE_FILE_NAMES = ('docker-compose.yml', 'docker-compose.yaml', 'compose.yml', 'compose.yaml')
+
+template_names_cache = None
+template_catalog_cache = {}
 
 def find_templates() -> list:
     """
     Find all templates in the templates directory.
     Look for all files with a .json extension in the templates directory and return a list of template names.
 
+    The list is cached until the templates directory changes (files added, renamed or removed).
+
     :return: List of template names
     """
-    templates = []
+    global template_names_cache
     os.makedirs(TEMPLATES_DIR, exist_ok=True)
+    dir_mtime = os.stat(TEMPLATES_DIR).st_mtime_ns
+    if template_names_cache is not None and template_names_cache[0] == dir_mtime:
+        return list(template_names_cache[1])
+
+    templates = []
     for entry in scandir(TEMPLATES_DIR):
         if entry.is_file() and entry.name.endswith(TEMPLATES_FILE_SUFFIX):
             templates.append(entry.name.replace(TEMPLATES_FILE_SUFFIX, ''))
 
-    return templates
+    template_names_cache = (dir_mtime, sorted(templates))
+    return list(template_names_cache[1])
 
 
 def write_template(name: str, content: str) -> str:
@@ -55,12 +67,11 @@ def download_template(name: str, url: str) -> str:
     :param url: URL to download the content from
     :return: Path to the new template file
     """
-    try:
-        content = requests.get(url).content
-        if not content or len(content) == 0:
-            raise Exception(f"Failed to download content from {url}")
-    except Exception as e:
-        raise e
+    cached_file = download_cached(url)
+    with open(cached_file, 'r') as f:
+        content = f.read()
+    if not content:
+        raise Exception(f"Failed to download content from {url}")
     return write_template(name, content)
 
 
@@ -83,12 +94,174 @@ def load_template(name: str) -> dict:
     """
     Load the contents of a template as dictionary
 
+    The parsed template is cached per file mtime. Do not modify the returned dictionary.
+
     :param name: Name of the template
     :return: Template content as a dictionary
     """
+    return get_template_catalog(name).data
+
+
+class TemplateCatalog:
+    """
+    Parsed template file with an index of its entries.
+
+    Portainer-style catalogs ({"version": "2", "templates": [...]}) have one entry per template,
+    any other template file is a single entry.
+
+    Attributes:
+        name (str): Name of the template file.
+        data (dict|list): Parsed template file.
+        entries (list): Full template entries.
+        index (list): Entry metadata (id, title, categories, image, type, ...), in the order of the entries.
+    """
+
+    META_KEYS = ('title', 'name', 'description', 'categories', 'image', 'type', 'logo', 'platform')
+
+    def __init__(self, name: str, data):
+        self.name = name
+        self.data = data
+
+        if isinstance(data, dict) and isinstance(data.get('templates', None), list):
+            self.entries = data['templates']
+        elif isinstance(data, list):
+            self.entries = data
+        else:
+            self.entries = [data]
+
+        self.index = []
+        self._search_text = []
+        for i, entry in enumerate(self.entries):
+            if not isinstance(entry, dict):
+                entry = {}
+            meta = {key: entry.get(key) for key in self.META_KEYS if entry.get(key) is not None}
+            # categories: null, a single category string or a list (non-string items are ignored)
+            categories = entry.get('categories', None)
+            if isinstance(categories, str):
+                categories = [categories]
+            elif not isinstance(categories, list):
+                categories = []
+            meta['categories'] = [c for c in categories if isinstance(c, str)]
+            meta['id'] = f"{name}:{i}"
+            meta['catalog'] = name
+            self.index.append(meta)
+            self._search_text.append(" ".join(str(meta.get(key, ''))
+                                              for key in ('title', 'name', 'description', 'image')).lower())
+
+    def search(self, q=None, category=None) -> list:
+        """
+        Find entries by search text and category.
+
+        :param q: Case insensitive text to find in title, name, description and image
+        :param category: Category of the entry
+        :return: List of entry metadata
+        """
+        q = q.lower() if q else None
+        category = category.lower() if category else None
+        results = []
+        for meta, text in zip(self.index, self._search_text):
+            if q is not None and q not in text:
+                continue
+            if category is not None and category not in (c.lower() for c in meta['categories']):
+                continue
+            results.append(meta)
+        return results
+
+
+def get_template_catalog(name: str) -> TemplateCatalog:
+    """
+    Get the parsed template file with its entry index.
+    The template file is only parsed again, if it has changed.
+
+    :param name: Name of the template
+    :return: TemplateCatalog instance
+    """
     template_file = os.path.join(TEMPLATES_DIR, f"{name}{TEMPLATES_FILE_SUFFIX}")
-    if not os.path.exists(template_file):
+    try:
+        st = os.stat(template_file)
+    except FileNotFoundError:
         raise FileNotFoundError(f"Template {name} not found")
 
+    cached = template_catalog_cache.get(name)
+    if cached is not None and cached[0] == (st.st_mtime_ns, st.st_size):
+        return cached[1]
+
     with open(template_file, 'r') as f:
-        return json.load(f)
\ No newline at end of file
+        catalog = TemplateCatalog(name, json.load(f))
+    template_catalog_cache[name] = ((st.st_mtime_ns, st.st_size), catalog)
+    return catalog
+
+
+def search_templates(q=None, category=None, page=1, limit=50) -> dict:
+    """
+    Search the entries of all template files.
+
+    :param q: Case insensitive text to find in title, name, description and image
+    :param category: Category of the entries
+    :param page: Page number, starting at 1
+    :param limit: Entries per page
+    :return: Dictionary with the entry metadata of the page ('items'), 'total', 'page', 'limit' and 'categories'
+    """
+    results = []
+    categories = set()
+    for name in find_templates():
+        try:
+            catalog = get_template_catalog(name)
+        except Exception as e:
+            print(f"Failed to load template {name}: {e}")
+            continue
+        results.extend(catalog.search(q, category))
+        for meta in catalog.index:
+            categories.update(meta['categories'])
+
+    page = max(int(page), 1)
+    limit = max(int(limit), 1)
+    start = (page - 1) * limit
+    return {
+        'items': [dict(meta) for meta in results[start:start + limit]],
+        'total': len(results),
+        'page': page,
+        'limit': limit,
+        'categories': sorted(categories),
+    }
+
+
+def get_template_entry(entry_id: str) -> dict:
+    """
+    Get a full template entry by its id ('<template name>:<index>').
+
+    :param entry_id: Entry id
+    :return: Template entry
+    """
+    name, _, index = entry_id.rpartition(':')
+    catalog = get_template_catalog(name)
+    if not index.isdigit() or int(index) >= len(catalog.entries):
+        raise KeyError(f"Template entry {entry_id} not found")
+    return catalog.entries[int(index)]
+
+
+def find_repo_templates(repo_url: str, ref=None, private_key_file=None) -> list:
+    """
+    Find all stack templates in a git repository.
+    A stack template is a directory containing a compose file.
+
+    The repository is read from the shared checkout, which is also used to create stacks from the templates.
+
+    :param repo_url: Repository url
+    :param ref: Branch, tag or commit (default: the default branch of the repository)
+    :param private_key_file: Optional path to the SSH private key
+    :return: List of template names (directories relative to the repository root)
+    """
+    templates = []
+    with git_cached_checkout(repo_url,
+                             ref or 'HEAD',
+                             private_key_file=private_key_file,
+                             max_age=settings.KONTAINER_TEMPLATE_REPO_MAX_AGE) as checkout_dir:
+        for root, dirs, files in os.walk(checkout_dir):
+            dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+            if any(name in files for name in COMPOSE_FILE_NAMES):
+                templates.append(os.path.relpath(root, checkout_dir))
+                # templates are not nested
+                dirs[:] = []
+
+    return templates
@@ -1,7 +1,92 @@
 from celery import Celery
+from celery.app.routes import MapRoute
 
+from . import settings
 from .app import app
 
 # Initialize Celery
 celery = Celery(app.name, broker=app.config['CELERY_BROKER_URL'])
 celery.conf.update(app.config)
+
+# Task queues
+# Slow tasks (builds, pulls, git clones) must not delay fast container actions,
+# so tasks are routed to dedicated queues, which can be consumed by dedicated workers (see celery_worker.sh).
+#
+# containers: fast container actions (start, stop, restart, ...)
+# pulls:      image pulls and registry logins
+# stacks:     stack lifecycle (create, start, stop, restart, delete, destroy)
+# sync:       git syncs of stacks and repositories
+# celery:     everything else (default queue)
+#
+# Docker and stack tasks of isolated contexts (KONTAINER_ISOLATED_CONTEXTS) are routed to
+# per-context queues, e.g. 'containers.prod1', see route_task_by_context().
+CELERY_QUEUE_DEFAULT = "celery"
+CELERY_QUEUE_CONTAINERS = "containers"
+CELERY_QUEUE_PULLS = "pulls"
+CELERY_QUEUE_STACKS = "stacks"
+CELERY_QUEUE_SYNC = "sync"
+CELERY_QUEUES = [CELERY_QUEUE_DEFAULT, CELERY_QUEUE_CONTAINERS, CELERY_QUEUE_PULLS, CELERY_QUEUE_STACKS, CELERY_QUEUE_SYNC]
+
+# Priorities within a queue: 0 (highest) - 9 (lowest)
+CELERY_TASK_ROUTES = {
+    "kontainer.docker.tasks.container_*": {"queue": CELERY_QUEUE_CONTAINERS, "priority": 0},
+    "kontainer.docker.tasks.image_pull_task": {"queue": CELERY_QUEUE_PULLS, "priority": 6},
+    "kontainer.docker.tasks.registry_login_task": {"queue": CELERY_QUEUE_PULLS, "priority": 3},
+    "kontainer.stacks.tasks.stack_sync_task": {"queue": CELERY_QUEUE_SYNC, "priority": 6},
+    "kontainer.stacks.tasks.repository_sync_task": {"queue": CELERY_QUEUE_SYNC, "priority": 6},
+    "kontainer.stacks.tasks.*": {"queue": CELERY_QUEUE_STACKS, "priority": 3},
+}
+_map_route = MapRoute(CELERY_TASK_ROUTES)
+
+
+def get_context_queue(queue: str, ctx_id: str) -> str:
+    """
+    Get the name of the dedicated queue of a context, e.g. 'containers.prod1'
+
+    :param queue: The base queue name
+    :param ctx_id: The context id
+    :return: The queue name
+    """
+    return f"{queue}.{ctx_id}"
+
+
+def route_task_by_context(name, args, kwargs, options, task=None, **kw):
+    """
+    Route the tasks of isolated contexts (KONTAINER_ISOLATED_CONTEXTS) to dedicated queues,
+    so a slow remote host can not block the tasks of other contexts.
+
+    Docker and stack tasks take the context id as the first argument.
+    """
+    if not settings.KONTAINER_ISOLATED_CONTEXTS:
+        return None
+
+    ctx_id = (kwargs or {}).get("ctx_id", None) or (args[0] if args else None)
+    if ctx_id not in settings.KONTAINER_ISOLATED_CONTEXTS:
+        return None
+
+    route = _map_route(name)
+    if route is None:
+        return None
+
+    route = dict(route)
+    route["queue"] = get_context_queue(route.get("queue"), ctx_id)
+    return route
+
+
+celery.conf.task_routes = [route_task_by_context, CELERY_TASK_ROUTES]
+celery.conf.task_default_queue = CELERY_QUEUE_DEFAULT
+celery.conf.task_default_priority = 5
+celery.conf.task_queue_max_priority = 9
+celery.conf.broker_transport_options = {
+    "priority_steps": list(range(10)),
+    "queue_order_strategy": "priority",
+}
+# Do not reserve further tasks, while a long task is running in a worker process
+celery.conf.worker_prefetch_multiplier = 1
+
+# Publish task state transitions to the task event subscribers
+from . import taskevents  # noqa: E402,F401
+# Record the task lifecycle in the task history
+from . import taskhistory  # noqa: E402,F401
+# Reset and warm up the connections of forked worker processes
+from . import worker  # noqa: E402,F401
@@ -1,5 +1,6 @@
 import json
 import os
+from urllib.parse import urlparse
 
 from kontainer import settings
 
@@ -70,6 +71,8 @@ def get_dockerhost_for_ctx_id(ctx_id):
 def get_ssh_config_for_ctx_id(ctx_id):
     """
     Get the SSH config for the given context id.
+    Contexts without an explicit ssh_config, but with an ssh:// docker host, use the user and host of the docker host.
+    These connections are authenticated with the keys of the ssh agent or the default key files (see SSHTransportPool).
 
     :param ctx_id: context id
     :return: ssh config
@@ -79,6 +82,9 @@ def get_ssh_config_for_ctx_id(ctx_id):
     for context in contexts:
         if context["id"] == ctx_id:
             ssh_config = context.get("ssh_config")
+            if ssh_config is None and (context.get("host") or "").startswith("ssh://"):
+                url = urlparse(context.get("host"))
+                ssh_config = {"hostname": url.hostname, "username": url.username, "port": url.port or 22}
             break
 
     return ssh_config
@@ -20,3 +20,15 @@ def get_docker_manager_cached(ctx_id: str) -> DockerManager:
         docker_manager = DockerManager(docker_host)
         docker_manager_cache[ctx_id] = docker_manager
         return docker_manager
+
+
+def reset_docker_manager_cache() -> None:
+    """
+    Drop all cached docker managers.
+
+    Must be called in forked worker processes before the first docker call,
+    because the connections of the parent process must not be shared with the child processes.
+    The parent's connections are not closed, they still belong to the parent.
+    """
+    global docker_manager_cache
+    docker_manager_cache = {}
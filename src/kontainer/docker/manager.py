@@ -1,4 +1,5 @@
 import json
+import time
 from sys import api_version
 
 import docker
@@ -177,6 +178,46 @@ class DockerManager:
         return container
 
 
+    def wait_for_container_healthy(self, key, since=None, timeout=60) -> bool:
+        """
+        Wait for Container to become healthy.
+
+        Watches the engine event stream for 'health_status' events of the container,
+        instead of polling the container state.
+        Containers without a healthcheck are considered healthy, if they are running.
+
+        :param key: id from Container on Docker
+        :param since: Unix timestamp to watch events from (default: now)
+        :param timeout: Max seconds to wait
+        :return: bool True if healthy, False if unhealthy or timed out
+        """
+        if since is None:
+            since = time.time()
+
+        container = self.client.containers.get(key)
+        health = container.attrs.get('State', {}).get('Health')
+        if health is None:
+            return container.status == 'running'
+
+        # Events since the given time are replayed, so a status change right after a restart is not missed.
+        # The stream ends at 'until', so the timeout does not require a separate thread
+        events = self.client.events(decode=True,
+                                    since=since,
+                                    until=int(time.time() + timeout),
+                                    filters={"container": container.id, "event": "health_status"})
+        try:
+            for ev in events:
+                status = ev.get('status', ev.get('Action', ''))
+                if status == 'health_status: healthy':
+                    return True
+                elif status == 'health_status: unhealthy':
+                    return False
+        finally:
+            events.close()
+
+        return False
+
+
     def restart_all_containers(self) -> list[Container]:
         """
         Restart All Containers
@@ -311,14 +352,41 @@ class DockerManager:
         return all_containers
 
 
-    def pull_image(self, image_name) -> Image:
+    def pull_image(self, image_name, progress_callback=None) -> Image:
         """
         Pull Image
 
         :param image_name: Image Name
+        :param progress_callback: Optional callback(current, total, message) with the downloaded bytes of all layers
         :return: dict
         """
-        image = self.client.images.pull(image_name)
+        if progress_callback is None:
+            image = self.client.images.pull(image_name)
+            return image
+
+        repository, tag = docker.utils.parse_repository_tag(image_name)
+        tag = tag or "latest"
+        layers = dict()
+        last_report = 0
+        for event in self.client.api.pull(repository, tag=tag, stream=True, decode=True):
+            if "error" in event:
+                raise docker.errors.APIError(event.get("error"))
+
+            detail = event.get("progressDetail") or {}
+            if event.get("id") and detail.get("total"):
+                layers[event.get("id")] = (detail.get("current", 0), detail.get("total"))
+            elif event.get("id") in layers and event.get("status") in ("Download complete", "Pull complete", "Already exists"):
+                layers[event.get("id")] = (layers[event.get("id")][1], layers[event.get("id")][1])
+
+            # throttle the progress reports
+            if time.time() - last_report >= 0.5:
+                last_report = time.time()
+                current = sum(layer[0] for layer in layers.values())
+                total = sum(layer[1] for layer in layers.values())
+                progress_callback(current, total, event.get("status", ""))
+
+        separator = "@" if tag.startswith("sha256:") else ":"
+        image = self.client.images.get(f"{repository}{separator}{tag}")
         return image
 
 
@@ -1,6 +1,7 @@
 from kontainer.admin.registries import request_container_registry_login
 from kontainer.celery import celery
 from kontainer.docker.dkr import get_docker_manager_cached
+from kontainer.taskevents import report_progress
 
 
 @celery.task(bind=True)
@@ -49,4 +50,5 @@ def container_delete_task(self, ctx_id, container_id):
 def image_pull_task(self, ctx_id, container_id):
     print(f"Image PULL {container_id}")
     dkr = get_docker_manager_cached(ctx_id)
-    dkr.pull_image(container_id)
+    dkr.pull_image(container_id,
+                   progress_callback=lambda current, total, message: report_progress(self, current, total, message))
@@ -0,0 +1,45 @@
+from kontainer.celery import celery
+from kontainer.docker.context import get_ssh_config_for_ctx_id
+from kontainer.taskevents import report_progress
+from kontainer.util.remote_utils import fanout_ssh_command
+
+# Environment tasks
+#
+# Tasks, which run on the hosts of multiple environments (docker contexts).
+# Unlike the docker and stack tasks, they do not take a single context id as the first argument,
+# so they are neither routed to the queue of an isolated context nor indexed by context in the task history.
+
+
+@celery.task(bind=True)
+def remote_exec_task(self, ctx_ids, command, timeout=None, concurrency=None):
+    """
+    Execute a command on the hosts of multiple contexts concurrently.
+    The result of each host is reported as progress event, as soon as the command has finished on the host.
+
+    :param ctx_ids: The context ids
+    :param command: The command to execute
+    :param timeout: Max seconds the command may run on each host (default: KONTAINER_FANOUT_TIMEOUT)
+    :param concurrency: Max number of hosts, on which the command runs at the same time
+    :return: {"results": {ctx_id: {"exit_code": ..., "stdout": ..., ...}}, "succeeded": [...], "failed": [...]}
+    """
+    print(f"Remote EXEC on {len(ctx_ids)} contexts: {command}")
+    results = dict()
+    targets = dict()
+    for ctx_id in ctx_ids:
+        ssh_config = get_ssh_config_for_ctx_id(ctx_id)
+        if ssh_config is None:
+            results[ctx_id] = {"exit_code": None, "stdout": "", "stderr": "", "truncated": False, "duration": 0,
+                               "error": "No ssh config for context"}
+        else:
+            targets[ctx_id] = ssh_config
+
+    def _on_result(ctx_id, result):
+        results[ctx_id] = result
+        report_progress(self, len(results), len(ctx_ids), f"Finished on {ctx_id}", ctx_id=ctx_id, result=result)
+
+    fanout_ssh_command(targets, command, max_concurrency=concurrency, timeout=timeout, on_result=_on_result)
+    return {
+        "results": results,
+        "succeeded": sorted(ctx_id for ctx_id, r in results.items() if r["error"] is None and r["exit_code"] == 0),
+        "failed": sorted(ctx_id for ctx_id, r in results.items() if r["error"] is not None or r["exit_code"] != 0),
+    }
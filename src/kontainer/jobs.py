@@ -0,0 +1,194 @@
+import fcntl
+import os
+import time
+
+import redis
+
+from kontainer import settings
+from kontainer.celery import celery
+from kontainer.docker.context import get_docker_contexts
+from kontainer.docker.dkr import get_docker_manager_cached
+from kontainer.docker.helper import get_docker_volume_size
+from kontainer.scheduler import get_job_schedules, get_beat_schedule, start_local_scheduler
+from kontainer.stacks.locks import dispatch_stack_task, stack_lock, StackLockTimeout
+from kontainer.stacks.stacksmanager import get_stacks_manager
+from kontainer.stacks.tasks import repository_sync_task
+from kontainer.taskexecutor import get_task_executor
+from kontainer.util.blobstore_util import get_blob_store
+from kontainer.util.gitmirror_util import normalize_repo_url
+from kontainer.util.redis_util import get_redis_client, redis_key
+from kontainer.util.snapshot_util import save_snapshot
+
+# Periodic jobs
+#
+# Jobs warm expensive caches (docker df, volume sizes, registry digests), poll the stack repositories
+# and clean up stale task outputs. The api endpoints read the precomputed snapshots (see snapshot_util).
+#
+# Jobs are scheduled by celery beat (celery_beat.sh) or, with the local task executor,
+# by the built-in scheduler (see kontainer.scheduler). Both run the periodic_job_task.
+#
+# Jobs are single-flight: a job does not run, while another run of the same job is in progress,
+# or if it has been started within the last KONTAINER_JOB_MIN_INTERVAL seconds by another process.
+
+JOBS_LOCKS_DIR = os.path.join(settings.KONTAINER_DATA_DIR, "locks", "jobs")
+
+
+def warm_docker_df(ctx_id: str):
+    save_snapshot("df", ctx_id, get_docker_manager_cached(ctx_id).client.df())
+
+
+def warm_volume_sizes(ctx_id: str):
+    dkr = get_docker_manager_cached(ctx_id)
+    sizes = dict()
+    for volume in dkr.list_volumes():
+        sizes[volume.attrs['Name']] = get_docker_volume_size(dkr.client, volume.attrs['Name'])
+    save_snapshot("volume_sizes", ctx_id, sizes)
+
+
+def check_image_updates(ctx_id: str):
+    """
+    Compare the registry digests of the images used by containers with the local digests.
+    """
+    dkr = get_docker_manager_cached(ctx_id)
+    image_ids = {c.attrs.get('Image') for c in dkr.client.containers.list(all=True)}
+
+    updates = dict()
+    for image in dkr.list_images():
+        if image.id not in image_ids:
+            continue
+        local_digests = {d.split("@", 1)[1] for d in image.attrs.get('RepoDigests') or [] if "@" in d}
+        for tag in image.tags:
+            try:
+                registry_digest = dkr.client.images.get_registry_data(tag).id
+                updates[tag] = {"image_id": image.id,
+                                "registry_digest": registry_digest,
+                                "update_available": registry_digest not in local_digests}
+            except Exception as e:
+                updates[tag] = {"image_id": image.id, "error": str(e)}
+    save_snapshot("image_updates", ctx_id, updates)
+
+
+def sync_stack_repositories(ctx_id: str):
+    """
+    Dispatch a repository sync for each repository of the managed stacks.
+    Stacks which are up to date are skipped by the sync, pending syncs are coalesced.
+    """
+    if ctx_id != "local":
+        # sync is only supported for local stacks
+        return
+
+    stacks_manager = get_stacks_manager(ctx_id)
+    stacks_manager.enumerate()
+    repo_urls = dict()
+    for stack in stacks_manager.list_all():
+        repo = stack.config.get("repository", None) if stack.managed and stack.config else None
+        if isinstance(repo, dict) and repo.get("url"):
+            repo_urls.setdefault(normalize_repo_url(repo.get("url")), repo.get("url"))
+
+    for repo_url in repo_urls.values():
+        dispatch_stack_task(repository_sync_task, ctx_id, repo_url)
+
+
+def cleanup_task_outputs():
+    """
+    Delete task outputs older than KONTAINER_TASK_OUTPUT_MAX_AGE seconds from the blob store.
+    """
+    store = get_blob_store()
+    expired_before = time.time() - settings.KONTAINER_TASK_OUTPUT_MAX_AGE
+    for key, created in store.list():
+        if created < expired_before:
+            store.delete(key)
+
+
+# name -> (function, per_context, schedule)
+PERIODIC_JOBS = {
+    "warm_docker_df": (warm_docker_df, True, settings.KONTAINER_JOB_WARM_DF_SCHEDULE),
+    "warm_volume_sizes": (warm_volume_sizes, True, settings.KONTAINER_JOB_WARM_VOLUME_SIZES_SCHEDULE),
+    "check_image_updates": (check_image_updates, True, settings.KONTAINER_JOB_CHECK_IMAGE_UPDATES_SCHEDULE),
+    "sync_stack_repositories": (sync_stack_repositories, True, settings.KONTAINER_JOB_SYNC_STACKS_SCHEDULE),
+    "cleanup_task_outputs": (cleanup_task_outputs, False, settings.KONTAINER_JOB_CLEANUP_OUTPUTS_SCHEDULE),
+}
+
+
+def _acquire_job_run(job_name: str) -> bool:
+    """
+    Claim the run of a job. Only one process can claim a run within KONTAINER_JOB_MIN_INTERVAL seconds.
+    The claim expires after the interval, runs which take longer are covered by the job lock.
+    """
+    client = get_redis_client()
+    if client is not None:
+        try:
+            return bool(client.set(redis_key("jobs", "run", job_name), int(time.time()),
+                                   nx=True, ex=settings.KONTAINER_JOB_MIN_INTERVAL))
+        except redis.exceptions.ConnectionError as e:
+            print(f"Redis not available, falling back to local job lock: {e}")
+
+    marker_file = os.path.join(JOBS_LOCKS_DIR, f"{job_name}.run")
+    os.makedirs(JOBS_LOCKS_DIR, exist_ok=True)
+    with open(os.path.join(JOBS_LOCKS_DIR, f"{job_name}.claim"), "w") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            if os.path.exists(marker_file) and \
+                    time.time() - os.path.getmtime(marker_file) < settings.KONTAINER_JOB_MIN_INTERVAL:
+                return False
+            with open(marker_file, "w"):
+                pass
+            return True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def run_periodic_job(job_name: str) -> dict:
+    """
+    Run a periodic job, unless another run of the job is in progress or has just been started.
+    Per-context jobs are run for all docker contexts. Errors of a context do not stop the job.
+
+    :param job_name: The job name, see PERIODIC_JOBS
+    :return: Dictionary with the job name, whether the run was skipped and the errors per context
+    """
+    if job_name not in PERIODIC_JOBS:
+        raise ValueError(f"Unknown job {job_name}")
+    func, per_context, _ = PERIODIC_JOBS[job_name]
+
+    if not _acquire_job_run(job_name):
+        print(f"Job {job_name} skipped, it has been started recently")
+        return {"job": job_name, "skipped": True, "errors": {}}
+
+    errors = dict()
+    try:
+        # reuse the stack lock, with a pseudo stack name, as the in-progress lock of the job
+        with stack_lock("_jobs", job_name, timeout=0):
+            started = time.time()
+            for ctx_id in ([c["id"] for c in get_docker_contexts()] if per_context else [None]):
+                try:
+                    if per_context:
+                        func(ctx_id)
+                    else:
+                        func()
+                except Exception as e:
+                    print(f"Job {job_name} failed for context {ctx_id}: {e}")
+                    errors[ctx_id or "-"] = str(e)
+            print(f"Job {job_name} finished in {time.time() - started:.1f}s")
+    except StackLockTimeout:
+        print(f"Job {job_name} skipped, it is still running")
+        return {"job": job_name, "skipped": True, "errors": {}}
+
+    return {"job": job_name, "skipped": False, "errors": errors}
+
+
+@celery.task(bind=True)
+def periodic_job_task(self, job_name):
+    return run_periodic_job(job_name)
+
+
+JOB_SCHEDULES = get_job_schedules({job_name: expr for job_name, (_, _, expr) in PERIODIC_JOBS.items()})
+celery.conf.beat_schedule = get_beat_schedule(periodic_job_task.name, JOB_SCHEDULES)
+
+
+def start_job_scheduler():
+    """
+    Start the built-in scheduler of the periodic jobs, which submits the jobs to the task executor.
+    Used with the local task executor, celery uses celery beat.
+    """
+    return start_local_scheduler(JOB_SCHEDULES,
+                                 lambda job_name: get_task_executor().submit(periodic_job_task, args=[job_name]))
@@ -0,0 +1,163 @@
+import hashlib
+import socket
+import threading
+from datetime import datetime, timedelta, timezone
+
+from celery.schedules import crontab
+
+from kontainer import settings
+
+# Schedules of the periodic jobs (see kontainer.jobs)
+#
+# Schedules are cron expressions (minute hour day-of-month month day-of-week), e.g. "*/5 * * * *".
+# An empty schedule disables the job.
+#
+# Each job is delayed by a fixed offset of up to KONTAINER_JOB_JITTER seconds, derived from the host name
+# and the job name, so the jobs of multiple hosts and jobs with the same schedule do not run at the same time.
+# The offset must be shorter than the interval of the schedule.
+#
+# celery: The schedules are run by celery beat (celery_beat.sh), see get_beat_schedule().
+# local:  The schedules are run by a thread of the web process (start_local_scheduler()).
+
+# Max seconds between two schedule checks of the local scheduler
+LOCAL_SCHEDULER_MAX_SLEEP = 60
+
+local_scheduler = None
+
+
+class OffsetCrontab(crontab):
+    """
+    Cron schedule, which is delayed by a fixed offset.
+
+    The schedule sees the time 'offset' seconds late, so each run is due 'offset' seconds after the cron time.
+    Unlike a nowfun closure, the schedule can be pickled (celery beat stores the schedule entries in a shelve file).
+    """
+
+    def __init__(self, *args, offset=0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.offset = offset
+
+    def now(self) -> datetime:
+        return super().now() - timedelta(seconds=self.offset)
+
+    def __reduce__(self):
+        cls, args, state = super().__reduce__()
+        return cls, args, dict(state or {}, offset=self.offset)
+
+    def __setstate__(self, state):
+        state = dict(state)
+        self.offset = state.pop("offset", 0)
+        super().__setstate__(state)
+
+
+def get_job_offset(job_name: str, jitter: int) -> int:
+    """
+    Get the fixed delay of a job on this host.
+
+    :param job_name: The job name
+    :param jitter: Max delay in seconds
+    :return: Delay in seconds
+    """
+    if jitter <= 0:
+        return 0
+    digest = hashlib.sha1(f"{socket.gethostname()}:{job_name}".encode("utf-8")).hexdigest()
+    return int(digest[:8], 16) % (jitter + 1)
+
+
+def parse_schedule(expr: str, offset=0) -> crontab:
+    """
+    Parse a cron expression.
+
+    :param expr: Cron expression, e.g. "*/5 * * * *"
+    :param offset: Delay the schedule by the given seconds
+    :return: celery crontab schedule (OffsetCrontab)
+    :raises ValueError: If the expression does not have 5 fields
+    """
+    fields = expr.split()
+    if len(fields) != 5:
+        raise ValueError(f"Invalid schedule '{expr}': expected 5 fields (minute hour day-of-month month day-of-week)")
+    minute, hour, day_of_month, month_of_year, day_of_week = fields
+
+    return OffsetCrontab(minute=minute, hour=hour, day_of_month=day_of_month, month_of_year=month_of_year,
+                         day_of_week=day_of_week, offset=offset)
+
+
+def get_job_schedules(job_schedules: dict) -> dict:
+    """
+    Parse the schedules of the periodic jobs.
+    Jobs with an empty schedule are skipped, invalid schedules are logged and the job is skipped.
+
+    :param job_schedules: Dictionary of job name -> cron expression
+    :return: Dictionary of job name -> crontab schedule
+    """
+    schedules = dict()
+    for job_name, expr in job_schedules.items():
+        if not expr or not expr.strip():
+            continue
+        try:
+            schedules[job_name] = parse_schedule(expr, get_job_offset(job_name, settings.KONTAINER_JOB_JITTER))
+        except Exception as e:
+            print(f"Job {job_name} disabled, invalid schedule: {e}")
+    return schedules
+
+
+def get_beat_schedule(task_name: str, schedules: dict) -> dict:
+    """
+    Get the celery beat schedule of the periodic jobs.
+
+    :param task_name: Name of the task, which runs a job. The job name is passed as the first argument.
+    :param schedules: Dictionary of job name -> crontab schedule
+    :return: celery beat_schedule
+    """
+    return {f"job:{job_name}": {"task": task_name, "schedule": schedule, "args": [job_name]}
+            for job_name, schedule in schedules.items()}
+
+
+class LocalScheduler(threading.Thread):
+    """
+    Submits the due periodic jobs.
+    """
+
+    def __init__(self, schedules: dict, submit):
+        super().__init__(name="kontainer-scheduler", daemon=True)
+        self.schedules = schedules
+        self.submit = submit
+        # same as celery beat: the first run is due at the first scheduled time after the start
+        now = datetime.now(timezone.utc)
+        self.last_run = {job_name: now for job_name in schedules}
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            next_check = LOCAL_SCHEDULER_MAX_SLEEP
+            for job_name, schedule in self.schedules.items():
+                try:
+                    due, next_check_in = schedule.is_due(self.last_run[job_name])
+                    if due:
+                        self.last_run[job_name] = datetime.now(timezone.utc)
+                        self.submit(job_name)
+                    next_check = min(next_check, next_check_in)
+                except Exception as e:
+                    print(f"Failed to schedule job {job_name}: {e}")
+            self.stopped.wait(max(next_check, 1))
+
+    def stop(self):
+        self.stopped.set()
+
+
+def start_local_scheduler(schedules: dict, submit) -> LocalScheduler | None:
+    """
+    Start the scheduler thread for the periodic jobs, if it is not running yet.
+
+    :param schedules: Dictionary of job name -> crontab schedule
+    :param submit: Function, which submits a job: submit(job_name)
+    :return: The scheduler or None, if no job is enabled
+    """
+    global local_scheduler
+    if local_scheduler is None:
+        if not schedules:
+            return None
+        local_scheduler = LocalScheduler(schedules, submit)
+        local_scheduler.start()
+        print(f"Started the scheduler for jobs: {', '.join(schedules.keys())}")
+    return local_scheduler
@@ -6,6 +6,7 @@ from kontainer import settings
 from kontainer.docker.tasks import container_start_task, container_pause_task, container_stop_task, \
     container_delete_task, container_restart_task
 from kontainer.server.middleware import docker_service_middleware
+from kontainer.taskexecutor import get_task_executor
 
 container_api_bp = flask.Blueprint('container_api', __name__, url_prefix='/api/docker/containers')
 docker_service_middleware(container_api_bp)
@@ -41,8 +42,8 @@ def start_container(key):
     try:
         if request.args.get('async', None) == "1":
             ctx_id = g.dkr_ctx_id
-            task = container_start_task.apply_async(args=[ctx_id, key])
-            return jsonify({"task_id": task.id, "ref": f"/docker/containers/{key}"})
+            task_id = get_task_executor().submit(container_start_task, args=[ctx_id, key])
+            return jsonify({"task_id": task_id, "ref": f"/docker/containers/{key}"})
 
         container = g.dkr.start_container(key)
         return jsonify(container.attrs)
@@ -56,8 +57,8 @@ def pause_container(key):
     try:
         if request.args.get('async', None) == "1":
             ctx_id = g.dkr_ctx_id
-            task = container_pause_task.apply_async(args=[ctx_id, key])
-            return jsonify({"task_id": task.id, "ref": f"/docker/containers/{key}"})
+            task_id = get_task_executor().submit(container_pause_task, args=[ctx_id, key])
+            return jsonify({"task_id": task_id, "ref": f"/docker/containers/{key}"})
 
         container = g.dkr.pause_container(key)
         return jsonify(container.attrs)
@@ -71,8 +72,8 @@ def stop_container(key):
     try:
         if request.args.get('async', None) == "1":
             ctx_id = g.dkr_ctx_id
-            task = container_stop_task.apply_async(args=[ctx_id, key])
-            return jsonify({"task_id": task.id, "ref": f"/docker/containers/{key}"})
+            task_id = get_task_executor().submit(container_stop_task, args=[ctx_id, key])
+            return jsonify({"task_id": task_id, "ref": f"/docker/containers/{key}"})
 
         container = g.dkr.stop_container(key)
         return jsonify(container.attrs)
@@ -89,8 +90,8 @@ def remove_container(key):
     try:
         if request.args.get('async', None) == "1":
             ctx_id = g.dkr_ctx_id
-            task = container_delete_task.apply_async(args=[ctx_id, key])
-            return jsonify({"task_id": task.id, "ref": f"/docker/containers/{key}"})
+            task_id = get_task_executor().submit(container_delete_task, args=[ctx_id, key])
+            return jsonify({"task_id": task_id, "ref": f"/docker/containers/{key}"})
 
         container = g.dkr.remove_container(key)
         return jsonify(container.attrs)
@@ -104,8 +105,8 @@ def restart_container(key):
     try:
         if request.args.get('async', None) == "1":
             ctx_id = g.dkr_ctx_id
-            task = container_restart_task.apply_async(args=[ctx_id, key])
-            return jsonify({"task_id": task.id, "ref": f"/docker/containers/{key}"})
+            task_id = get_task_executor().submit(container_restart_task, args=[ctx_id, key])
+            return jsonify({"task_id": task_id, "ref": f"/docker/containers/{key}"})
 
         container = g.dkr.restart_container(key)
         return jsonify(container.attrs)
@@ -7,6 +7,7 @@ from flask import jsonify, request, Blueprint, g
 from flask_jwt_extended.view_decorators import jwt_required
 
 from kontainer.server.middleware import docker_service_middleware
+from kontainer.util.snapshot_util import load_snapshot, save_snapshot
 
 engine_api_bp = Blueprint('engine_api', __name__, url_prefix='/api/docker/engine')
 docker_service_middleware(engine_api_bp)
@@ -54,10 +55,20 @@ def engine_ping():
 def engine_df():
     """
     Get Resource Usage Summary
+    Returns the snapshot of the periodic df job, if it is recent, otherwise the current usage.
+
+    Optional query parameters:
+    - refresh: 1 to get the current usage
 
     :return: dict
     """
+    if request.args.get("refresh", None) != "1":
+        snapshot = load_snapshot("df", g.dkr_ctx_id)
+        if snapshot is not None:
+            return jsonify(snapshot["data"])
+
     df = g.dkr.client.df()
+    save_snapshot("df", g.dkr_ctx_id, df)
     return jsonify(df)
 
 
@@ -1,7 +1,9 @@
 from flask import jsonify, Blueprint, g
 from flask_jwt_extended.view_decorators import jwt_required
 
+from kontainer import settings
 from kontainer.server.middleware import docker_service_middleware
+from kontainer.util.snapshot_util import load_snapshot
 
 images_api_bp = Blueprint('images_api', __name__, url_prefix='/api/docker/images')
 docker_service_middleware(images_api_bp)
@@ -12,3 +14,19 @@ def list_images():
     images = g.dkr.list_images()
     mapped = list(map(lambda x: x.attrs, images))
     return jsonify(mapped)
+
+
+@images_api_bp.route('/updates', methods=["GET"])
+@jwt_required()
+def list_image_updates():
+    """
+    List the update checks of the images used by containers.
+    The registry digests are checked by the periodic image updates job.
+
+    :return: dict with 'updated' (timestamp of the last check or None) and
+             'images' (image tag -> image_id, registry_digest, update_available or error)
+    """
+    snapshot = load_snapshot("image_updates", g.dkr_ctx_id, max_age=settings.KONTAINER_SNAPSHOT_TTL)
+    if snapshot is None:
+        return jsonify({"updated": None, "images": {}})
+    return jsonify({"updated": snapshot["updated"], "images": snapshot["data"]})
@@ -4,16 +4,51 @@ from flask_jwt_extended.view_decorators import jwt_required
 
 from kontainer.docker.util import list_projects_from_containers, filter_containers_by_project, \
     filter_containers_by_status_text
+from kontainer.server.internal.tasks_api import build_task_status
 from kontainer.server.middleware import docker_service_middleware
+from kontainer.stacks.locks import dispatch_stack_task
 from kontainer.stacks.dockerstacks import UnmanagedDockerComposeStack
 from kontainer.stacks.stacksmanager import get_stacks_manager
 from kontainer.stacks.tasks import stack_start_task, stack_stop_task, stack_destroy_task, stack_restart_task, \
     create_stack_task, \
-    stack_delete_task, stack_sync_task
+    stack_delete_task, stack_sync_task, repository_sync_task, stack_deploy_task
+from kontainer.stacks.workflows import load_workflow, is_workflow_active
+from kontainer.taskevents import wait_for_task
 
 stacks_api_bp = flask.Blueprint('stacks_api', __name__, url_prefix='/api/stacks')
 docker_service_middleware(stacks_api_bp)
 
+MAX_TASK_WAIT = 60
+
+
+def _dispatch_stack_task(task, ctx_id: str, stack_name: str, ref: str, args=None, kwargs=None):
+    """
+    Dispatch a stack task and build the response.
+
+    Optional query parameters:
+    - wait: Max seconds to wait for the task to finish (max: 60).
+            If the task finishes in time, the task status (same as /api/tasks/<task_id>/status) is returned.
+            Otherwise the task id is returned with status 202 and the task keeps running.
+            Without wait, the task id is returned immediately.
+    """
+    wait = request.args.get('wait', None)
+    try:
+        wait = min(max(float(wait), 0), MAX_TASK_WAIT) if wait not in (None, '') else None
+    except ValueError:
+        return jsonify({"error": "wait must be a number"}), 400
+
+    task_id, coalesced = dispatch_stack_task(task, ctx_id, stack_name, args=args, kwargs=kwargs)
+    result = {"task_id": task_id, "ref": ref, "ctx_id": ctx_id, "coalesced": coalesced}
+    if wait is None:
+        return jsonify(result)
+
+    if not wait_for_task(task_id, wait):
+        return jsonify(result), 202
+
+    status = build_task_status(task_id)
+    result.update(status)
+    return jsonify(result), 500 if status['status'] == 'FAILURE' else 200
+
 
 @stacks_api_bp.route('', methods=["GET"])
 @jwt_required()
@@ -72,12 +107,8 @@ def describe_stack(name):
 def start_stack(name):
     ctx_id = g.dkr_ctx_id
     if request.args.get('sync', None) == "1":
-        result = stack_start_task(ctx_id, name)
-    else:
-        ctx_id = g.dkr_ctx_id
-        task = stack_start_task.apply_async(args=[ctx_id, name])
-        result = {"task_id": task.id, "ref": f"/docker/{name}", "ctx_id": ctx_id}
-    return jsonify(result)
+        return jsonify(stack_start_task(ctx_id, name))
+    return _dispatch_stack_task(stack_start_task, ctx_id, name, f"/docker/{name}")
 
 
 @stacks_api_bp.route('/<string:name>/stop', methods=["POST"])
@@ -86,11 +117,8 @@ def stop_stack(name):
     ctx_id = g.dkr_ctx_id
     # return jsonify(StacksManager.stop(name).serialize())
     if request.args.get('sync', None) == "1":
-        result = stack_stop_task(ctx_id, name)
-    else:
-        task = stack_stop_task.apply_async(args=[ctx_id, name])
-        result = {"task_id": task.id, "ref": f"/docker/{name}", "ctx_id": ctx_id}
-    return jsonify(result)
+        return jsonify(stack_stop_task(ctx_id, name))
+    return _dispatch_stack_task(stack_stop_task, ctx_id, name, f"/docker/{name}")
 
 
 @stacks_api_bp.route('/<string:name>/delete', methods=["POST"])
@@ -99,11 +127,8 @@ def delete_stack(name):
     ctx_id = g.dkr_ctx_id
     # return jsonify(StacksManager.remove(name).serialize())
     if request.args.get('sync', None) == "1":
-        result = stack_delete_task(ctx_id, name)
-    else:
-        task = stack_delete_task.apply_async(args=[ctx_id, name])
-        result = {"task_id": task.id, "ref": f"/docker/{name}", "ctx_id": ctx_id}
-    return jsonify(result)
+        return jsonify(stack_delete_task(ctx_id, name))
+    return _dispatch_stack_task(stack_delete_task, ctx_id, name, f"/docker/{name}")
 
 
 @stacks_api_bp.route('/<string:name>/destroy', methods=["POST"])
@@ -112,36 +137,105 @@ def destroy_stack(name):
     ctx_id = g.dkr_ctx_id
     # return jsonify(StacksManager.remove(name).serialize())
     if request.args.get('sync', None) == "1":
-        result = stack_destroy_task(ctx_id, name)
-    else:
-        task = stack_destroy_task.apply_async(args=[ctx_id, name])
-        result = {"task_id": task.id, "ref": f"/docker/{name}", "ctx_id": ctx_id}
-    return jsonify(result)
+        return jsonify(stack_destroy_task(ctx_id, name))
+    return _dispatch_stack_task(stack_destroy_task, ctx_id, name, f"/docker/{name}")
 
 
 @stacks_api_bp.route('/<string:name>/sync', methods=["POST"])
 @jwt_required()
 def sync_stack(name):
     ctx_id = g.dkr_ctx_id
+    force = request.args.get('force', None) == "1"
+    if request.args.get('sync', None) == "1":
+        return jsonify(stack_sync_task(ctx_id, name, force=force))
+    return _dispatch_stack_task(stack_sync_task, ctx_id, name, f"/docker/{name}",
+                                kwargs={"force": force})
+
+
+@stacks_api_bp.route('/sync-repository', methods=["POST"])
+@jwt_required()
+def sync_repository():
+    """
+    Sync all stacks, which are checked out from the given repository.
+    The shared repository mirror is fetched only once.
+    """
+    ctx_id = g.dkr_ctx_id
+    request_json = request.get_json(silent=True) or {}
+    repo_url = request_json.get("repo_url", request.args.get("repo_url", ""))
+    if repo_url is None or repo_url.strip() == "":
+        return jsonify({"error": "repo_url is required"}), 400
+
     if request.args.get('sync', None) == "1":
-        result = stack_sync_task(ctx_id, name)
-    else:
-        task = stack_sync_task.apply_async(args=[ctx_id, name])
-        result = {"task_id": task.id, "ref": f"/docker/{name}", "ctx_id": ctx_id}
-    return jsonify(result)
+        return jsonify(repository_sync_task(ctx_id, repo_url))
+    return _dispatch_stack_task(repository_sync_task, ctx_id, repo_url, "/docker/stacks")
 
 
 @stacks_api_bp.route('/<string:name>/restart', methods=["POST"])
 @jwt_required()
 def restart_stack(name):
+    """
+    Restart a stack
+
+    Optional query parameters:
+    - strategy: 'all' (default) restarts all services at once, 'rolling' restarts the services in batches
+    - batch_size: Number of containers to restart at once with the 'rolling' strategy (default: 1)
+    """
     ctx_id = g.dkr_ctx_id
+    strategy = request.args.get('strategy', None)
+    if strategy not in (None, "", "all", "rolling"):
+        return jsonify({"error": f"Unknown restart strategy: {strategy}"}), 400
+    try:
+        batch_size = int(request.args.get('batch_size', 1))
+    except ValueError:
+        return jsonify({"error": "batch_size must be an integer"}), 400
+
     # return jsonify(StacksManager.restart(name).serialize())
     if request.args.get('sync', None) == "1":
-        result = stack_restart_task(ctx_id, name)
-    else:
-        task = stack_restart_task.apply_async(args=[ctx_id, name])
-        result = {"task_id": task.id, "ref": f"/docker/{name}"}
-    return jsonify(result)
+        return jsonify(stack_restart_task(ctx_id, name, strategy=strategy, batch_size=batch_size))
+    return _dispatch_stack_task(stack_restart_task, ctx_id, name, f"/docker/{name}",
+                                kwargs={"strategy": strategy, "batch_size": batch_size})
+
+
+@stacks_api_bp.route('/<string:name>/deploy', methods=["POST"])
+@jwt_required()
+def deploy_stack(name):
+    """
+    Deploy a stack: sync, pull, build and up in a single task.
+    Steps, whose inputs have not changed, are skipped. The workflow id is the task id.
+
+    Optional query parameters:
+    - force: '1' runs all steps, even if their inputs have not changed
+    - retry: Id of a failed workflow or of a workflow, whose task has died.
+             The workflow is continued with the failed or interrupted step.
+    """
+    ctx_id = g.dkr_ctx_id
+    force = request.args.get('force', None) == "1"
+    workflow_id = request.args.get('retry', None) or None
+    if workflow_id is not None:
+        workflow = load_workflow(ctx_id, workflow_id)
+        if workflow is None or workflow["stack"] != name:
+            return jsonify({"error": f"Workflow {workflow_id} not found"}), 404
+        if workflow["state"] == "success":
+            return jsonify({"error": f"Workflow {workflow_id} has already finished"}), 409
+        if is_workflow_active(workflow):
+            return jsonify({"error": f"Workflow {workflow_id} is still running"}), 409
+
+    if request.args.get('sync', None) == "1":
+        return jsonify(stack_deploy_task(ctx_id, name, workflow_id=workflow_id, force=force))
+    return _dispatch_stack_task(stack_deploy_task, ctx_id, name, f"/docker/{name}",
+                                kwargs={"workflow_id": workflow_id, "force": force})
+
+
+@stacks_api_bp.route('/<string:name>/workflows/<string:workflow_id>', methods=["GET"])
+@jwt_required()
+def describe_stack_workflow(name, workflow_id):
+    """
+    Get the state of a deploy workflow, with the state and timing of each step.
+    """
+    workflow = load_workflow(g.dkr_ctx_id, workflow_id)
+    if workflow is None or workflow["stack"] != name:
+        return jsonify({"error": f"Workflow {workflow_id} not found"}), 404
+    return jsonify(workflow)
 
 
 @stacks_api_bp.route('/create', methods=["POST"])
@@ -169,11 +263,9 @@ def create_stack():
 
         # stack = StacksManager.create_stack(stack_name, initializer_name, **request_json)
         if request.args.get('sync', None) == "1":
-            result = create_stack_task(ctx_id, stack_name, initializer_name, **request_json)
-        else:
-            task = create_stack_task.apply_async(args=[ctx_id, stack_name, initializer_name], kwargs=request_json)
-            result = {"task_id": task.id, "ref": f"/docker/{stack_name}"}
-        return jsonify(result)
+            return jsonify(create_stack_task(ctx_id, stack_name, initializer_name, **request_json))
+        return _dispatch_stack_task(create_stack_task, ctx_id, stack_name, f"/docker/{stack_name}",
+                                    args=[initializer_name], kwargs=request_json)
     except Exception as e:
         # todo log error
         # raise e
@@ -3,6 +3,7 @@ from flask import jsonify, g
 from flask_jwt_extended.view_decorators import jwt_required
 
 from kontainer.server.middleware import docker_service_middleware
+from kontainer.util.snapshot_util import load_snapshot
 
 volumes_api_bp = flask.Blueprint('volumes_api', __name__, url_prefix='/api/docker/volumes')
 docker_service_middleware(volumes_api_bp)
@@ -14,7 +15,9 @@ def list_volumes():
     List all volumes
 
     Optional query parameters:
-    - size: true/false (default: false) True to include size information
+    - size: true/false (default: false) True to include size information.
+            The sizes are read from the snapshot of the periodic volume sizes job, if it is recent.
+    - refresh: 1 to calculate the current sizes
     - in_use: true/false (default: false) True to include in-use information
 
     :return:
@@ -23,6 +26,16 @@ def list_volumes():
     check_size = query.get('size', 'false') == 'true'
     check_in_use = query.get('in_use', 'false') == 'true'
 
-    volumes = g.dkr.list_volumes(check_in_use=check_in_use, check_size=check_size)
+    sizes = None
+    if check_size and query.get('refresh', None) != '1':
+        snapshot = load_snapshot("volume_sizes", g.dkr_ctx_id)
+        sizes = snapshot["data"] if snapshot is not None else None
+
+    volumes = g.dkr.list_volumes(check_in_use=check_in_use, check_size=check_size and sizes is None)
+    if sizes is not None:
+        for volume in volumes:
+            name = volume.attrs['Name']
+            # volumes created after the snapshot
+            volume.attrs['_Size'] = sizes[name] if name in sizes else g.dkr.get_volume_size(name)
     mapped = list(map(lambda x: x.attrs, volumes))
     return jsonify(mapped)
@@ -2,11 +2,20 @@ import flask
 from flask import jsonify
 from flask_jwt_extended.view_decorators import jwt_required
 
-from kontainer.docker.context import get_docker_contexts, add_docker_context, remove_docker_context
+from kontainer import settings
+from kontainer.docker.context import get_docker_contexts, add_docker_context, remove_docker_context, \
+    get_ssh_config_for_ctx_id
 from kontainer.docker.manager import DockerManager
+from kontainer.environments.tasks import remote_exec_task
+from kontainer.server.internal.tasks_api import build_task_status
+from kontainer.taskevents import wait_for_task
+from kontainer.taskexecutor import get_task_executor
 
 environments_api_bp = flask.Blueprint('environments_api', __name__, url_prefix='/api/environments')
 
+# Max seconds to wait for a remote exec task to finish
+MAX_TASK_WAIT = 60
+
 @environments_api_bp.route('', methods=["GET"])
 @jwt_required()
 def list_environments():
@@ -109,4 +118,69 @@ def remove_environment(name: str):
     # EnvManager.remove(alias)
     # return jsonify(env.to_dict())
     remove_docker_context(name)
-    return jsonify({"message": "Environment removed"}), 200
\ No newline at end of file
+    return jsonify({"message": "Environment removed"}), 200
+
+
+@environments_api_bp.route('/exec', methods=["POST"])
+@jwt_required()
+def exec_environments():
+    """
+    Execute a command on the hosts of multiple environments concurrently.
+
+    JSON body:
+    - command: The command to execute
+    - contexts: The environment ids (default: all environments with ssh access)
+    - timeout: Max seconds the command may run on each host (default: KONTAINER_FANOUT_TIMEOUT),
+               must be less than the task time limit
+    - concurrency: Max number of hosts, on which the command runs at the same time (optional)
+
+    Query parameters:
+    - wait: Max seconds to wait for the task to finish (max: 60).
+            If the task finishes in time, the task status with the result of each host is returned.
+            Otherwise the task id is returned with status 202 and the task keeps running.
+
+    The result of each host is published as progress event of the task (see /api/tasks/<task_id>/events).
+
+    :return:
+    """
+    request_json = flask.request.json or {}
+    command = request_json.get("command", None)
+    if not command or not isinstance(command, str):
+        return jsonify({"error": "command is required"}), 400
+
+    ctx_ids = request_json.get("contexts", None)
+    if ctx_ids is None:
+        ctx_ids = [e["id"] for e in get_docker_contexts() if get_ssh_config_for_ctx_id(e["id"]) is not None]
+    if not isinstance(ctx_ids, list):
+        return jsonify({"error": "contexts must be a list"}), 400
+    known_ids = {e["id"] for e in get_docker_contexts()}
+    unknown_ids = [ctx_id for ctx_id in ctx_ids if ctx_id not in known_ids]
+    if unknown_ids:
+        return jsonify({"error": f"Environment not found: {', '.join(unknown_ids)}"}), 404
+    if len(ctx_ids) == 0:
+        return jsonify({"error": "No environments with ssh access"}), 400
+
+    try:
+        timeout = float(request_json["timeout"]) if request_json.get("timeout") is not None else None
+        concurrency = int(request_json["concurrency"]) if request_json.get("concurrency") is not None else None
+        wait = flask.request.args.get('wait', None)
+        wait = min(max(float(wait), 0), MAX_TASK_WAIT) if wait not in (None, '') else None
+    except ValueError:
+        return jsonify({"error": "timeout, concurrency and wait must be numbers"}), 400
+    if concurrency is not None and concurrency < 1:
+        return jsonify({"error": "concurrency must be at least 1"}), 400
+    if timeout is not None and not 0 < timeout < settings.CELERY_TASK_TIME_LIMIT:
+        return jsonify({"error": f"timeout must be between 0 and {settings.CELERY_TASK_TIME_LIMIT} seconds"}), 400
+
+    task_id = get_task_executor().submit(remote_exec_task, args=[ctx_ids, command],
+                                         kwargs={"timeout": timeout, "concurrency": concurrency})
+    result = {"task_id": task_id, "contexts": ctx_ids}
+    if wait is None:
+        return jsonify(result)
+
+    if not wait_for_task(task_id, wait):
+        return jsonify(result), 202
+
+    status = build_task_status(task_id)
+    result.update(status)
+    return jsonify(result), 500 if status['status'] == 'FAILURE' else 200
@@ -1,17 +1,57 @@
+import io
+import json
+import re
+import time
+
 import flask
-from flask import jsonify, request
+from flask import jsonify, request, Response, stream_with_context
 from flask_jwt_extended.view_decorators import jwt_required
 
-from kontainer.celery import celery
-from kontainer.admin.tasks import long_running_task, resolve_task
+from kontainer.admin.tasks import resolve_task
+from kontainer.taskevents import get_task_event_bus, TASK_FINAL_STATES
+from kontainer.taskexecutor import get_task_executor
+from kontainer.taskhistory import get_task_history
+from kontainer.util.blobstore_util import get_blob_store, iter_range, BlobNotFoundError
 
 tasks_api_bp = flask.Blueprint('tasks_api', __name__, url_prefix='/api/tasks')
 
+SSE_KEEPALIVE_INTERVAL = 15
+MAX_BATCH_TASK_IDS = 500
+MAX_LIST_TASKS = 500
+RANGE_HEADER_RE = re.compile(r'bytes=(\d*)-(\d*)$')
+
 
-# @tasks_api_bp.route('/', methods=["GET"])
-# def list_tasks():
-#     tasks = list()
-#     return jsonify(tasks)
+@tasks_api_bp.route('', methods=['GET'])
+@jwt_required()
+def list_tasks():
+    """
+    Lists the most recent tasks from the task history, most recent first.
+
+    Query parameters:
+    - ctx: Filter by context id (optional)
+    - stack: Filter by stack name (optional, requires ctx)
+    - type: Filter by task type, e.g. stack_start_task (optional)
+    - state: Filter by task state, e.g. PENDING, STARTED, SUCCESS, FAILURE (optional)
+    - limit: Max number of tasks (default: 50, max: 500)
+    """
+    ctx_id = request.args.get('ctx', None) or None
+    stack = request.args.get('stack', None) or None
+    if stack is not None and ctx_id is None:
+        return jsonify({'error': 'ctx is required to filter by stack'}), 400
+    try:
+        limit = min(max(int(request.args.get('limit', 50)), 1), MAX_LIST_TASKS)
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+
+    state = request.args.get('state', None)
+    try:
+        return jsonify(get_task_history().list(ctx_id=ctx_id,
+                                               stack=stack,
+                                               task_type=request.args.get('type', None) or None,
+                                               state=state.upper() if state else None,
+                                               limit=limit))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
 
 @tasks_api_bp.route('', methods=['POST'])
@@ -25,50 +65,286 @@ def submit_task():
         return jsonify({'error': 'task_name is required'}), 400
 
     del data['task_name']
-    task = resolve_task(task_name, data)
-    if task is None:
+    task_id = resolve_task(task_name, data)
+    if task_id is None:
         return jsonify({'error': f'Task {task_name} not found'}), 404
 
-    return jsonify({'task_id': task.id}), 202
+    return jsonify({'task_id': task_id}), 202
+
+
+def _task_status_response(task_id: str, state: str, info, task_name=None, root_id=None, parent_id=None,
+                          max_result_size=None) -> dict:
+    """
+    Build the status response of a task from its state and info (progress, result or exception).
+    """
+    response = dict()
+    response['task_id'] = task_id
+    response['task_name'] = task_name
+    response['status'] = state
+    response['root_id'] = root_id
+    response['parent_id'] = parent_id
+    response['progress'] = None
+    response['result'] = None
+
+    if state == 'PROGRESS':
+        response['progress'] = info
+    elif state == 'SUCCESS':
+        result = info
+        if type(result) == bytes:
+            result = result.decode('utf-8', errors='replace')
+
+        if max_result_size is not None:
+            if type(result) != str and result is not None and len(json.dumps(result, default=str)) > max_result_size:
+                result = json.dumps(result, default=str)
+            if type(result) == str and len(result) > max_result_size:
+                result = result[:max_result_size]
+                response['truncated'] = True
+
+        response['result'] = result
+    elif state == 'FAILURE':
+        response['error'] = str(info)
+
+    return response
+
+
+def build_task_status(task_id: str, max_result_size=None) -> dict:
+    """
+    Build the status response of a task.
+
+    :param task_id: The task id
+    :param max_result_size: Truncate results larger than the given number of characters
+    :return: Task status dictionary
+    """
+    status = get_task_executor().get_status(task_id)
+    return _task_status_response(task_id, max_result_size=max_result_size, **status)
+
+
+def build_task_statuses(task_ids: list, max_result_size=None) -> list:
+    """
+    Build the status responses of multiple tasks.
+
+    :param task_ids: The task ids
+    :param max_result_size: Truncate results larger than the given number of characters
+    :return: List of task status dictionaries, in the order of the task ids
+    """
+    statuses = get_task_executor().get_statuses(task_ids)
+    return [_task_status_response(task_id, max_result_size=max_result_size, **status)
+            for task_id, status in zip(task_ids, statuses)]
+
+
+def _get_max_result_size(value) -> int | None:
+    if value is None or value == '':
+        return None
+    return max(int(value), 0)
 
 
 @tasks_api_bp.route('/<string:task_id>/status', methods=['GET'])
 @jwt_required()
 def get_task_status(task_id):
-    """Fetches the status of a submitted task."""
+    """
+    Fetches the status of a submitted task.
+
+    Query parameters:
+    - max_result_size: Truncate results larger than the given number of characters (optional)
+    """
+
+    try:
+        max_result_size = _get_max_result_size(request.args.get('max_result_size', None))
+    except ValueError:
+        return jsonify({'error': 'max_result_size must be an integer'}), 400
 
     try:
-        task = celery.AsyncResult(task_id)
-        if task is None:
-            return jsonify({'error': 'Task not found'}), 404
-
-        print(task_id, task.state, task)
-        response = dict()
-        response['task_id'] = task_id
-        response['task_name'] = task.task_name if hasattr(task, 'task_name') else None
-        response['status'] = task.state
-        response['root_id'] = task.root_id if hasattr(task, 'root_id') else None
-        response['parent_id'] = task.parent_id if hasattr(task, 'parent_id') else None
-        response['progress'] = None
-        response['result'] = None
-
-        if task.state == 'PROGRESS':
-            response['progress'] = task.info
-        elif task.state == 'SUCCESS':
-            try:
-                result = task.result
-                if type(result) == bytes:
-                    result = result.decode('utf-8')
-
-                response['result'] = result
-            except Exception as e:
-                print(e)
-                # response['error'] = str(e)
-                raise e
-
-        elif task.state == 'FAILURE':
-            response['error'] = str(task.info)
-
-        return jsonify(response)
+        return jsonify(build_task_status(task_id, max_result_size))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+
+
+@tasks_api_bp.route('/_status', methods=['POST'])
+@jwt_required()
+def get_task_statuses():
+    """
+    Fetches the status of multiple tasks at once.
+
+    Request body:
+    - task_ids: List of task ids
+    - max_result_size: Truncate results larger than the given number of characters (optional)
+
+    Returns a list of task statuses (same as /<task_id>/status) in the order of the task ids.
+    """
+    data = request.get_json(silent=True) or {}
+    task_ids = data.get('task_ids', None)
+    if not isinstance(task_ids, list) or not all(isinstance(task_id, str) for task_id in task_ids):
+        return jsonify({'error': 'task_ids must be a list of task ids'}), 400
+    if len(task_ids) > MAX_BATCH_TASK_IDS:
+        return jsonify({'error': f'Too many task ids (max {MAX_BATCH_TASK_IDS})'}), 400
+
+    try:
+        max_result_size = _get_max_result_size(data.get('max_result_size', None))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'max_result_size must be an integer'}), 400
+
+    try:
+        return jsonify(build_task_statuses(task_ids, max_result_size))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+@tasks_api_bp.route('/<string:task_id>/events', methods=['GET'])
+@jwt_required()
+def stream_task_events(task_id):
+    """
+    Streams the events of a task as server-sent events.
+
+    Events:
+    - status: The current task status (same as /status). Sent first and as the last event, when the task has finished.
+    - state: A state transition, e.g. STARTED or RETRY
+    - progress: Progress of the running task
+
+    Query parameters:
+    - timeout: Max seconds to stream (default: 300)
+    """
+    try:
+        timeout = min(int(request.args.get('timeout', 300)), 3600)
+    except ValueError:
+        return jsonify({'error': 'timeout must be an integer'}), 400
+
+    # subscribe before fetching the current status, so no event in between is missed
+    subscription = get_task_event_bus().subscribe(task_id)
+
+    def _generate():
+        try:
+            status = build_task_status(task_id)
+            yield _sse('status', status)
+            if status['status'] in TASK_FINAL_STATES:
+                return
+
+            deadline = time.time() + timeout
+            while time.time() < deadline:
+                event = subscription.get(timeout=min(SSE_KEEPALIVE_INTERVAL, max(deadline - time.time(), 0)))
+                if event is None:
+                    yield ": keepalive\n\n"
+                    continue
+
+                if event.get('status') in TASK_FINAL_STATES:
+                    yield _sse('status', build_task_status(task_id))
+                    return
+                yield _sse('progress' if event.get('status') == 'PROGRESS' else 'state', event)
+        except Exception as e:
+            yield _sse('error', {'task_id': task_id, 'error': str(e)})
+        finally:
+            subscription.close()
+
+    return Response(stream_with_context(_generate()),
+                    mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+def _parse_output_range(range_header, offset, limit, size: int) -> tuple | None:
+    """
+    Parse the requested byte range from a 'Range: bytes=a-b' header or the offset/limit query parameters.
+
+    :param range_header: The Range header or None
+    :param offset: Start offset (int, validated by the caller) or None
+    :param limit: Max number of bytes (int, validated by the caller) or None
+    :param size: The output size
+    :return: Tuple (start, length) or None for the whole output
+    :raises ValueError: If the range is invalid or not satisfiable
+    """
+    if range_header:
+        match = RANGE_HEADER_RE.match(range_header.strip())
+        if match is None or match.group(1) == match.group(2) == '':
+            raise ValueError(f'Invalid range {range_header}')
+        if match.group(1) == '':
+            # suffix range: the last n bytes
+            length = min(int(match.group(2)), size)
+            return size - length, length
+        start = int(match.group(1))
+        end = min(int(match.group(2)), size - 1) if match.group(2) != '' else size - 1
+    elif offset is not None or limit is not None:
+        start = offset or 0
+        end = min(start + limit, size) - 1 if limit is not None else size - 1
+    else:
+        return None
+
+    if start < 0 or start >= size or end < start:
+        raise ValueError(f'Range not satisfiable (size {size})')
+    return start, end - start + 1
+
+
+@tasks_api_bp.route('/<string:task_id>/output', methods=['GET'])
+@jwt_required()
+def get_task_output(task_id):
+    """
+    Downloads the full output of a task.
+
+    Large outputs are stored in the blob store (see kontainer.taskoutputs), small outputs are read from the result.
+    Ranges can be requested with a 'Range: bytes=<start>-<end>' header or the query parameters:
+    - offset: Start offset in bytes (optional)
+    - limit: Max number of bytes (optional)
+
+    Without a range, stored outputs are sent gzip compressed, if the client accepts it.
+    """
+    # malformed parameters are a bad request, only a range beyond the output size is not satisfiable (416)
+    try:
+        offset = int(request.args['offset']) if request.args.get('offset', '') != '' else None
+        limit = int(request.args['limit']) if request.args.get('limit', '') != '' else None
+    except ValueError:
+        return jsonify({'error': 'offset and limit must be integers'}), 400
+    if (offset is not None and offset < 0) or (limit is not None and limit < 1):
+        return jsonify({'error': 'offset must not be negative and limit must be positive'}), 400
+
+    store = get_blob_store()
+    try:
+        stored = store.exists(task_id)
+    except ValueError:
+        return jsonify({'error': 'Invalid task id'}), 400
+
+    if stored:
+        try:
+            size = store.size(task_id)
+        except BlobNotFoundError:
+            return jsonify({'error': f'Output of task {task_id} not found'}), 404
+        data = None
+    else:
+        status = get_task_executor().get_status(task_id)
+        result = status['info']
+        if status['state'] != 'SUCCESS' or not isinstance(result, (bytes, str)):
+            return jsonify({'error': f'Output of task {task_id} not found'}), 404
+        data = result if isinstance(result, bytes) else result.encode('utf-8')
+        size = len(data)
+
+    try:
+        output_range = _parse_output_range(request.headers.get('Range', None),
+                                           offset,
+                                           limit,
+                                           size)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 416, {'Content-Range': f'bytes */{size}'}
+
+    headers = {'Accept-Ranges': 'bytes', 'Cache-Control': 'no-cache'}
+    if output_range is None and stored and 'gzip' in request.headers.get('Accept-Encoding', ''):
+        # pass the compressed blob through, no need to decompress and re-compress
+        f = store.open_compressed(task_id)
+        headers['Content-Encoding'] = 'gzip'
+        return Response(_iter_and_close(f), mimetype='text/plain', headers=headers)
+
+    f = store.open(task_id) if stored else io.BytesIO(data)
+    if output_range is None:
+        headers['Content-Length'] = str(size)
+        return Response(_iter_and_close(f), mimetype='text/plain', headers=headers)
+
+    start, length = output_range
+    headers['Content-Length'] = str(length)
+    headers['Content-Range'] = f'bytes {start}-{start + length - 1}/{size}'
+    return Response(_iter_and_close(f, start, length), status=206, mimetype='text/plain', headers=headers)
+
+
+def _iter_and_close(f, start=0, length=None):
+    try:
+        yield from iter_range(f, start, length)
+    finally:
+        f.close()
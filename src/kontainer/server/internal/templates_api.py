@@ -4,7 +4,9 @@ import flask
 from flask import jsonify, request, url_for
 from flask_jwt_extended.view_decorators import jwt_required
 
-from kontainer.admin.templates import find_templates, write_template, download_template, load_template
+from kontainer.admin.credentials import private_key_exists
+from kontainer.admin.templates import find_templates, write_template, download_template, load_template, \
+    find_repo_templates, search_templates, get_template_entry
 
 templates_api_bp = flask.Blueprint('templates_api', __name__, url_prefix='/api/templates')
 
@@ -63,6 +65,88 @@ def add_template():
             return jsonify({'error': str(e)}), 500
 
 
+@templates_api_bp.route('/search', methods=["GET"])
+@jwt_required()
+def search_template_entries():
+    """
+    Search the entries of all templates.
+
+    Query parameters:
+    - q: Text to find in title, name, description and image (optional)
+    - category: Category of the entries (optional)
+    - page: Page number, starting at 1 (default: 1)
+    - limit: Entries per page (default: 50, max: 500)
+    """
+    try:
+        page = int(request.args.get('page', 1))
+        limit = min(int(request.args.get('limit', 50)), 500)
+    except ValueError:
+        return jsonify({'error': 'page and limit must be integers'}), 400
+
+    try:
+        result = search_templates(q=request.args.get('q', None),
+                                  category=request.args.get('category', None),
+                                  page=page,
+                                  limit=limit)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+    for item in result['items']:
+        item['url'] = url_for('templates_api.get_template_entry_by_id', entry_id=item['id'], _external=True)
+    return jsonify(result)
+
+
+@templates_api_bp.route('/entries/<string:entry_id>', methods=["GET"])
+@jwt_required()
+def get_template_entry_by_id(entry_id):
+    """
+    Returns a single template entry by its id ('<template_id>:<index>').
+    """
+    try:
+        entry = get_template_entry(entry_id)
+    except (FileNotFoundError, KeyError):
+        return jsonify({'error': 'Template entry not found'}), 404
+    except json.decoder.JSONDecodeError:
+        return jsonify({'error': 'Template is not a valid JSON'}), 500
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+    return jsonify(entry)
+
+
+@templates_api_bp.route('/repository', methods=["GET"])
+@jwt_required()
+def list_repo_templates():
+    """
+    Returns a list of stack templates in a git repository.
+
+    Query parameters:
+    - repo_url: Repository url
+    - repo_ref: Branch, tag or commit (optional)
+    - private_key_id: SSH private key for private repositories (optional)
+    """
+    repo_url = request.args.get('repo_url', None)
+    if not repo_url:
+        return jsonify({'error': 'repo_url is required'}), 400
+
+    private_key_file = None
+    private_key_id = request.args.get('private_key_id', None)
+    if private_key_id:
+        private_key_file = private_key_exists(private_key_id)
+        if not private_key_file:
+            return jsonify({'error': f'SSH private key {private_key_id} not found'}), 400
+
+    try:
+        template_names = find_repo_templates(repo_url, request.args.get('repo_ref', None), private_key_file)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+    return jsonify([{
+        'template_name': template_name,
+        'repo_url': repo_url,
+    } for template_name in template_names])
+
+
 @templates_api_bp.route('/<string:template_id>', methods=["GET"])
 @jwt_required()
 def get_template(template_id):
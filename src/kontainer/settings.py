@@ -33,6 +33,25 @@ KONTAINER_ENABLE_KUBERNETES = os.getenv("KONTAINER_ENABLE_KUBERNETES", "false").
 KONTAINER_ENABLE_DELETE = os.getenv("KONTAINER_ENABLE_DELETE", "true").lower() == "true"
 
 
+# Stack settings
+KONTAINER_ROLLING_HEALTH_TIMEOUT = int(os.getenv("KONTAINER_ROLLING_HEALTH_TIMEOUT", "120"))
+
+# Git settings
+# Share a bare mirror between all stacks cloned from the same repository
+KONTAINER_GIT_MIRROR_ENABLED = os.getenv("KONTAINER_GIT_MIRROR_ENABLED", "true").lower() == "true"
+# Do not fetch a mirror again for the stacks of a repository sync, if it was fetched within the last n seconds.
+# Syncs and up-to-date checks of a single stack always fetch or ask the remote.
+KONTAINER_GIT_MIRROR_MAX_AGE = int(os.getenv("KONTAINER_GIT_MIRROR_MAX_AGE", "10"))
+# Do not fetch a template repository again, if it was fetched within the last n seconds
+KONTAINER_TEMPLATE_REPO_MAX_AGE = int(os.getenv("KONTAINER_TEMPLATE_REPO_MAX_AGE", "300"))
+
+# Max seconds a stack operation waits for another operation on the same stack to finish
+KONTAINER_STACK_LOCK_TIMEOUT = int(os.getenv("KONTAINER_STACK_LOCK_TIMEOUT", "600"))
+# Identical stack operations are only coalesced onto a pending task, which was queued within the last n seconds.
+# A lost queued task (broker restart, purged queue) blocks identical operations at most this long.
+KONTAINER_STACK_PENDING_MAX_AGE = int(os.getenv("KONTAINER_STACK_PENDING_MAX_AGE", "120"))
+
+
 # Admin
 KONTAINER_ADMIN_USERNAME = os.getenv("KONTAINER_ADMIN_USERNAME", "admin")
 KONTAINER_ADMIN_PASSWORD_FILE = os.getenv("KONTAINER_ADMIN_PASSWORD_FILE", os.path.join(KONTAINER_DATA_DIR, "admin_password.txt"))
@@ -55,6 +74,81 @@ CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL", "redis://localhost:6379/0")
 CELERY_RESULT_BACKEND = os.getenv("CELERY_RESULT_BACKEND", "redis://localhost:6379/0")
 CELERY_RESULT_EXPIRES = int(os.getenv("CELERY_RESULT_EXPIRES", "3600"))
 CELERY_TASK_TIME_LIMIT = int(os.getenv("CELERY_TASK_TIME_LIMIT", "900"))
+# Contexts with dedicated task queues (comma separated context ids),
+# e.g. "prod1,prod2" routes container tasks of prod1 to the queue 'containers.prod1'.
+# Start dedicated workers for these contexts with 'celery_worker.sh --context prod1 ...'
+KONTAINER_ISOLATED_CONTEXTS = [c.strip() for c in os.getenv("KONTAINER_ISOLATED_CONTEXTS", "").split(",") if c.strip()]
+# Contexts served by this worker. Their docker clients are created when a worker process starts.
+KONTAINER_WORKER_CONTEXTS = [c.strip() for c in os.getenv("KONTAINER_WORKER_CONTEXTS", "local").split(",") if c.strip()]
+
+# Task executor settings
+# celery: tasks are run by celery workers, local: tasks are run in a thread pool of the web process (no broker required)
+KONTAINER_TASK_EXECUTOR = os.getenv("KONTAINER_TASK_EXECUTOR", "celery")
+# Number of threads of the local task executor
+KONTAINER_TASK_EXECUTOR_THREADS = int(os.getenv("KONTAINER_TASK_EXECUTOR_THREADS", "4"))
+# Seconds the local task executor keeps the results of finished tasks
+KONTAINER_TASK_RESULT_TTL = int(os.getenv("KONTAINER_TASK_RESULT_TTL", str(CELERY_RESULT_EXPIRES)))
+# Max number of tasks kept in the task history (per context, stack and task type with redis)
+KONTAINER_TASK_HISTORY_SIZE = int(os.getenv("KONTAINER_TASK_HISTORY_SIZE", "1000"))
+# Seconds the task history records are kept in redis
+KONTAINER_TASK_HISTORY_TTL = int(os.getenv("KONTAINER_TASK_HISTORY_TTL", str(7 * 24 * 3600)))
+
+# Download settings
+# Max seconds for a download of a remote file (compose files, templates)
+KONTAINER_DOWNLOAD_TIMEOUT = int(os.getenv("KONTAINER_DOWNLOAD_TIMEOUT", "30"))
+# Max size of a downloaded file in bytes
+KONTAINER_DOWNLOAD_MAX_SIZE = int(os.getenv("KONTAINER_DOWNLOAD_MAX_SIZE", str(20 * 1024 * 1024)))
+# Serve downloaded files without revalidation, if they were fetched within the last n seconds
+KONTAINER_DOWNLOAD_MAX_AGE = int(os.getenv("KONTAINER_DOWNLOAD_MAX_AGE", "60"))
+
+# Task output settings
+# Task outputs larger than n bytes are stored compressed in the blob store, the task result only holds a summary
+KONTAINER_TASK_OUTPUT_INLINE_MAX = int(os.getenv("KONTAINER_TASK_OUTPUT_INLINE_MAX", str(16 * 1024)))
+# Blob store for task outputs: file (data/outputs)
+KONTAINER_BLOB_STORE = os.getenv("KONTAINER_BLOB_STORE", "file")
+# Task outputs older than n seconds are deleted by the cleanup job
+KONTAINER_TASK_OUTPUT_MAX_AGE = int(os.getenv("KONTAINER_TASK_OUTPUT_MAX_AGE", str(7 * 24 * 3600)))
+
+# Periodic job settings
+# Cron schedules (minute hour day-of-month month day-of-week) of the periodic jobs, an empty schedule disables a job.
+KONTAINER_JOB_WARM_DF_SCHEDULE = os.getenv("KONTAINER_JOB_WARM_DF_SCHEDULE", "*/5 * * * *")
+KONTAINER_JOB_WARM_VOLUME_SIZES_SCHEDULE = os.getenv("KONTAINER_JOB_WARM_VOLUME_SIZES_SCHEDULE", "*/30 * * * *")
+KONTAINER_JOB_CHECK_IMAGE_UPDATES_SCHEDULE = os.getenv("KONTAINER_JOB_CHECK_IMAGE_UPDATES_SCHEDULE", "0 */6 * * *")
+KONTAINER_JOB_SYNC_STACKS_SCHEDULE = os.getenv("KONTAINER_JOB_SYNC_STACKS_SCHEDULE", "")
+KONTAINER_JOB_CLEANUP_OUTPUTS_SCHEDULE = os.getenv("KONTAINER_JOB_CLEANUP_OUTPUTS_SCHEDULE", "30 3 * * *")
+# Max seconds each job is delayed, so jobs of multiple hosts do not run at the same time
+KONTAINER_JOB_JITTER = int(os.getenv("KONTAINER_JOB_JITTER", "60"))
+# A job is not run again within n seconds after its start, e.g. by another web process or worker
+KONTAINER_JOB_MIN_INTERVAL = int(os.getenv("KONTAINER_JOB_MIN_INTERVAL", "30"))
+# Run the periodic jobs in the web process with the local task executor (with celery, run celery_beat.sh)
+KONTAINER_SCHEDULER_ENABLED = os.getenv("KONTAINER_SCHEDULER_ENABLED", "true").lower() == "true"
+# Snapshots of precomputed data (df, volume sizes) older than n seconds are not used
+KONTAINER_SNAPSHOT_MAX_AGE = int(os.getenv("KONTAINER_SNAPSHOT_MAX_AGE", "3600"))
+# Seconds the snapshots are kept in redis
+KONTAINER_SNAPSHOT_TTL = int(os.getenv("KONTAINER_SNAPSHOT_TTL", str(24 * 3600)))
+
+# SSH settings
+# Max concurrent channels (remote commands) per pooled SSH transport, must not exceed MaxSessions of sshd
+KONTAINER_SSH_MAX_CHANNELS = int(os.getenv("KONTAINER_SSH_MAX_CHANNELS", "8"))
+# Close pooled SSH transports after n seconds without open channels
+KONTAINER_SSH_IDLE_TIMEOUT = int(os.getenv("KONTAINER_SSH_IDLE_TIMEOUT", "300"))
+# Send a keepalive on pooled SSH transports every n seconds (0 disables keepalives)
+KONTAINER_SSH_KEEPALIVE = int(os.getenv("KONTAINER_SSH_KEEPALIVE", "30"))
+# Timeout in seconds for connecting and opening channels
+KONTAINER_SSH_CONNECT_TIMEOUT = int(os.getenv("KONTAINER_SSH_CONNECT_TIMEOUT", "10"))
+# Max number of hosts, on which a fan-out remote command runs at the same time
+KONTAINER_FANOUT_CONCURRENCY = int(os.getenv("KONTAINER_FANOUT_CONCURRENCY", "10"))
+# Default max seconds a fan-out remote command may run on each host. Keep it below CELERY_TASK_TIME_LIMIT,
+# otherwise a hung host gets the task killed and the results of the other hosts are lost.
+KONTAINER_FANOUT_TIMEOUT = int(os.getenv("KONTAINER_FANOUT_TIMEOUT", "300"))
+
+# Deploy workflow settings
+# Workflow states (steps, timing) are kept for n seconds, failed workflows can be retried within this time
+KONTAINER_WORKFLOW_TTL = int(os.getenv("KONTAINER_WORKFLOW_TTL", str(24 * 3600)))
+
+# Redis settings
+# Used for locks, task events and caches. Defaults to the celery broker.
+KONTAINER_REDIS_URL = os.getenv("KONTAINER_REDIS_URL", CELERY_BROKER_URL)
 
 # AWS settings
 AWS_CLI_BIN = os.getenv("AWS_CLI_BIN", "")
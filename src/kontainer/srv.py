@@ -1,5 +1,6 @@
 from flask import jsonify
 
+from . import settings
 from .app import app
 from .server.internal.admin_api import admin_api_bp
 from .server.internal.auth_api import auth_api_bp
@@ -44,4 +45,10 @@ app.register_blueprint(volumes_api_bp)
 
 # Kubernetes API
 #app.register_blueprint(kube_namespaces_api_bp)
-#app.register_blueprint(kube_pods_api_bp)
\ No newline at end of file
+#app.register_blueprint(kube_pods_api_bp)
+
+# Periodic jobs
+# With the local task executor, the jobs are scheduled by the web process. With celery, run celery_beat.sh
+if settings.KONTAINER_TASK_EXECUTOR == "local" and settings.KONTAINER_SCHEDULER_ENABLED:
+    from .jobs import start_job_scheduler
+    start_job_scheduler()
@@ -1,12 +1,21 @@
 import os
+import shlex
 import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 from docker.constants import DEFAULT_TIMEOUT_SECONDS
 
 from kontainer import settings
+from kontainer.docker.context import get_ssh_config_for_ctx_id
 from kontainer.docker.dkr import get_docker_manager_cached
 from kontainer.stacks import ContainerStack
+from kontainer.util.composefile_util import get_compose_service_dependencies, parse_compose_depends_on_label, \
+    group_services_by_dependencies
+from kontainer.util.remote_utils import remote_shell_path, stream_ssh_command
+from kontainer.util.sftp_util import sync_directory
 from kontainer.util.subprocess_util import kwargs_to_cmdargs, load_envfile
+from kontainer.util.yaml_util import yaml_to_dict
 
 
 class DockerComposeStack(ContainerStack):
@@ -39,79 +48,117 @@ class DockerComposeStack(ContainerStack):
         """
         Run a docker compose command on the remote docker host.
 
+        The changed files of the local project directory are synced to the remote host first (see push()).
+        The command runs on a channel of a pooled ssh transport, so all commands of an operation
+        (e.g. config, pull, build and up of a deployment) share one connection.
+
         :param cmd: Command to run
         :param kwargs: Additional arguments to pass to docker compose
         :return:
         """
-        compose_project_name = self.name
+        ssh_config = self._remote_ssh_config()
+        remote_working_dir = self._remote_working_dir()
         compose_file_name = 'docker-compose.yml'
-        remote_working_dir = f"~/.kontainer/stacks/{self.ctx_id}/{self.name}"
+        if self.project_dir is not None:
+            _, compose_file_name = self._local_compose_paths()
+            self.push()
 
         compose_args = dict()
+        compose_args['project-directory'] = '.'
         compose_args['project-name'] = self.name
-        compose_args['project-directory'] = remote_working_dir
         compose_args['file'] = compose_file_name
-        compose_args['progress'] = 'plain'
         try:
-            pcmd = ((["docker-compose"]
-                     + kwargs_to_cmdargs(compose_args))  # compose specific args
-                    + [cmd]  # the compose command (up/down/...)
-                    + kwargs_to_cmdargs(kwargs))  # additional command args
-            print(f"RAW CMD: {pcmd}")
-            print(f"CMD: {" ".join(pcmd)}")
-
-            # environment variables for docker compose ON THE REMOTE HOST (!)
-            renv = dict()
-            # renv['PATH'] = os.getenv('PATH')
-            # todo renv['DOCKER_HOST'] = 'unix:///var/run/docker.sock' # the docker host on the remote machine
-            # todo renv['DOCKER_CONFIG'] = settings.DOCKER_CONFIG # the docker config on the remote machine
-            renv['COMPOSE_PROJECT_DIRECTORY'] = remote_working_dir
-            renv['COMPOSE_PROJECT_NAME'] = compose_project_name
-            renv['COMPOSE_FILE'] = compose_file_name
-            renv['PWD'] = remote_working_dir
-            # renv['DOCKER_HOST'] = 'unix:///var/run/docker.sock'
-
-            # todo Load .env file into 'renv'
-            # env_file = os.path.join(KONTAINER_DATA_DIR, 'stacks', f'{self.name}.stack.env.production')
-            # if os.path.exists(env_file):
-            #     renv = load_envfile(env_file, renv)
-            # print(f"ENV: {renv}")
-
-            # p1 = subprocess.run(pcmd, cwd=working_dir, env=renv, capture_output=True)
-            # print("STDOUT", p1.stdout)
-            # print("STDERR", p1.stderr)
-            #
-            # if p1.returncode != 0:
-            #     raise Exception(f"Error running command: {p1.stderr}")
-            #
-            # return p1.stdout
-            raise Exception("Docker Compose remote execution not implemented yet")
+            cmd_args = [cmd] + kwargs_to_cmdargs(kwargs)  # the compose command (up/down/...) and its args
+            # the project directory and the compose file are resolved in the remote working dir
+            # the docker compose plugin is preferred, docker-compose v1 is only used, if the plugin is missing.
+            # v1 has no global --progress flag.
+            plugin_cmd = (["docker", "compose"] + kwargs_to_cmdargs(dict(compose_args, progress='plain'))
+                          + cmd_args)
+            v1_cmd = ["docker-compose"] + kwargs_to_cmdargs(compose_args) + cmd_args
+            rcmd = (f"cd {remote_shell_path(remote_working_dir)} && "
+                    f"if docker compose version >/dev/null 2>&1; "
+                    f"then {' '.join(shlex.quote(arg) for arg in plugin_cmd)}; "
+                    f"else {' '.join(shlex.quote(arg) for arg in v1_cmd)}; fi")
+            print(f"CMD: {rcmd}")
+
+            output = {"stdout": [], "stderr": []}
+
+            def _on_output(stream, data):
+                output[stream].append(data)
+                print(data.decode("utf-8", errors="replace"), end="")
+
+            exit_code = stream_ssh_command(ssh_config, rcmd, _on_output, timeout=settings.CELERY_TASK_TIME_LIMIT)
+            if exit_code != 0:
+                raise Exception(f"Error running command: {b''.join(output['stderr'])}")
+
+            return b"".join(output["stdout"])
         except Exception as e:
             print(e)
             raise e
 
 
+    def _remote_ssh_config(self) -> dict:
+        ssh_config = get_ssh_config_for_ctx_id(self.ctx_id)
+        if not ssh_config:
+            raise ValueError(f"No ssh config for docker context {self.ctx_id}")
+        return ssh_config
 
-    def _compose_local(self, cmd, **kwargs) -> bytes:
+
+    def _remote_working_dir(self) -> str:
+        return f"~/.kontainer/stacks/{self.ctx_id}/{self.name}"
+
+
+    def push(self) -> bytes:
         """
-        Run a docker compose command locally
+        Sync the local project directory to the remote docker host.
+        Only changed files are uploaded, files removed locally are deleted on the remote host (see sync_directory).
+        Stacks of the local context are not pushed.
+        """
+        if self.ctx_id == "local" or self.project_dir is None:
+            return b""
 
-        :param cmd: Command to run
-        :param kwargs: Additional arguments to pass to docker compose
-        :return:
+        working_dir, _ = self._local_compose_paths()
+        if not os.path.isdir(working_dir):
+            return b"Stack working dir not found " + self.project_dir.encode("utf-8")
+
+        result = sync_directory(self._remote_ssh_config(), working_dir, self._remote_working_dir(),
+                                timeout=settings.CELERY_TASK_TIME_LIMIT)
+        return (f"Pushed {result['uploaded']} files ({result['bytes']} bytes), "
+                f"deleted {result['deleted']} files in {result['duration']}s\n").encode("utf-8")
+
+
+    def _local_compose_paths(self) -> tuple[str, str]:
         """
+        Get the local working directory and the compose file name of the stack.
 
+        :return: Tuple of (working_dir, compose_file)
+        """
         base_path = ""
         if self.config:
             base_path = self.config.get('base_path', "")
 
         working_dir = str(os.path.join(settings.KONTAINER_DATA_DIR, self.project_dir, base_path))
-        if working_dir is None or not os.path.isdir(working_dir):
-            return b"Stack working dir not found " + self.project_dir.encode("utf-8")
 
         compose_file = 'docker-compose.yml'
-        if os.path.exists(os.path.join(working_dir, 'docker-compose.stack.yml')):
+        if self.config and self.config.get('compose_file', None):
+            compose_file = self.config.get('compose_file')
+        elif os.path.exists(os.path.join(working_dir, 'docker-compose.stack.yml')):
             compose_file = 'docker-compose.stack.yml'
+        return working_dir, compose_file
+
+
+    def _compose_local(self, cmd, **kwargs) -> bytes:
+        """
+        Run a docker compose command locally
+
+        :param cmd: Command to run
+        :param kwargs: Additional arguments to pass to docker compose
+        :return:
+        """
+
+        working_dir, compose_file = self._local_compose_paths()
+        if working_dir is None or not os.path.isdir(working_dir):
+            return b"Stack working dir not found " + self.project_dir.encode("utf-8")
 
         compose_args = dict()
         compose_args['project-name'] = self.name
@@ -233,6 +280,125 @@ class DockerComposeStack(ContainerStack):
         return self._compose("restart", **kwargs)
 
 
+    def rolling_restart(self, batch_size=1, health_timeout=None, progress_callback=None, **kwargs) -> bytes:
+        """
+        Restart the stack containers in batches, ordered by the 'depends_on' graph of the services.
+
+        Containers of services without dependencies are restarted first.
+        A batch never mixes services of different dependency levels.
+        After each batch, wait until all restarted containers report healthy
+        (containers without a healthcheck only need to be running).
+        The rolling restart is aborted, if a container does not become healthy.
+
+        :param batch_size: Number of containers to restart at once
+        :param health_timeout: Max seconds to wait for a container to become healthy
+        :param progress_callback: Optional callback(current, total, message)
+        :return: Output of the rolling restart
+        """
+        print(f"ROLLING RESTART {self.name} in {self.project_dir}")
+        batch_size = max(1, int(batch_size))
+        if health_timeout is None:
+            health_timeout = settings.KONTAINER_ROLLING_HEALTH_TIMEOUT
+
+        containers: list = self._dkr.list_stack_containers(self.name)
+        services = dict()
+        for container in containers:
+            service = container.labels.get("com.docker.compose.service", container.name)
+            services.setdefault(service, []).append(container)
+
+        batches = []
+        for level in group_services_by_dependencies(self._service_dependencies(containers)):
+            level_containers = [c for service in level for c in sorted(services.get(service, []), key=lambda c: c.name)]
+            for i in range(0, len(level_containers), batch_size):
+                batches.append(level_containers[i:i + batch_size])
+
+        def _restart(container) -> tuple:
+            since = time.time()
+            self._dkr.restart_container(container.id)
+            healthy = self._dkr.wait_for_container_healthy(container.id, since=since, timeout=health_timeout)
+            return container, healthy
+
+        out = b""
+        total = len(containers)
+        current = 0
+        with ThreadPoolExecutor(max_workers=batch_size) as executor:
+            for batch in batches:
+                names = ", ".join([c.name for c in batch])
+                out += f"Restarting {names}\n".encode("utf-8")
+                if progress_callback:
+                    progress_callback(current, total, f"Restarting {names}")
+
+                for container, healthy in executor.map(_restart, batch):
+                    current += 1
+                    if not healthy:
+                        raise Exception(f"Rolling restart aborted: "
+                                        f"Container {container.name} did not become healthy within {health_timeout}s")
+                    out += f"Container {container.name} is healthy\n".encode("utf-8")
+
+                if progress_callback:
+                    progress_callback(current, total, f"Restarted {names}")
+        return out
+
+
+    def _service_dependencies(self, containers: list) -> dict:
+        """
+        Get the service dependency graph of the stack.
+        Uses the compose file for managed stacks and the compose container labels as fallback.
+
+        :param containers: List of stack containers
+        :return: Dictionary of service name -> set of service names it depends on
+        """
+        dependencies = dict()
+        for container in containers:
+            service = container.labels.get("com.docker.compose.service", container.name)
+            label = container.labels.get("com.docker.compose.depends_on", "")
+            dependencies.setdefault(service, set()).update(parse_compose_depends_on_label(label))
+
+        if self.managed and self.ctx_id == "local":
+            working_dir, compose_file = self._local_compose_paths()
+            compose_file_path = os.path.join(working_dir, compose_file)
+            if os.path.exists(compose_file_path):
+                with open(compose_file_path, "r") as f:
+                    compose_dependencies = get_compose_service_dependencies(yaml_to_dict(f.read()))
+                for service, deps in compose_dependencies.items():
+                    if service in dependencies:
+                        dependencies[service].update(deps)
+        return dependencies
+
+
+    def pull(self, **kwargs) -> bytes:
+        """
+        Pull the images of the stack.
+
+        Runs docker compose pull
+
+        :param kwargs: Additional arguments to pass to docker compose pull, e.g. the service names
+        """
+        print(f"COMPOSE PULL {self.name} in {self.project_dir}")
+        return self._compose("pull", **kwargs)
+
+
+    def build(self, **kwargs) -> bytes:
+        """
+        Build the images of the stack.
+
+        Runs docker compose build
+
+        :param kwargs: Additional arguments to pass to docker compose build
+        """
+        print(f"COMPOSE BUILD {self.name} in {self.project_dir}")
+        return self._compose("build", **kwargs)
+
+
+    def compose_config(self) -> dict:
+        """
+        Get the resolved compose configuration of the stack (variables interpolated, defaults applied).
+
+        Runs docker compose config. The YAML output is parsed, 'config --format json' is not supported by docker-compose v1.
+        """
+        return yaml_to_dict(self._compose("config").decode("utf-8")) or {}
+
+
     def destroy(self, **kwargs) -> bytes:
         # print(f"COMPOSE DESTROY {self.name} in {self.project_dir}")
         # No docker-specific destroy actions needed.
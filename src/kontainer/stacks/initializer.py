@@ -2,11 +2,14 @@ import json
 import os
 import time
 
-import requests
-
 from kontainer import settings
+from kontainer.admin.portainer import load_portainer_template, portainer_container_to_compose, \
+    PORTAINER_TEMPLATE_TYPE_CONTAINER, PORTAINER_TEMPLATE_TYPE_SWARM_STACK, PORTAINER_TEMPLATE_TYPE_COMPOSE_STACK
 from kontainer.stacks.dockerstacks import DockerComposeStack
-from kontainer.util.git_util import git_clone
+from kontainer.util.download_util import download_cached, DownloadError
+from kontainer.util.gitmirror_util import git_cached_checkout
+from kontainer.util.template_util import render_template_dir, copy_file_fast
+from kontainer.util.yaml_util import dict_to_yaml_string
 
 DATA_DIR = settings.KONTAINER_DATA_DIR
 TEMPLATES_DIR = f"{DATA_DIR}/templates"
@@ -94,22 +97,23 @@ def stack_from_compose_url(ctx_id, stack_name, **kwargs):
     if url is None:
         raise ValueError("URL not provided")
 
+    # download the file (served from the download cache, if unchanged)
+    try:
+        cached_file = download_cached(url)
+    except DownloadError as e:
+        raise ValueError(str(e))
+
+    # @todo parse and validate the content
+
     meta = {
         "compose_url": url
     }
-    stack = _init_docker_compose_stack(ctx_id, stack_name, meta=meta)
-
-    # download the file from the url and build the stack
-    with requests.get(url) as r:
-        content = r.content.decode("utf-8")
-
-    # @todo parse and validate the content
+    stack = _init_docker_compose_stack(ctx_id, stack_name, meta=meta, make_dirs=True)
 
     # Write the content to the stack directory
     full_project_dir = str(os.path.join(settings.KONTAINER_DATA_DIR, stack.project_dir))
     compose_file = os.path.join(full_project_dir, "docker-compose.yml")
-    with open(compose_file, "w") as f:
-        f.write(content)
+    copy_file_fast(cached_file, compose_file)
 
     return stack
 
@@ -135,6 +139,14 @@ def stack_from_gitrepo(ctx_id, stack_name, **kwargs):
         "ref": repo_ref,
     }
 
+    # Optional shallow, partial and sparse checkout settings
+    if kwargs.get("depth", None) is not None:
+        repo["depth"] = int(kwargs.get("depth"))
+    if kwargs.get("filter", None):
+        repo["filter"] = kwargs.get("filter")
+    if kwargs.get("sparse", False):
+        repo["sparse"] = True
+
     # Ensure an private_key_file is set for private repos
     # If private is set to True, then private_key_file must be set
     # The existence of the private key file is NOT checked here
@@ -154,6 +166,8 @@ def stack_from_gitrepo(ctx_id, stack_name, **kwargs):
         "base_path": base_path,
         "repository": repo
     }
+    if kwargs.get("compose_file", None):
+        meta["compose_file"] = kwargs.get("compose_file")
     stack = _init_docker_compose_stack(ctx_id, stack_name, meta=meta, make_dirs=False)
 
     # # Clone the repository
@@ -173,25 +187,29 @@ def stack_from_gitrepo(ctx_id, stack_name, **kwargs):
 
 
 def stack_from_template_repo(ctx_id, stack_name, repo_url=None, template_name=None, parameters=None, **kwargs):
+    """
+    Create a stack from a template directory in a git repository.
+
+    The repository is checked out once per url and ref and shared by all stacks created from it.
+    It is only fetched again, if the last fetch is older than KONTAINER_TEMPLATE_REPO_MAX_AGE.
+    """
     if repo_url is None:
         raise ValueError("URL not provided")
     if template_name is None:
         raise ValueError("Template name not provided")
 
-    repo_base_dir = f"{REPOS_DIR}/{stack_name}"
-    if os.path.exists(repo_base_dir):
-        # todo update repo or delete and clone
-        raise ValueError(f"Repository directory {repo_base_dir} already exists")
-
+    repo_ref = kwargs.get("repo_ref", None) or "HEAD"
     private_key_file = kwargs.get("private_key_file", None)
-    output = git_clone(repo_url,
-                       repo_base_dir,
-                       private_key_file=private_key_file)
-    print(output)
-    print(f"Repository cloned to {repo_base_dir}")
+    with git_cached_checkout(repo_url,
+                             repo_ref,
+                             private_key_file=private_key_file,
+                             max_age=settings.KONTAINER_TEMPLATE_REPO_MAX_AGE) as repo_base_dir:
+        repo_base_dir = os.path.realpath(repo_base_dir)
+        template_dir = os.path.realpath(os.path.join(repo_base_dir, template_name))
+        if template_dir != repo_base_dir and not template_dir.startswith(repo_base_dir + os.sep):
+            raise ValueError(f"Invalid template name {template_name}")
 
-    template_dir = f"{repo_base_dir}/{template_name}"
-    return stack_from_template_dir(stack_name, template_dir, parameters)
+        return stack_from_template_dir(ctx_id, stack_name, template_dir, parameters)
 
 
 def stack_from_template_dir(ctx_id, stack_name, template_dir=None, parameters=None):
@@ -222,30 +240,59 @@ def stack_from_template_dir(ctx_id, stack_name, template_dir=None, parameters=No
     stack = _init_docker_compose_stack(ctx_id, stack_name)
     stack_base_dir = str(os.path.join(settings.KONTAINER_DATA_DIR, stack.project_dir))
 
-    for root, dirs, files in os.walk(template_dir):
-        for file in files:
-            file_path = os.path.join(root, file)
-            rel_path = os.path.relpath(file_path, template_dir)
-            stack_file_path = os.path.join(stack_base_dir, rel_path)
-            os.makedirs(os.path.dirname(stack_file_path), exist_ok=True)
-            with open(file_path, 'r') as f:
-                content = f.read()
-                for key, value in parameters.items():
-                    content = content.replace(f"{{{{ {key} }}}}", value)
-            with open(stack_file_path, 'w') as f:
-                f.write(content)
+    # single pass rendering; binary files and files without placeholders are copied as they are
+    render_template_dir(template_dir, stack_base_dir, parameters)
 
     return stack
 
 
 def stack_from_portainer_template(ctx_id, stack_name, template_url=None, template_name=None, **kwargs):
+    """
+    Create a stack from a portainer app template catalog.
+
+    Container templates (type 1) are converted to a compose file.
+    Stack templates (type 2 and 3) are created as git repository stacks.
+
+    :param template_url: Url of the portainer catalog
+    :param template_name: Name or title of the template in the catalog
+    :param parameters: Values for the env variables of container templates (optional)
+    """
     if template_url is None:
         raise ValueError("Templates URL not provided")
     if template_name is None:
         raise ValueError("Template name not provided")
 
-    # todo download the portainer templates url, extract the template, and build the stack
-    pass
+    try:
+        template = load_portainer_template(template_url, template_name)
+    except DownloadError as e:
+        raise ValueError(str(e))
+
+    template_type = template.get("type", PORTAINER_TEMPLATE_TYPE_CONTAINER)
+    if template_type == PORTAINER_TEMPLATE_TYPE_CONTAINER:
+        compose_data = portainer_container_to_compose(template, kwargs.get("parameters", None))
+
+        meta = {
+            "portainer_template": {"url": template_url, "name": template_name},
+        }
+        stack = _init_docker_compose_stack(ctx_id, stack_name, meta=meta, make_dirs=True)
+        full_project_dir = str(os.path.join(settings.KONTAINER_DATA_DIR, stack.project_dir))
+        with open(os.path.join(full_project_dir, "docker-compose.yml"), "w") as f:
+            f.write(dict_to_yaml_string(compose_data))
+        return stack
+
+    if template_type in (PORTAINER_TEMPLATE_TYPE_SWARM_STACK, PORTAINER_TEMPLATE_TYPE_COMPOSE_STACK):
+        repository = template.get("repository", None) or {}
+        if not repository.get("url", None) or not repository.get("stackfile", None):
+            raise ValueError(f"Stack template {template_name} has no repository")
+
+        # swarm stack files are deployed with docker compose as well
+        stackfile = repository.get("stackfile").strip("/")
+        return stack_from_gitrepo(ctx_id, stack_name,
+                                  repo_url=repository.get("url"),
+                                  base_path=os.path.dirname(stackfile),
+                                  compose_file=os.path.basename(stackfile))
+
+    raise ValueError(f"Unsupported portainer template type {template_type}")
 
 
 # def stack_from_compose_file(stack_name, **kwargs):
@@ -0,0 +1,222 @@
+import fcntl
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+import redis
+
+from kontainer import settings
+from kontainer.taskexecutor import get_task_executor
+from kontainer.util.redis_util import get_redis_client, redis_key
+
+# Per-stack operation locks and coalescing of identical pending stack operations.
+#
+# Only one operation (sync, up, down, ...) may run for a stack (ctx_id, stack_name) at a time.
+# The lock is a redis lock, shared by all celery workers and web processes.
+# If redis is not available, a file lock is used, which is shared by all processes on this host.
+#
+# Identical operations, which are dispatched while the same operation is still pending (queued),
+# are not queued again. The caller receives the task id of the pending task instead.
+# As soon as the pending task starts, new requests for the same operation are queued again,
+# so that changes made after the start of the running operation are not missed.
+# Operations are only coalesced within KONTAINER_STACK_PENDING_MAX_AGE seconds after the pending task was queued,
+# so a queued task, which is lost (broker restart, purged queue), does not swallow further requests for long.
+
+LOCKS_DIR = os.path.join(settings.KONTAINER_DATA_DIR, "locks")
+
+# pending operation key -> (task id, queued time)
+local_pending = dict()
+local_pending_lock = threading.Lock()
+
+# Delete the key only if it still holds the given value
+_compare_and_delete_script = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class StackLockTimeout(Exception):
+    pass
+
+
+@contextmanager
+def stack_lock(ctx_id: str, stack_name: str, timeout=None):
+    """
+    Acquire the exclusive operation lock of a stack.
+
+    :param ctx_id: The context id
+    :param stack_name: The stack name
+    :param timeout: Max seconds to wait for the lock (default: KONTAINER_STACK_LOCK_TIMEOUT)
+    :raises StackLockTimeout: If the lock could not be acquired in time
+    """
+    if timeout is None:
+        timeout = settings.KONTAINER_STACK_LOCK_TIMEOUT
+
+    client = get_redis_client()
+    lock = None
+    if client is not None:
+        # auto-expire the lock, if the worker holding it dies
+        lock = client.lock(redis_key("stacks", "lock", ctx_id, stack_name),
+                           timeout=settings.CELERY_TASK_TIME_LIMIT,
+                           blocking_timeout=timeout)
+        try:
+            if not lock.acquire():
+                raise StackLockTimeout(f"Stack {stack_name} is locked by another operation")
+        except redis.exceptions.ConnectionError as e:
+            print(f"Redis not available, falling back to local stack lock: {e}")
+            lock = None
+
+    if lock is not None:
+        try:
+            yield
+        finally:
+            # Never hide the result or the error of the operation.
+            # The lock expires, if it can not be released (redis not available, lock already expired).
+            try:
+                lock.release()
+            except redis.exceptions.RedisError as e:
+                print(f"Failed to release stack lock of {stack_name}: {e}")
+        return
+
+    with _local_stack_lock(ctx_id, stack_name, timeout):
+        yield
+
+
+@contextmanager
+def _local_stack_lock(ctx_id: str, stack_name: str, timeout: int):
+    """
+    File based stack lock, shared by all processes and threads on this host.
+    """
+    lock_file = os.path.join(LOCKS_DIR, ctx_id, f"{stack_name}.lock")
+    os.makedirs(os.path.dirname(lock_file), exist_ok=True)
+    with open(lock_file, "w") as f:
+        deadline = time.time() + timeout
+        while True:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                if time.time() >= deadline:
+                    raise StackLockTimeout(f"Stack {stack_name} is locked by another operation")
+                time.sleep(0.2)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _pending_key(task_name: str, ctx_id: str, stack_name: str, args: list, kwargs: dict) -> str:
+    operation = json.dumps({"task": task_name, "args": list(args), "kwargs": kwargs}, sort_keys=True, default=str)
+    return redis_key("stacks", "pending", ctx_id, stack_name, uuid.uuid5(uuid.NAMESPACE_OID, operation))
+
+
+def dispatch_stack_task(task, ctx_id: str, stack_name: str, args=None, kwargs=None) -> tuple[str, bool]:
+    """
+    Dispatch a stack task, unless an identical task is already pending.
+
+    The first two task arguments must be the context id and the stack name.
+
+    :param task: The celery task, submitted with the configured task executor
+    :param ctx_id: The context id
+    :param stack_name: The stack name
+    :param args: Additional task arguments
+    :param kwargs: Task keyword arguments
+    :return: Tuple of (task_id, coalesced). coalesced is True, if an existing pending task has been returned.
+    """
+    args = [ctx_id, stack_name] + list(args or [])
+    kwargs = kwargs or {}
+    key = _pending_key(task.name, ctx_id, stack_name, args, kwargs)
+    task_id = str(uuid.uuid4())
+
+    client = get_redis_client()
+    try:
+        if client is not None and not client.set(key, task_id, nx=True, ex=settings.KONTAINER_STACK_PENDING_MAX_AGE):
+            pending_task_id = client.get(key)
+            if pending_task_id is not None:
+                return pending_task_id.decode("utf-8"), True
+            client.set(key, task_id, ex=settings.KONTAINER_STACK_PENDING_MAX_AGE)
+    except redis.exceptions.ConnectionError as e:
+        print(f"Redis not available, falling back to local pending operations: {e}")
+        client = None
+
+    if client is not None:
+        try:
+            get_task_executor().submit(task, args=args, kwargs=kwargs, task_id=task_id)
+        except Exception:
+            try:
+                client.eval(_compare_and_delete_script, 1, key, task_id)
+            except redis.exceptions.RedisError as e:
+                print(f"Failed to clear pending stack operation: {e}")
+            raise
+        return task_id, False
+
+    # The local marker can not be cleared by a worker in another process,
+    # so only coalesce as long as the result backend reports the task as pending.
+    with local_pending_lock:
+        pending_task_id, queued = local_pending.get(key, (None, 0))
+        if pending_task_id is not None and time.time() - queued < settings.KONTAINER_STACK_PENDING_MAX_AGE \
+                and _is_task_pending(pending_task_id):
+            return pending_task_id, True
+        local_pending[key] = (task_id, time.time())
+    get_task_executor().submit(task, args=args, kwargs=kwargs, task_id=task_id)
+    return task_id, False
+
+
+def _is_task_pending(task_id: str) -> bool:
+    try:
+        return get_task_executor().get_status(task_id)["state"] == "PENDING"
+    except Exception as e:
+        print(f"Failed to lookup state of task {task_id}: {e}")
+        return False
+
+
+def _clear_pending(task, ctx_id: str, stack_name: str) -> None:
+    """
+    Clear the pending marker of a started stack task,
+    so that new identical requests are queued again.
+    """
+    task_id = task.request.id
+    if task_id is None:
+        return
+
+    key = _pending_key(task.name, ctx_id, stack_name, task.request.args or [], task.request.kwargs or {})
+    client = get_redis_client()
+    try:
+        if client is not None:
+            client.eval(_compare_and_delete_script, 1, key, task_id)
+    except redis.exceptions.ConnectionError as e:
+        print(f"Failed to clear pending stack operation: {e}")
+
+    with local_pending_lock:
+        if local_pending.get(key, (None, 0))[0] == task_id:
+            del local_pending[key]
+
+
+@contextmanager
+def stack_operation(task, ctx_id: str, stack_name: str, lock=True):
+    """
+    Run a stack task body exclusively for the stack.
+
+    Usage:
+        @celery.task(bind=True)
+        def stack_sync_task(self, ctx_id, stack_name):
+            with stack_operation(self, ctx_id, stack_name):
+                ...
+
+    :param task: The bound celery task
+    :param ctx_id: The context id
+    :param stack_name: The stack name
+    :param lock: If False, only clear the pending marker (for tasks, which lock the stacks themselves)
+    """
+    _clear_pending(task, ctx_id, stack_name)
+    if not lock:
+        yield
+        return
+
+    with stack_lock(ctx_id, stack_name):
+        yield
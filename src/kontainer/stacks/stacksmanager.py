@@ -6,7 +6,7 @@ from . import ContainerStack
 from .initializer import stack_from_portainer_template, stack_from_gitrepo, \
     stack_from_compose_url, stack_from_scratch, stack_from_template_repo, stack_from_template
 from .dockerstacks import DockerComposeStack, UnmanagedDockerComposeStack
-from .sync import sync_stack
+from .sync import sync_stack, sync_repository_stacks
 from ..settings import KONTAINER_DATA_DIR
 
 
@@ -33,6 +33,14 @@ def get_stacks_manager(ctx_id):
     return stack_manager
 
 
+def reset_stacks_manager_cache():
+    """
+    Drop all cached stack managers (and the docker managers of their stacks),
+    e.g. in forked worker processes.
+    """
+    stack_manager_cache.clear()
+
+
 class StacksManager:
 
     # register the default initializers
@@ -156,9 +164,14 @@ class StacksManager:
 
 
     
-    def restart(self, name) -> bytes:
+    def restart(self, name, strategy=None, **kwargs) -> bytes:
         stack = self.get_or_unmanaged(name)
-        return stack.restart()
+        if strategy is None or strategy == "" or strategy == "all":
+            return stack.restart()
+        elif strategy == "rolling":
+            return stack.rolling_restart(**kwargs)
+
+        raise ValueError(f"Unknown restart strategy: {strategy}")
 
 
     
@@ -210,10 +223,7 @@ class StacksManager:
         return out
 
     
-    def sync(self, name) -> bytes:
-        if self.ctx_id != "local":
-            raise ValueError("Sync is only supported for local stacks")
-
+    def sync(self, name, force=False) -> bytes:
         # Refresh the list of stacks
         # @todo find a better way to refresh the list of stacks before sync
         self.enumerate()
@@ -222,4 +232,19 @@ class StacksManager:
         if stack is None or stack.managed == False or isinstance(stack, UnmanagedDockerComposeStack):
             raise ValueError(f"Cannot sync unmanaged stack {name}")
 
-        return sync_stack(stack)
+        if self.ctx_id != "local":
+            # Stacks of remote contexts are synced locally, then the changed files are pushed to the remote host.
+            # Git repositories are only supported for local stacks.
+            if isinstance(stack.config.get("repository", None), dict):
+                raise ValueError("Sync from a git repository is only supported for local stacks")
+            return sync_stack(stack, force=force) + b"\n" + stack.push()
+
+        return sync_stack(stack, force=force)
+
+
+    def sync_repository(self, repo_url, progress_callback=None) -> bytes:
+        if self.ctx_id != "local":
+            raise ValueError("Sync is only supported for local stacks")
+
+        self.enumerate()
+        return sync_repository_stacks(list(self.list_all()), repo_url, progress_callback=progress_callback)
@@ -1,26 +1,42 @@
 import os
+import re
+import time
 
 from kontainer import settings
 from kontainer.admin.credentials import private_key_exists
 from kontainer.settings import get_real_app_data_path
 from kontainer.stacks import ContainerStack
+from kontainer.stacks.locks import stack_lock
 from kontainer.stacks.stackfile import Stackfile
 from kontainer.util.composefile_util import modify_docker_compose_volumes
-from kontainer.util.git_util import git_clone, git_pull_head
+from kontainer.util.git_util import git_clone, git_pull_head, git_fetch_reset, git_sparse_checkout_set, \
+    git_ls_remote, git_rev_parse
+from kontainer.util.gitmirror_util import git_mirror_update, git_mirror_checkout, is_git_worktree, \
+    normalize_repo_url, git_mirror_rev_parse
 from kontainer.util.rgit_util import rgit_clone
 
 
-def sync_stack(stack: ContainerStack) -> bytes:
+def sync_stack(stack: ContainerStack, force=False, mirror_fetched=False) -> bytes:
     """
     Sync a stack with the repository or compose URL
 
     :param stack: The stack to sync
+    :param force: If True, sync even if the stack is already up to date with the repository
+    :param mirror_fetched: True, if the caller has just fetched the repository mirror (see sync_repository_stacks).
+                           Otherwise, the remote ref is always looked up in the remote repository.
     :return: The output of the sync operation
     """
     config = stack.config
     if config is None:
         raise ValueError("No stack config found")
 
+    # skip the sync, if the checkout is already at the remote commit
+    repo = config.get("repository", None)
+    if not force and repo is not None and isinstance(repo, dict) and repo.get("url"):
+        remote_commit = _stack_git_repo_up_to_date(stack, repo, mirror_fetched=mirror_fetched)
+        if remote_commit is not None:
+            return b"Already up to date: " + remote_commit.encode()
+
     parsed_compose_file_path = None
     base_path = config.get("base_path", "")
     full_project_path = os.path.join(settings.KONTAINER_DATA_DIR, stack.project_dir, base_path)
@@ -29,7 +45,7 @@ def sync_stack(stack: ContainerStack) -> bytes:
     # sync the stack from a git repository, if any
     repo = config.get("repository", None)
     if repo is not None and isinstance(repo, dict):
-        out += _sync_stack_git_repo(stack, repo)
+        out += _sync_stack_git_repo(stack, repo, mirror_fetched=mirror_fetched)
     else:
         # raise ValueError("No repository or compose URL provided")
         out += b"Warning: No repository or other sync source provided."
@@ -49,6 +65,7 @@ def sync_stack(stack: ContainerStack) -> bytes:
 
     if parsed_compose_file_path:
         out += b"Parsed docker-compose file: " + parsed_compose_file_path.encode()
+        _record_synced_commit(stack)
         return out
 
     #out += b"Warning: No docker-compose or stack file detected."
@@ -56,6 +73,114 @@ def sync_stack(stack: ContainerStack) -> bytes:
     raise ValueError("No docker-compose or stack file detected.")
 
 
+def sync_repository_stacks(stacks: list, repo_url: str, progress_callback=None) -> bytes:
+    """
+    Sync all stacks, which are checked out from the given repository.
+
+    The shared repository mirror is fetched once,
+    then the checkouts of all dependent stacks are updated.
+
+    :param stacks: The stacks to pick the dependent stacks from
+    :param repo_url: The repository url
+    :param progress_callback: Optional callback(current, total, message), called before each stack sync
+    :return: The output of the sync operations
+    """
+    normalized_url = normalize_repo_url(repo_url)
+    repo_stacks = []
+    for stack in stacks:
+        repo = stack.config.get("repository", None) if stack.managed and stack.config else None
+        if isinstance(repo, dict) and repo.get("url") and normalize_repo_url(repo.get("url")) == normalized_url:
+            repo_stacks.append(stack)
+
+    if len(repo_stacks) == 0:
+        raise ValueError(f"No stacks found for repository {repo_url}")
+
+    out = b""
+    if settings.KONTAINER_GIT_MIRROR_ENABLED:
+        repo = repo_stacks[0].config.get("repository")
+        out += git_mirror_update(repo.get("url"),
+                                 private_key_file=_lookup_ssh_key_for_repo(repo),
+                                 filter=repo.get("filter", None),
+                                 timeout=120)
+
+    for i, stack in enumerate(repo_stacks):
+        if progress_callback is not None:
+            progress_callback(i, len(repo_stacks), f"Syncing stack {stack.name}")
+        out += f"\n\nSyncing stack {stack.name}\n".encode("utf-8")
+        try:
+            with stack_lock(stack.ctx_id, stack.name):
+                # the mirror has just been fetched, the stacks do not need to ask the remote again
+                out += sync_stack(stack, mirror_fetched=settings.KONTAINER_GIT_MIRROR_ENABLED)
+        except Exception as e:
+            out += f"Error syncing stack {stack.name}: {e}".encode("utf-8")
+    return out
+
+
+def _stack_git_repo_up_to_date(stack: ContainerStack, repo: dict, mirror_fetched=False) -> str | None:
+    """
+    Check if the local checkout of a stack is at the commit of the tracked remote ref
+    and the stack has been synced successfully at this commit.
+
+    The remote commit is looked up with 'git ls-remote', which does not transfer any objects.
+    Only if the caller has just fetched the repository mirror, the commit is looked up in the mirror.
+    A recent fetch alone is not trusted: a push after the fetch would be reported as up to date.
+
+    :param stack: The stack to check
+    :param repo: The repository metadata
+    :param mirror_fetched: True, if the caller has just fetched the repository mirror
+    :return: The commit hash, if the stack is up to date, otherwise None
+    """
+    full_project_dir = str(os.path.join(settings.KONTAINER_DATA_DIR, stack.project_dir))
+    synced_commit = stack.config.get("_synced_commit", None)
+    if stack.ctx_id != "local" or synced_commit is None or not os.path.exists(full_project_dir):
+        return None
+
+    repo_url = repo.get("url")
+    repo_branch = repo.get("branch", "main")
+    try:
+        local_commit = git_rev_parse(full_project_dir, "HEAD", timeout=10)
+        if local_commit != synced_commit:
+            return None
+
+        if re.fullmatch(r"[0-9a-f]{40}", repo_branch):
+            remote_commit = repo_branch
+        else:
+            remote_commit = None
+            if mirror_fetched and is_git_worktree(full_project_dir):
+                remote_commit = git_mirror_rev_parse(repo_url, repo_branch, max_age=settings.KONTAINER_GIT_MIRROR_MAX_AGE)
+            if remote_commit is None:
+                remote_commit = git_ls_remote(repo_url, repo_branch,
+                                              private_key_file=_lookup_ssh_key_for_repo(repo),
+                                              timeout=30)
+    except Exception as e:
+        print(f"Failed to check remote commit of {repo_url}: {e}")
+        return None
+
+    if remote_commit is None or remote_commit != local_commit:
+        return None
+    return remote_commit
+
+
+def _record_synced_commit(stack: ContainerStack) -> None:
+    """
+    Record the checked out commit of a successfully synced stack in the stack config.
+
+    :param stack: The synced stack
+    """
+    repo = stack.config.get("repository", None)
+    full_project_dir = str(os.path.join(settings.KONTAINER_DATA_DIR, stack.project_dir))
+    if (stack.ctx_id != "local" or not isinstance(repo, dict) or not repo.get("url")
+            or not os.path.exists(os.path.join(full_project_dir, ".git"))):
+        return
+
+    try:
+        stack.config["_synced_commit"] = git_rev_parse(full_project_dir, "HEAD", timeout=10)
+        stack.config["_synced"] = int(time.time())
+        stack.dump()
+    except Exception as e:
+        print(f"Failed to record synced commit of stack {stack.name}: {e}")
+
+
 def _lookup_ssh_key_for_repo(repo: dict):
     """
     Get the SSH private key for a repository
@@ -85,12 +210,14 @@ def _lookup_ssh_key_for_repo(repo: dict):
     return private_key_file
 
 
-def _sync_stack_git_repo(stack: ContainerStack, repo: dict):
+def _sync_stack_git_repo(stack: ContainerStack, repo: dict, mirror_fetched=False):
     """
     Sync a stack from a git repository
 
     :param stack: The stack to sync
     :param repo: The repository metadata
+    :param mirror_fetched: True, if the caller has just fetched the repository mirror.
+                           Otherwise, the mirror is always fetched.
     :return: The output of the git command
     """
     repo_url = repo.get("url", "")
@@ -104,8 +231,63 @@ def _sync_stack_git_repo(stack: ContainerStack, repo: dict):
         "private_key_file": private_key_file,
     }
 
+    # Shallow, partial and sparse checkouts
+    # depth: Limit the history to the given number of commits, e.g. 1
+    # filter: Partial clone object filter, e.g. 'blob:none'
+    # sparse: Limit the working tree to the stack's base_path
+    depth = repo.get("depth", None)
+    object_filter = repo.get("filter", None)
+    sparse_paths = [stack.config.get("base_path")] if repo.get("sparse", False) and stack.config.get("base_path") else []
+    is_partial = depth is not None or object_filter is not None or len(sparse_paths) > 0
+
+    # Shared mirror cache
+    # Stacks from the same repository are checked out as worktrees of a shared bare mirror.
+    # Existing full clones are kept as they are.
+    use_mirror = (repo.get("mirror", settings.KONTAINER_GIT_MIRROR_ENABLED)
+                  and (not os.path.exists(full_project_dir) or is_git_worktree(full_project_dir)))
+
     output = b""
-    if stack.ctx_id == "local" and os.path.exists(full_project_dir):
+    if stack.ctx_id == "local" and use_mirror:
+        try:
+            output += git_mirror_update(repo_url,
+                                        private_key_file=private_key_file,
+                                        filter=object_filter,
+                                        max_age=settings.KONTAINER_GIT_MIRROR_MAX_AGE if mirror_fetched else 0,
+                                        timeout=120)
+            checkout_output = git_mirror_checkout(repo_url,
+                                                  dest=full_project_dir,
+                                                  ref=repo_branch,
+                                                  private_key_file=private_key_file,
+                                                  sparse_paths=sparse_paths,
+                                                  timeout=120)
+
+            print(checkout_output)
+            print(f"Checked out git mirror worktree at {stack.project_dir}")
+            output += checkout_output
+        except Exception as e:
+            raise ValueError(f"Error updating repository worktree: {e}")
+
+    elif stack.ctx_id == "local" and os.path.exists(full_project_dir) and is_partial:
+        # Fetch the latest changes of the tracked branch only
+        try:
+            if sparse_paths:
+                output += git_sparse_checkout_set(full_project_dir, sparse_paths,
+                                                  private_key_file=private_key_file, timeout=30)
+
+            fetch_output = git_fetch_reset(full_project_dir,
+                                           repo_branch,
+                                           depth=depth,
+                                           filter=object_filter,
+                                           private_key_file=private_key_file,
+                                           timeout=120)
+
+            print(fetch_output)
+            print(f"Updated git repo at {stack.project_dir}")
+            output += fetch_output
+        except Exception as e:
+            raise ValueError(f"Error updating repository: {e}")
+
+    elif stack.ctx_id == "local" and os.path.exists(full_project_dir):
         # Pull the latest changes
         try:
             pull_output = git_pull_head(full_project_dir,
@@ -130,8 +312,14 @@ def _sync_stack_git_repo(stack: ContainerStack, repo: dict):
                                      private_key_file=private_key_file,
                                      single_branch=True,
                                      branch=repo_branch,
+                                     depth=depth,
+                                     filter=object_filter,
+                                     sparse=len(sparse_paths) > 0,
                                      timeout=120)
 
+            if sparse_paths:
+                clone_output += git_sparse_checkout_set(full_project_dir, sparse_paths,
+                                                        private_key_file=private_key_file, timeout=30)
 
             print(clone_output)
             print(f"Cloned git repo to {stack.project_dir}")
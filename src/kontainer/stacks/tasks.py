@@ -1,49 +1,109 @@
+import uuid
+
 from kontainer.celery import celery
+from kontainer.stacks.locks import stack_operation
 from kontainer.stacks.stacksmanager import get_stacks_manager
+from kontainer.stacks.workflows import new_workflow, load_workflow, run_deploy_workflow
+from kontainer.taskevents import report_progress
+from kontainer.taskoutputs import store_task_output
 
 
 @celery.task(bind=True)
 def create_stack_task(self, ctx_id, stack_name, initializer_name, **kwargs):
-    stack = get_stacks_manager(ctx_id).get(stack_name)
-    if stack is not None:
-        raise ValueError(f"Stack {stack_name} already exists")
+    with stack_operation(self, ctx_id, stack_name):
+        stack = get_stacks_manager(ctx_id).get(stack_name)
+        if stack is not None:
+            raise ValueError(f"Stack {stack_name} already exists")
 
-    print(f"Creating stack {stack_name}")
-    stack = get_stacks_manager(ctx_id).init_stack(stack_name, initializer_name, **kwargs)
-    return stack.__dict__
+        print(f"Creating stack {stack_name}")
+        stack = get_stacks_manager(ctx_id).init_stack(stack_name, initializer_name, **kwargs)
+        return stack.__dict__
 
 
 @celery.task(bind=True)
 def stack_start_task(self, ctx_id, stack_name):
     print(f"Stack START {stack_name}")
-    return get_stacks_manager(ctx_id).start(stack_name)
+    with stack_operation(self, ctx_id, stack_name):
+        return store_task_output(self, get_stacks_manager(ctx_id).start(stack_name))
 
 
 @celery.task(bind=True)
 def stack_stop_task(self, ctx_id, stack_name):
     print(f"Stack STOP {stack_name}")
-    return get_stacks_manager(ctx_id).stop(stack_name)
+    with stack_operation(self, ctx_id, stack_name):
+        return store_task_output(self, get_stacks_manager(ctx_id).stop(stack_name))
 
 
 @celery.task(bind=True)
-def stack_restart_task(self, ctx_id, stack_name):
-    print(f"Stack RESTART {stack_name}")
-    return get_stacks_manager(ctx_id).restart(stack_name)
+def stack_restart_task(self, ctx_id, stack_name, strategy=None, batch_size=1):
+    print(f"Stack RESTART {stack_name} (strategy={strategy})")
+
+    def _progress(current, total, message):
+        report_progress(self, current, total, message)
+
+    with stack_operation(self, ctx_id, stack_name):
+        if strategy == "rolling":
+            return store_task_output(self, get_stacks_manager(ctx_id).restart(stack_name, strategy=strategy,
+                                                                              batch_size=batch_size,
+                                                                              progress_callback=_progress))
+        return store_task_output(self, get_stacks_manager(ctx_id).restart(stack_name, strategy=strategy))
 
 
 @celery.task(bind=True)
 def stack_delete_task(self,ctx_id,  stack_name):
     print(f"Stack DELETE {stack_name}")
-    return get_stacks_manager(ctx_id).delete(stack_name)
+    with stack_operation(self, ctx_id, stack_name):
+        return store_task_output(self, get_stacks_manager(ctx_id).delete(stack_name))
 
 
 @celery.task(bind=True)
 def stack_destroy_task(self, ctx_id, stack_name):
     print(f"Stack DESTROY {stack_name}")
-    return get_stacks_manager(ctx_id).destroy(stack_name)
+    with stack_operation(self, ctx_id, stack_name):
+        return store_task_output(self, get_stacks_manager(ctx_id).destroy(stack_name))
 
 
 @celery.task(bind=True)
-def stack_sync_task(self, ctx_id, stack_name):
+def stack_sync_task(self, ctx_id, stack_name, force=False):
     print(f"Stack SYNC {stack_name}")
-    return get_stacks_manager(ctx_id).sync(stack_name)
+    with stack_operation(self, ctx_id, stack_name):
+        return store_task_output(self, get_stacks_manager(ctx_id).sync(stack_name, force=force))
+
+
+@celery.task(bind=True)
+def repository_sync_task(self, ctx_id, repo_url):
+    print(f"Repository SYNC {repo_url}")
+    # Each stack of the repository is locked separately during its sync
+    with stack_operation(self, ctx_id, repo_url, lock=False):
+        return store_task_output(self, get_stacks_manager(ctx_id).sync_repository(
+            repo_url, progress_callback=lambda current, total, message: report_progress(self, current, total, message)))
+
+
+@celery.task(bind=True)
+def stack_deploy_task(self, ctx_id, stack_name, workflow_id=None, force=False):
+    """
+    Run the deploy workflow (sync, pull, build, up) of a stack.
+    Without a workflow id, a new workflow is started with the task id as workflow id.
+    With the id of a failed workflow, the workflow is continued with the failed step.
+    """
+    print(f"Stack DEPLOY {stack_name} (workflow={workflow_id})")
+    with stack_operation(self, ctx_id, stack_name):
+        if workflow_id is None:
+            workflow = new_workflow(self.request.id or str(uuid.uuid4()), ctx_id, stack_name)
+        else:
+            workflow = load_workflow(ctx_id, workflow_id)
+            if workflow is None or workflow["stack"] != stack_name:
+                raise ValueError(f"Workflow {workflow_id} of stack {stack_name} not found")
+        workflow["task_id"] = self.request.id
+
+        stacks_manager = get_stacks_manager(ctx_id)
+        stacks_manager.enumerate()
+        stack = stacks_manager.get(stack_name)
+        if stack is None:
+            raise ValueError(f"Cannot deploy unmanaged stack {stack_name}")
+
+        def _progress(current, total, message):
+            report_progress(self, current, total, message,
+                            workflow_id=workflow["workflow_id"], steps=workflow["steps"])
+
+        return store_task_output(self, run_deploy_workflow(stack, workflow, force=force, progress_callback=_progress))
@@ -0,0 +1,272 @@
+import hashlib
+import json
+import time
+
+from docker.errors import ImageNotFound
+
+from kontainer import settings
+from kontainer.stacks import ContainerStack
+from kontainer.stacks.sync import sync_stack
+from kontainer.taskexecutor import get_task_executor
+from kontainer.util.snapshot_util import save_snapshot, load_snapshot
+
+# Deploy workflows
+#
+# A deploy runs the steps sync -> pull -> build -> up of a stack in a single stack task (stack_deploy_task),
+# so no other operation of the stack can run between the steps.
+#
+# Steps, whose inputs have not changed since their last successful run, are skipped (unless forced):
+# sync:  The checkout is at the commit of the remote ref (see sync_stack).
+#        Stacks of remote contexts are synced locally and the changed files are pushed (see sync_directory).
+# pull:  The local images have the digests of the images in the registry
+# build: Same commit and compose config as the last build
+# up:    Same compose config and image ids as the last up, and the containers of all services are running
+#
+# The fingerprints of the last successful steps are stored in the stack config ('_deploy').
+# The workflow state (state, timing and error of each step) is stored as snapshot for KONTAINER_WORKFLOW_TTL seconds:
+# {"workflow_id": "...", "ctx_id": "local", "stack": "app", "state": "failed", "task_id": "...",
+#  "steps": [{"name": "sync", "state": "skipped", "started": ..., "finished": ..., "duration": 0.4, ...}, ...]}
+#
+# A failed workflow can be retried. The retry continues with the failed step, finished steps are not run again.
+# A workflow, whose task has died (worker killed or restarted), stays in the state 'running'.
+# It can be retried as well, as soon as the task is no longer active (see is_workflow_active).
+
+DEPLOY_STEPS = ("sync", "pull", "build", "up")
+
+WORKFLOW_DONE_STEP_STATES = ("success", "skipped")
+
+
+def _workflow_snapshot_name(workflow_id: str) -> str:
+    return f"workflow-{workflow_id}"
+
+
+def new_workflow(workflow_id: str, ctx_id: str, stack_name: str) -> dict:
+    """
+    Create the state of a new deploy workflow.
+
+    :param workflow_id: The workflow id
+    :param ctx_id: The context id
+    :param stack_name: The stack name
+    :return: The workflow state
+    """
+    return {
+        "workflow_id": workflow_id,
+        "type": "deploy",
+        "ctx_id": ctx_id,
+        "stack": stack_name,
+        "state": "pending",
+        "task_id": None,
+        "created": time.time(),
+        "steps": [{"name": name, "state": "pending", "attempts": 0, "started": None, "finished": None,
+                   "duration": None, "message": None, "error": None} for name in DEPLOY_STEPS],
+    }
+
+
+def load_workflow(ctx_id: str, workflow_id: str) -> dict | None:
+    """
+    Load the state of a workflow.
+
+    :param ctx_id: The context id
+    :param workflow_id: The workflow id
+    :return: The workflow state or None, if the workflow does not exist (anymore)
+    """
+    snapshot = load_snapshot(_workflow_snapshot_name(workflow_id), ctx_id, max_age=settings.KONTAINER_WORKFLOW_TTL)
+    return snapshot["data"] if snapshot is not None else None
+
+
+def save_workflow(workflow: dict) -> None:
+    workflow["updated"] = time.time()
+    save_snapshot(_workflow_snapshot_name(workflow["workflow_id"]), workflow["ctx_id"], workflow,
+                  ttl=settings.KONTAINER_WORKFLOW_TTL)
+
+
+def is_workflow_active(workflow: dict) -> bool:
+    """
+    Check, if the task of a running workflow is still active.
+
+    The task is not active, if it is unknown to the task executor (PENDING, e.g. the result was lost
+    when the worker was restarted) or has finished. A task, which has not updated the workflow for longer than
+    the task time limit, has been killed, even if the result backend still reports it as started.
+    A queued retry is PENDING as well, identical retries are coalesced by dispatch_stack_task.
+
+    :param workflow: The workflow state
+    :return: True, if the workflow is still being run by its task
+    """
+    if workflow["state"] != "running" or workflow.get("task_id", None) is None:
+        return False
+    if time.time() - workflow.get("updated", workflow["created"]) > settings.CELERY_TASK_TIME_LIMIT:
+        return False
+    return get_task_executor().get_status(workflow["task_id"])["state"] in ("STARTED", "PROGRESS", "RETRY")
+
+
+def _fingerprint(*parts) -> str:
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def _deployed_fingerprints(stack: ContainerStack) -> dict:
+    return stack.config.get("_deploy", None) or {}
+
+
+def _record_fingerprint(stack: ContainerStack, step: str, fingerprint: str) -> None:
+    if not stack.managed:
+        return
+    stack.config["_deploy"] = dict(_deployed_fingerprints(stack), **{step: fingerprint})
+    stack.dump()
+
+
+def _compose_services(stack, run: dict) -> dict:
+    """
+    Get the services of the resolved compose config. The config is read once per run, after the sync.
+    """
+    if run.get("services", None) is None:
+        run["services"] = stack.compose_config().get("services", None) or {}
+    return run["services"]
+
+
+def _service_image(stack, service_name: str, service: dict) -> str:
+    # docker compose names built images without an explicit image name <project>-<service>
+    return service.get("image", None) or f"{stack.name}-{service_name}"
+
+
+def _image_up_to_date(stack, image: str) -> bool:
+    """
+    Check, if the local image has the digest of the image in the registry.
+    """
+    client = stack._dkr.client
+    try:
+        local_image = client.images.get(image)
+    except ImageNotFound:
+        return False
+
+    local_digests = {d.split("@", 1)[1] for d in local_image.attrs.get("RepoDigests") or [] if "@" in d}
+    try:
+        return client.images.get_registry_data(image).id in local_digests
+    except Exception as e:
+        print(f"Failed to lookup registry digest of {image}: {e}")
+        return False
+
+
+def _step_sync(stack, run: dict) -> tuple[bytes, bool]:
+    if stack.ctx_id != "local":
+        if isinstance(stack.config.get("repository", None), dict):
+            return b"Sync from a git repository is only supported for local stacks", True
+        # the changed files are pushed to the remote host
+        return sync_stack(stack, force=run["force"]) + b"\n" + stack.push(), False
+
+    out = sync_stack(stack, force=run["force"])
+    return out, out.startswith(b"Already up to date")
+
+
+def _step_pull(stack, run: dict) -> tuple[bytes, bool]:
+    services = _compose_services(stack, run)
+    images = sorted({service["image"] for service in services.values()
+                     if service.get("image") and not service.get("build")
+                     and service.get("pull_policy", None) not in ("never", "build")})
+    if len(images) == 0:
+        return b"No images to pull", True
+
+    if not run["force"] and all(_image_up_to_date(stack, image) for image in images):
+        return f"Images up to date: {', '.join(images)}".encode("utf-8"), True
+
+    return stack.pull(), False
+
+
+def _step_build(stack, run: dict) -> tuple[bytes, bool]:
+    services = _compose_services(stack, run)
+    if not any(service.get("build") for service in services.values()):
+        return b"No images to build", True
+
+    # the build context is only known to be unchanged for stacks checked out at a commit
+    commit = stack.config.get("_synced_commit", None) if stack.managed else None
+    fingerprint = _fingerprint(commit, services)
+    if not run["force"] and commit is not None and _deployed_fingerprints(stack).get("build") == fingerprint:
+        return f"Images already built at commit {commit}".encode("utf-8"), True
+
+    out = stack.build()
+    _record_fingerprint(stack, "build", fingerprint)
+    return out, False
+
+
+def _step_up(stack, run: dict) -> tuple[bytes, bool]:
+    services = _compose_services(stack, run)
+
+    def _image_id(image):
+        try:
+            return stack._dkr.client.images.get(image).id
+        except ImageNotFound:
+            return None
+
+    image_ids = {name: _image_id(_service_image(stack, name, service)) for name, service in services.items()}
+    fingerprint = _fingerprint(services, image_ids)
+    if not run["force"] and _deployed_fingerprints(stack).get("up") == fingerprint:
+        running_services = {c.labels.get("com.docker.compose.service") for c in
+                            stack._dkr.list_stack_containers(stack.name) if c.status == "running"}
+        if running_services.issuperset(services.keys()):
+            return b"Stack is up to date", True
+
+    # images have been pulled and built by the previous steps,
+    # compose recreates only the containers with a changed config or image
+    out = stack.up(build=False, **{"force-recreate": False})
+    _record_fingerprint(stack, "up", fingerprint)
+    return out, False
+
+
+DEPLOY_STEP_FUNCTIONS = {
+    "sync": _step_sync,
+    "pull": _step_pull,
+    "build": _step_build,
+    "up": _step_up,
+}
+
+
+def run_deploy_workflow(stack, workflow: dict, force=False, progress_callback=None) -> bytes:
+    """
+    Run the pending and failed steps of a deploy workflow.
+    The workflow state is saved before and after each step.
+
+    :param stack: The stack to deploy
+    :param workflow: The workflow state (see new_workflow), updated in place
+    :param force: If True, run all steps, even if their inputs have not changed
+    :param progress_callback: Optional callback(current, total, message), called before each step
+    :return: The output of the steps
+    :raises Exception: The error of the failed step. The workflow state is saved as failed.
+    """
+    steps = workflow["steps"]
+    run = {"force": force, "services": None}
+    out = b""
+
+    workflow["state"] = "running"
+    save_workflow(workflow)
+    for i, step in enumerate(steps):
+        if step["state"] in WORKFLOW_DONE_STEP_STATES:
+            continue
+
+        if progress_callback is not None:
+            progress_callback(i, len(steps), f"Deploy step {step['name']}")
+        started = time.time()
+        step.update(state="running", attempts=step["attempts"] + 1, started=started, finished=None,
+                    duration=None, message=None, error=None)
+        save_workflow(workflow)
+
+        out += f"\n\n=== {step['name']} ===\n".encode("utf-8")
+        try:
+            step_out, skipped = DEPLOY_STEP_FUNCTIONS[step["name"]](stack, run)
+        except Exception as e:
+            finished = time.time()
+            step.update(state="failed", finished=finished, duration=round(finished - started, 3), error=str(e))
+            workflow["state"] = "failed"
+            save_workflow(workflow)
+            raise
+
+        finished = time.time()
+        step.update(state="skipped" if skipped else "success", finished=finished,
+                    duration=round(finished - started, 3),
+                    message=step_out.decode("utf-8", errors="replace")[:200] if skipped else None)
+        save_workflow(workflow)
+        out += step_out
+
+    workflow["state"] = "success"
+    save_workflow(workflow)
+    if progress_callback is not None:
+        progress_callback(len(steps), len(steps), "Deploy finished")
+    return out
@@ -0,0 +1,263 @@
+import json
+import queue
+import threading
+import time
+
+import redis
+from celery import signals
+
+from kontainer import settings
+from kontainer.taskexecutor import get_task_executor, TASK_FINAL_STATES
+from kontainer.util.redis_util import get_redis_client, redis_key
+
+# Task events
+#
+# Celery workers publish state transitions (STARTED, PROGRESS, SUCCESS, FAILURE, ...) of all tasks
+# to a per-task channel, so clients can follow a task without polling the result backend.
+#
+# The events are published with redis pub/sub, if redis is configured and tasks are run by celery workers.
+# With the local task executor (or without redis), the events are published with an in-memory bus,
+# which only works within a single process (the web process, which also runs the tasks).
+#
+# Event format:
+# {"task_id": "...", "status": "PROGRESS", "progress": {"current": 1, "total": 3, "message": "..."}, "timestamp": 1700000000.0}
+
+task_event_bus_cache = None
+
+
+class TaskEventSubscription:
+    """
+    Subscription to the events of a single task.
+    """
+
+    def get(self, timeout: float) -> dict | None:
+        """
+        Wait for the next event.
+
+        :param timeout: Max seconds to wait
+        :return: The event or None on timeout
+        """
+        raise NotImplementedError()
+
+    def close(self) -> None:
+        pass
+
+
+class TaskEventBus:
+    """
+    Publish/subscribe of task events.
+    """
+
+    def publish(self, task_id: str, event: dict) -> None:
+        raise NotImplementedError()
+
+    def subscribe(self, task_id: str) -> TaskEventSubscription:
+        raise NotImplementedError()
+
+
+class RedisTaskEventSubscription(TaskEventSubscription):
+    def __init__(self, pubsub):
+        self.pubsub = pubsub
+
+    def get(self, timeout: float) -> dict | None:
+        deadline = time.time() + timeout
+        while True:
+            message = self.pubsub.get_message(ignore_subscribe_messages=True, timeout=max(deadline - time.time(), 0))
+            if message is not None and message.get("type") == "message":
+                return json.loads(message["data"])
+            if time.time() >= deadline:
+                return None
+
+    def close(self) -> None:
+        try:
+            self.pubsub.close()
+        except redis.exceptions.RedisError:
+            pass
+
+
+class RedisTaskEventBus(TaskEventBus):
+    def __init__(self, client: redis.Redis):
+        self.client = client
+
+    @staticmethod
+    def _channel(task_id: str) -> str:
+        return redis_key("tasks", "events", task_id)
+
+    def publish(self, task_id: str, event: dict) -> None:
+        self.client.publish(self._channel(task_id), json.dumps(event, default=str))
+
+    def subscribe(self, task_id: str) -> TaskEventSubscription:
+        pubsub = self.client.pubsub()
+        pubsub.subscribe(self._channel(task_id))
+        return RedisTaskEventSubscription(pubsub)
+
+
+class MemoryTaskEventSubscription(TaskEventSubscription):
+    def __init__(self, bus, task_id: str):
+        self.bus = bus
+        self.task_id = task_id
+        self.queue = queue.Queue()
+
+    def get(self, timeout: float) -> dict | None:
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self) -> None:
+        self.bus.unsubscribe(self)
+
+
+class MemoryTaskEventBus(TaskEventBus):
+    """
+    In-memory event bus for tests and single process setups.
+    """
+
+    def __init__(self):
+        self.subscriptions = dict()
+        self.lock = threading.Lock()
+
+    def publish(self, task_id: str, event: dict) -> None:
+        with self.lock:
+            subscriptions = list(self.subscriptions.get(task_id, []))
+        for subscription in subscriptions:
+            subscription.queue.put(event)
+
+    def subscribe(self, task_id: str) -> TaskEventSubscription:
+        subscription = MemoryTaskEventSubscription(self, task_id)
+        with self.lock:
+            self.subscriptions.setdefault(task_id, []).append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: MemoryTaskEventSubscription) -> None:
+        with self.lock:
+            subscriptions = self.subscriptions.get(subscription.task_id, [])
+            if subscription in subscriptions:
+                subscriptions.remove(subscription)
+            if not subscriptions:
+                self.subscriptions.pop(subscription.task_id, None)
+
+
+def get_task_event_bus() -> TaskEventBus:
+    """
+    Get the task event bus.
+    Uses redis pub/sub, if redis is configured and tasks are run by celery workers, otherwise an in-memory bus.
+    Local tasks run in the web process, so a redis server is not required for their events.
+
+    :return: TaskEventBus instance
+    """
+    global task_event_bus_cache
+    if task_event_bus_cache is None:
+        client = get_redis_client() if settings.KONTAINER_TASK_EXECUTOR != "local" else None
+        task_event_bus_cache = RedisTaskEventBus(client) if client is not None else MemoryTaskEventBus()
+    return task_event_bus_cache
+
+
+def set_task_event_bus(bus: TaskEventBus | None) -> None:
+    """
+    Replace the task event bus, e.g. with a MemoryTaskEventBus in tests.
+
+    :param bus: TaskEventBus instance or None to reset to the default bus
+    """
+    global task_event_bus_cache
+    task_event_bus_cache = bus
+
+
+def publish_task_event(task_id: str, status: str, **data) -> None:
+    """
+    Publish a task event. Errors are logged, but never raised, so they do not fail the task.
+
+    :param task_id: The task id
+    :param status: The task state
+    :param data: Additional event data, e.g. progress=dict(...) or error="..."
+    """
+    if task_id is None:
+        return
+
+    event = {"task_id": task_id, "status": status, "timestamp": time.time()}
+    event.update(data)
+    try:
+        get_task_event_bus().publish(task_id, event)
+    except Exception as e:
+        print(f"Failed to publish event of task {task_id}: {e}")
+
+
+def wait_for_task(task_id: str, timeout: float) -> bool:
+    """
+    Wait for a task to finish.
+    The caller is notified by the task events, the task status is only looked up at the start and at the end.
+
+    :param task_id: The task id
+    :param timeout: Max seconds to wait
+    :return: True, if the task has finished, False on timeout
+    """
+    # subscribe before looking up the status, so the final event can not be missed
+    subscription = get_task_event_bus().subscribe(task_id)
+    try:
+        deadline = time.time() + timeout
+        while get_task_executor().get_status(task_id)["state"] not in TASK_FINAL_STATES:
+            while True:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                event = subscription.get(timeout=remaining)
+                if event is not None and event.get("status") in TASK_FINAL_STATES:
+                    break
+        return True
+    finally:
+        subscription.close()
+
+
+def report_progress(task, current: int, total: int, message=None, **extra) -> None:
+    """
+    Report the progress of a running task to the task executor (result backend) and to the task event subscribers.
+
+    Usage:
+        @celery.task(bind=True)
+        def my_task(self):
+            report_progress(self, 1, 3, "Pulling images")
+
+    :param task: The bound celery task
+    :param current: Current step
+    :param total: Total steps
+    :param message: Progress message
+    :param extra: Additional progress data
+    """
+    task_id = task.request.id
+    if task_id is None:
+        # called directly, not as a task
+        return
+
+    meta = {"current": current, "total": total, "message": message}
+    meta.update(extra)
+    get_task_executor().update_state(task, "PROGRESS", meta)
+    publish_task_event(task_id, "PROGRESS", progress=meta)
+
+
+# Celery signals
+# The SUCCESS and FAILURE signals are sent after the result has been stored in the result backend,
+# so subscribers can fetch the result when they receive the event.
+
+@signals.task_prerun.connect
+def _on_task_prerun(task_id=None, **kwargs):
+    publish_task_event(task_id, "STARTED")
+
+
+@signals.task_success.connect
+def _on_task_success(sender=None, **kwargs):
+    publish_task_event(sender.request.id if sender is not None else None, "SUCCESS")
+
+
+@signals.task_failure.connect
+def _on_task_failure(task_id=None, exception=None, **kwargs):
+    publish_task_event(task_id, "FAILURE", error=str(exception))
+
+
+@signals.task_retry.connect
+def _on_task_retry(request=None, reason=None, **kwargs):
+    publish_task_event(request.id if request is not None else None, "RETRY", error=str(reason))
+
+
+@signals.task_revoked.connect
+def _on_task_revoked(request=None, **kwargs):
+    publish_task_event(request.id if request is not None else None, "REVOKED")
@@ -0,0 +1,245 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from celery import signals
+from celery.backends.redis import RedisBackend
+
+from kontainer import settings
+from kontainer.taskhistory import record_task_event
+
+# Task executors
+#
+# Tasks are submitted and looked up through the configured task executor (KONTAINER_TASK_EXECUTOR):
+#
+# celery: Tasks are sent to the celery broker and run by celery workers (default).
+#         Status and results are read from the celery result backend.
+# local:  Tasks run in a bounded thread pool of the web process. Status, progress and results are kept
+#         in memory and evicted KONTAINER_TASK_RESULT_TTL seconds after the task has finished.
+#         No broker is required. Only suitable for a single web process (e.g. gunicorn -w 1 --threads n),
+#         because the results are not shared with other processes.
+#
+# Both executors run the same celery task functions, so the task ids, states (PENDING, STARTED, PROGRESS,
+# SUCCESS, FAILURE) and the task events are the same.
+
+TASK_FINAL_STATES = ("SUCCESS", "FAILURE", "REVOKED")
+
+task_executor_cache = None
+
+
+class TaskExecutor:
+    """
+    Submits tasks and looks up their status.
+    """
+
+    def submit(self, task, args=None, kwargs=None, task_id=None) -> str:
+        """
+        Submit a task.
+
+        :param task: The celery task
+        :param args: Task arguments
+        :param kwargs: Task keyword arguments
+        :param task_id: Task id (default: a new uuid)
+        :return: The task id
+        """
+        raise NotImplementedError()
+
+    def update_state(self, task, state: str, meta: dict) -> None:
+        """
+        Update the state of a running task, e.g. with the progress.
+
+        :param task: The bound celery task
+        :param state: The task state
+        :param meta: State info
+        """
+        raise NotImplementedError()
+
+    def get_status(self, task_id: str) -> dict:
+        """
+        Get the status of a task. Unknown tasks are pending.
+
+        :param task_id: The task id
+        :return: Dictionary with state, info (progress, result or exception), task_name, root_id and parent_id
+        """
+        raise NotImplementedError()
+
+    def get_statuses(self, task_ids: list) -> list:
+        """
+        Get the status of multiple tasks.
+
+        :param task_ids: The task ids
+        :return: List of task status dictionaries (see get_status), in the order of the task ids
+        """
+        return [self.get_status(task_id) for task_id in task_ids]
+
+
+def _status(state: str, info=None, task_name=None, root_id=None, parent_id=None) -> dict:
+    return {"state": state, "info": info, "task_name": task_name, "root_id": root_id, "parent_id": parent_id}
+
+
+class CeleryTaskExecutor(TaskExecutor):
+    def __init__(self, app):
+        self.app = app
+
+    def submit(self, task, args=None, kwargs=None, task_id=None) -> str:
+        return task.apply_async(args=args, kwargs=kwargs, task_id=task_id).id
+
+    def update_state(self, task, state: str, meta: dict) -> None:
+        task.update_state(state=state, meta=meta)
+
+    def get_status(self, task_id: str) -> dict:
+        result = self.app.AsyncResult(task_id)
+        return _status(result.state,
+                       result.info,
+                       task_name=getattr(result, "task_name", None),
+                       root_id=getattr(result, "root_id", None),
+                       parent_id=getattr(result, "parent_id", None))
+
+    def get_statuses(self, task_ids: list) -> list:
+        """
+        With the redis result backend, the task metas of all tasks are fetched with a single MGET.
+        Other backends are queried task by task.
+        """
+        if len(task_ids) == 0:
+            # redis rejects an MGET without keys
+            return []
+
+        backend = self.app.backend
+        if not isinstance(backend, RedisBackend):
+            return super().get_statuses(task_ids)
+
+        payloads = backend.client.mget([backend.get_key_for_task(task_id) for task_id in task_ids])
+        statuses = []
+        for payload in payloads:
+            if payload is None:
+                statuses.append(_status("PENDING"))
+                continue
+
+            meta = backend.decode_result(payload)
+            statuses.append(_status(meta.get("status"),
+                                    meta.get("result"),
+                                    task_name=meta.get("name", None),
+                                    root_id=meta.get("root_id", None),
+                                    parent_id=meta.get("parent_id", None)))
+        return statuses
+
+
+class LocalTaskExecutor(TaskExecutor):
+    """
+    Runs tasks in a bounded thread pool of the current process, with an in-memory result store.
+    """
+
+    def __init__(self, max_workers: int, result_ttl: int):
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="kontainer-task")
+        self.result_ttl = result_ttl
+        self.results = dict()
+        self.lock = threading.Lock()
+
+    def submit(self, task, args=None, kwargs=None, task_id=None) -> str:
+        if task_id is None:
+            task_id = str(uuid.uuid4())
+
+        self._evict_expired()
+        with self.lock:
+            self.results[task_id] = {"status": _status("PENDING", task_name=task.name, root_id=task_id),
+                                     "finished": None}
+        # local tasks are not published, so there is no after_task_publish signal
+        record_task_event(task_id, "PENDING", task.name, args, kwargs)
+        self.pool.submit(self._run, task, task_id, list(args or []), dict(kwargs or {}))
+        return task_id
+
+    def _run(self, task, task_id: str, args: list, kwargs: dict) -> None:
+        self._set_state(task_id, "STARTED", None)
+        try:
+            # runs the task in this thread, with the task request and signals of a celery worker
+            result = task.apply(args=args, kwargs=kwargs, task_id=task_id, throw=False)
+            self._set_state(task_id, result.state, result.result)
+        except Exception as e:
+            print(f"Task {task_id} failed: {e}")
+            self._set_state(task_id, "FAILURE", e)
+
+    def _set_state(self, task_id: str, state: str, info) -> None:
+        with self.lock:
+            record = self.results.get(task_id, None)
+            if record is None or record["finished"] is not None:
+                # evicted or already finished (the final state is set by the signal handlers)
+                return
+            record["status"] = dict(record["status"], state=state, info=info)
+            if state in TASK_FINAL_STATES:
+                record["finished"] = time.time()
+
+    def _evict_expired(self) -> None:
+        expired_before = time.time() - self.result_ttl
+        with self.lock:
+            for task_id in [task_id for task_id, record in self.results.items()
+                            if record["finished"] is not None and record["finished"] < expired_before]:
+                del self.results[task_id]
+
+    def update_state(self, task, state: str, meta: dict) -> None:
+        self._set_state(task.request.id, state, meta)
+
+    def get_status(self, task_id: str) -> dict:
+        self._evict_expired()
+        with self.lock:
+            record = self.results.get(task_id, None)
+            return dict(record["status"]) if record is not None else _status("PENDING")
+
+    def finish(self, task_id: str, state: str, info) -> None:
+        self._set_state(task_id, state, info)
+
+    def shutdown(self, wait=True) -> None:
+        self.pool.shutdown(wait=wait)
+
+
+TASK_EXECUTORS = {
+    "celery": lambda: CeleryTaskExecutor(_get_celery_app()),
+    "local": lambda: LocalTaskExecutor(settings.KONTAINER_TASK_EXECUTOR_THREADS, settings.KONTAINER_TASK_RESULT_TTL),
+}
+
+
+def _get_celery_app():
+    from kontainer.celery import celery
+    return celery
+
+
+def get_task_executor() -> TaskExecutor:
+    """
+    Get the configured task executor (KONTAINER_TASK_EXECUTOR).
+
+    :return: TaskExecutor instance
+    """
+    global task_executor_cache
+    if task_executor_cache is None:
+        factory = TASK_EXECUTORS.get(settings.KONTAINER_TASK_EXECUTOR, None)
+        if factory is None:
+            raise ValueError(f"Unknown task executor {settings.KONTAINER_TASK_EXECUTOR}")
+        task_executor_cache = factory()
+    return task_executor_cache
+
+
+def set_task_executor(executor: TaskExecutor | None) -> None:
+    """
+    Replace the task executor, e.g. with a LocalTaskExecutor in tests.
+
+    :param executor: TaskExecutor instance or None to reset to the configured executor
+    """
+    global task_executor_cache
+    task_executor_cache = executor
+
+
+# Celery signals
+# The final state of locally executed tasks is stored before the task events are published
+# (kontainer.taskevents imports this module, so these handlers are connected first),
+# so subscribers can fetch the result when they receive the event, same as with the celery result backend.
+
+@signals.task_success.connect
+def _on_task_success(sender=None, result=None, **kwargs):
+    if isinstance(task_executor_cache, LocalTaskExecutor) and sender is not None:
+        task_executor_cache.finish(sender.request.id, "SUCCESS", result)
+
+
+@signals.task_failure.connect
+def _on_task_failure(task_id=None, exception=None, **kwargs):
+    if isinstance(task_executor_cache, LocalTaskExecutor) and task_id is not None:
+        task_executor_cache.finish(task_id, "FAILURE", exception)
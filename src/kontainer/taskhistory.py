@@ -0,0 +1,350 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from celery import signals
+
+from kontainer import settings
+from kontainer.util.redis_util import get_redis_client, redis_key
+
+# Task history
+#
+# The lifecycle of all tasks (queued, started, finished) is recorded in a compact, capped index,
+# so queued, running and recently finished tasks can be listed per context, stack and task type
+# without scanning the result backend (GET /api/tasks).
+#
+# redis:  kontainer:tasks:history:<task_id>                 # hash with the task record
+#         kontainer:tasks:history:index:all                 # sorted sets of task ids, scored by the created time
+#         kontainer:tasks:history:index:ctx:<ctx_id>
+#         kontainer:tasks:history:index:stack:<ctx_id>:<stack>
+#         kontainer:tasks:history:index:type:<type>
+#         Each index is capped to KONTAINER_TASK_HISTORY_SIZE entries, records expire after KONTAINER_TASK_HISTORY_TTL.
+# sqlite: data/tasks.db, used with the local task executor or without redis.
+#         Capped to KONTAINER_TASK_HISTORY_SIZE records.
+#
+# Record format:
+# {"task_id": "...", "task_name": "kontainer.stacks.tasks.stack_start_task", "type": "stack_start_task",
+#  "ctx_id": "local", "stack": "mystack", "state": "SUCCESS", "created": 1700000000.0, "started": ..., "finished": ...,
+#  "error": null}
+
+TASK_HISTORY_FIELDS = ("task_id", "task_name", "type", "ctx_id", "stack", "state", "created", "started", "finished",
+                       "error")
+
+# Tasks with the context id as the first argument
+CONTEXT_TASK_PREFIXES = ("kontainer.docker.tasks.", "kontainer.stacks.tasks.")
+# Tasks with the stack name as the second argument
+STACK_TASK_PREFIXES = ("kontainer.stacks.tasks.",)
+NON_STACK_TASKS = ("kontainer.stacks.tasks.repository_sync_task",)
+
+task_history_cache = None
+
+
+class TaskHistory:
+    """
+    Index of task lifecycle events.
+    """
+
+    def record(self, task_id: str, state: str, identity: dict, **fields) -> None:
+        """
+        Record a task event.
+
+        :param task_id: The task id
+        :param state: The task state. PENDING does not override a later state.
+        :param identity: Fields, which are only set by the first event (task_name, type, ctx_id, stack, created)
+        :param fields: Fields to update, e.g. started, finished, error
+        """
+        raise NotImplementedError()
+
+    def list(self, ctx_id=None, stack=None, task_type=None, state=None, limit=50) -> list:
+        """
+        List the most recent tasks.
+
+        :param ctx_id: Filter by context id
+        :param stack: Filter by stack name (requires ctx_id)
+        :param task_type: Filter by task type, e.g. stack_start_task
+        :param state: Filter by task state
+        :param limit: Max number of tasks
+        :return: List of task records, most recent first
+        """
+        raise NotImplementedError()
+
+
+class RedisTaskHistory(TaskHistory):
+    # number of index entries fetched at once, when filtering by state
+    PAGE_SIZE = 200
+
+    def __init__(self, client, max_size: int, ttl: int):
+        self.client = client
+        self.max_size = max_size
+        self.ttl = ttl
+
+    @staticmethod
+    def _record_key(task_id: str) -> str:
+        return redis_key("tasks", "history", task_id)
+
+    @staticmethod
+    def _index_key(*parts) -> str:
+        return redis_key("tasks", "history", "index", *parts)
+
+    def _index_keys(self, identity: dict) -> list:
+        keys = [self._index_key("all")]
+        if identity.get("ctx_id"):
+            keys.append(self._index_key("ctx", identity["ctx_id"]))
+            if identity.get("stack"):
+                keys.append(self._index_key("stack", identity["ctx_id"], identity["stack"]))
+        if identity.get("type"):
+            keys.append(self._index_key("type", identity["type"]))
+        return keys
+
+    def record(self, task_id: str, state: str, identity: dict, **fields) -> None:
+        key = self._record_key(task_id)
+        pipe = self.client.pipeline(transaction=False)
+        pipe.hsetnx(key, "task_id", task_id)
+        for name, value in identity.items():
+            if value is not None:
+                pipe.hsetnx(key, name, json.dumps(value))
+        if state == "PENDING":
+            # the worker may have started the task already
+            pipe.hsetnx(key, "state", json.dumps(state))
+        else:
+            pipe.hset(key, "state", json.dumps(state))
+        for name, value in fields.items():
+            pipe.hset(key, name, json.dumps(value))
+        pipe.expire(key, self.ttl)
+
+        for index_key in self._index_keys(identity):
+            pipe.zadd(index_key, {task_id: identity.get("created", time.time())}, nx=True)
+            pipe.zremrangebyrank(index_key, 0, -(self.max_size + 1))
+            pipe.expire(index_key, self.ttl)
+        pipe.execute()
+
+    def _load(self, task_ids: list) -> list:
+        pipe = self.client.pipeline(transaction=False)
+        for task_id in task_ids:
+            pipe.hgetall(self._record_key(task_id.decode("utf-8") if isinstance(task_id, bytes) else task_id))
+
+        records = []
+        for data in pipe.execute():
+            if not data:
+                # expired
+                continue
+            record = {field: None for field in TASK_HISTORY_FIELDS}
+            for name, value in data.items():
+                name = name.decode("utf-8")
+                record[name] = value.decode("utf-8") if name == "task_id" else json.loads(value)
+            records.append(record)
+        return records
+
+    def list(self, ctx_id=None, stack=None, task_type=None, state=None, limit=50) -> list:
+        if stack:
+            index_key = self._index_key("stack", ctx_id, stack)
+        elif ctx_id:
+            index_key = self._index_key("ctx", ctx_id)
+        elif task_type:
+            index_key = self._index_key("type", task_type)
+        else:
+            index_key = self._index_key("all")
+
+        page_size = limit if state is None and not (task_type and (stack or ctx_id)) else self.PAGE_SIZE
+        records = []
+        start = 0
+        while len(records) < limit and start < self.max_size:
+            task_ids = self.client.zrevrange(index_key, start, start + page_size - 1)
+            if not task_ids:
+                break
+            for record in self._load(task_ids):
+                if state is not None and record.get("state") != state:
+                    continue
+                if task_type and record.get("type") != task_type:
+                    continue
+                records.append(record)
+            start += page_size
+        return records[:limit]
+
+
+class SqliteTaskHistory(TaskHistory):
+    # cap the table every n records
+    CAP_INTERVAL = 100
+
+    def __init__(self, db_file: str, max_size: int):
+        self.db_file = db_file
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.connection = None
+        self.records_since_cap = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self.connection is None:
+            os.makedirs(os.path.dirname(self.db_file), exist_ok=True)
+            connection = sqlite3.connect(self.db_file, check_same_thread=False, isolation_level=None)
+            connection.row_factory = sqlite3.Row
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS task_history (
+                    task_id TEXT PRIMARY KEY,
+                    task_name TEXT,
+                    type TEXT,
+                    ctx_id TEXT,
+                    stack TEXT,
+                    state TEXT,
+                    created REAL,
+                    started REAL,
+                    finished REAL,
+                    error TEXT
+                )""")
+            connection.execute("CREATE INDEX IF NOT EXISTS task_history_created ON task_history (created)")
+            connection.execute("CREATE INDEX IF NOT EXISTS task_history_ctx ON task_history (ctx_id, created)")
+            connection.execute("CREATE INDEX IF NOT EXISTS task_history_stack "
+                               "ON task_history (ctx_id, stack, created)")
+            connection.execute("CREATE INDEX IF NOT EXISTS task_history_type ON task_history (type, created)")
+            self.connection = connection
+        return self.connection
+
+    def record(self, task_id: str, state: str, identity: dict, **fields) -> None:
+        columns = ["task_id", "state"] + list(identity.keys()) + list(fields.keys())
+        values = [task_id, state] + list(identity.values()) + list(fields.values())
+
+        # identity fields are only set by the first event, PENDING does not override a later state
+        updates = ["state = CASE WHEN excluded.state = 'PENDING' THEN state ELSE excluded.state END"]
+        updates += [f"{name} = COALESCE({name}, excluded.{name})" for name in identity.keys()]
+        updates += [f"{name} = excluded.{name}" for name in fields.keys()]
+
+        with self.lock:
+            connection = self._connect()
+            connection.execute(f"INSERT INTO task_history ({', '.join(columns)}) "
+                               f"VALUES ({', '.join('?' for _ in columns)}) "
+                               f"ON CONFLICT (task_id) DO UPDATE SET {', '.join(updates)}", values)
+
+            self.records_since_cap += 1
+            if self.records_since_cap >= self.CAP_INTERVAL:
+                self.records_since_cap = 0
+                connection.execute("DELETE FROM task_history WHERE created < "
+                                   "(SELECT created FROM task_history ORDER BY created DESC LIMIT 1 OFFSET ?)",
+                                   (self.max_size - 1,))
+
+    def list(self, ctx_id=None, stack=None, task_type=None, state=None, limit=50) -> list:
+        conditions = []
+        values = []
+        for column, value in (("ctx_id", ctx_id), ("stack", stack), ("type", task_type), ("state", state)):
+            if value:
+                conditions.append(f"{column} = ?")
+                values.append(value)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        with self.lock:
+            rows = self._connect().execute(f"SELECT {', '.join(TASK_HISTORY_FIELDS)} FROM task_history {where} "
+                                           f"ORDER BY created DESC LIMIT ?", values + [limit]).fetchall()
+        return [dict(row) for row in rows]
+
+
+def get_task_history() -> TaskHistory:
+    """
+    Get the task history.
+    Uses redis with the celery task executor, otherwise (local task executor or no redis) sqlite.
+
+    :return: TaskHistory instance
+    """
+    global task_history_cache
+    if task_history_cache is None:
+        client = get_redis_client() if settings.KONTAINER_TASK_EXECUTOR != "local" else None
+        if client is not None:
+            task_history_cache = RedisTaskHistory(client,
+                                                  settings.KONTAINER_TASK_HISTORY_SIZE,
+                                                  settings.KONTAINER_TASK_HISTORY_TTL)
+        else:
+            task_history_cache = SqliteTaskHistory(os.path.join(settings.KONTAINER_DATA_DIR, "tasks.db"),
+                                                   settings.KONTAINER_TASK_HISTORY_SIZE)
+    return task_history_cache
+
+
+def set_task_history(history: TaskHistory | None) -> None:
+    """
+    Replace the task history, e.g. in tests.
+
+    :param history: TaskHistory instance or None to reset to the default history
+    """
+    global task_history_cache
+    task_history_cache = history
+
+
+def get_task_identity(task_name: str, args=None, kwargs=None) -> dict:
+    """
+    Get the indexed fields of a task: task name, type, context id and stack name.
+    Docker and stack tasks take the context id as the first argument, stack tasks the stack name as the second.
+
+    :param task_name: The full task name
+    :param args: Task arguments
+    :param kwargs: Task keyword arguments
+    :return: Dictionary of task_name, type, ctx_id and stack
+    """
+    args = list(args or [])
+    kwargs = kwargs or {}
+    ctx_id = None
+    stack = None
+    if task_name.startswith(CONTEXT_TASK_PREFIXES):
+        ctx_id = kwargs.get("ctx_id", None) or (args[0] if len(args) > 0 else None)
+    if task_name.startswith(STACK_TASK_PREFIXES) and task_name not in NON_STACK_TASKS:
+        stack = kwargs.get("stack_name", None) or (args[1] if len(args) > 1 else None)
+
+    return {
+        "task_name": task_name,
+        "type": task_name.rsplit(".", 1)[-1],
+        "ctx_id": str(ctx_id) if ctx_id is not None else None,
+        "stack": str(stack) if stack is not None else None,
+    }
+
+
+def record_task_event(task_id: str, state: str, task_name: str, args=None, kwargs=None, **fields) -> None:
+    """
+    Record a task event in the task history. Errors are logged, but never raised, so they do not fail the task.
+
+    :param task_id: The task id
+    :param state: The task state
+    :param task_name: The full task name
+    :param args: Task arguments
+    :param kwargs: Task keyword arguments
+    :param fields: Fields to update, e.g. started=time.time()
+    """
+    if task_id is None or task_name is None:
+        return
+
+    identity = get_task_identity(task_name, args, kwargs)
+    identity["created"] = time.time()
+    try:
+        get_task_history().record(task_id, state, identity, **fields)
+    except Exception as e:
+        print(f"Failed to record event of task {task_id}: {e}")
+
+
+# Celery signals
+# after_task_publish is sent by the publisher (web process), the other signals by the worker.
+# Tasks of the local task executor are not published, it records the queued tasks itself.
+
+@signals.after_task_publish.connect
+def _on_after_task_publish(headers=None, body=None, **kwargs):
+    headers = headers or {}
+    args, task_kwargs = (body[0], body[1]) if isinstance(body, (list, tuple)) and len(body) >= 2 else ([], {})
+    record_task_event(headers.get("id", None), "PENDING", headers.get("task", None), args, task_kwargs)
+
+
+@signals.task_prerun.connect
+def _on_task_prerun(task_id=None, task=None, args=None, kwargs=None, **kw):
+    record_task_event(task_id, "STARTED", task.name if task is not None else None, args, kwargs,
+                      started=time.time())
+
+
+@signals.task_postrun.connect
+def _on_task_postrun(task_id=None, task=None, args=None, kwargs=None, retval=None, state=None, **kw):
+    fields = {"finished": time.time()}
+    if state == "FAILURE":
+        fields["error"] = str(retval)
+    record_task_event(task_id, state or "SUCCESS", task.name if task is not None else None, args, kwargs, **fields)
+
+
+@signals.task_revoked.connect
+def _on_task_revoked(request=None, **kwargs):
+    if request is not None:
+        record_task_event(request.id, "REVOKED", getattr(request, "task_name", None), request.args, request.kwargs,
+                          finished=time.time())
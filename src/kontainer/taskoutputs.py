@@ -0,0 +1,48 @@
+from kontainer import settings
+from kontainer.util.blobstore_util import get_blob_store
+
+# Large task outputs
+#
+# Compose and git outputs can be megabytes. Outputs larger than KONTAINER_TASK_OUTPUT_INLINE_MAX
+# are stored compressed in the blob store (keyed by the task id) instead of the result backend.
+# The task result only holds a summary (the last lines) and the output reference:
+# {"output_ref": "<task_id>", "output_size": 123456, "summary": "...", "truncated": true}
+#
+# Failed operations raise an exception, so only outputs of successful operations are stored.
+#
+# The full output can be downloaded with GET /api/tasks/<task_id>/output
+
+OUTPUT_SUMMARY_LINES = 20
+OUTPUT_SUMMARY_MAX_SIZE = 4096
+
+
+def store_task_output(task, output):
+    """
+    Store a large task output in the blob store and return the result, which is stored in the result backend.
+
+    Usage:
+        @celery.task(bind=True)
+        def stack_start_task(self, ctx_id, stack_name):
+            return store_task_output(self, get_stacks_manager(ctx_id).start(stack_name))
+
+    :param task: The bound celery task
+    :param output: The task output (bytes or str)
+    :return: The output, if it is small enough to be stored inline, otherwise the output summary
+    """
+    task_id = task.request.id
+    if task_id is None or not isinstance(output, (bytes, str)):
+        return output
+
+    data = output if isinstance(output, bytes) else output.encode("utf-8")
+    if len(data) <= settings.KONTAINER_TASK_OUTPUT_INLINE_MAX:
+        return output
+
+    size = get_blob_store().put(task_id, data)
+
+    summary = b"\n".join(data.rstrip(b"\n").split(b"\n")[-OUTPUT_SUMMARY_LINES:])[-OUTPUT_SUMMARY_MAX_SIZE:]
+    return {
+        "output_ref": task_id,
+        "output_size": size,
+        "summary": summary.decode("utf-8", errors="replace"),
+        "truncated": True,
+    }
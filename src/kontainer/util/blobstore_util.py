@@ -0,0 +1,195 @@
+import gzip
+import json
+import os
+import re
+import tempfile
+import time
+
+from kontainer import settings
+
+# Blob store for large task outputs (compose and git logs).
+#
+# Blobs are stored compressed. The store is selected with KONTAINER_BLOB_STORE,
+# further implementations can be added to BLOB_STORES.
+#
+# file: data/outputs/<key>.gz       # gzip compressed content
+#       data/outputs/<key>.json     # metadata: size (uncompressed), created
+
+blob_store_cache = None
+
+
+class BlobNotFoundError(Exception):
+    pass
+
+
+class BlobStore:
+    """
+    Store for compressed blobs.
+    """
+
+    def put(self, key: str, data: bytes) -> int:
+        """
+        Store a blob.
+
+        :param key: Blob key
+        :param data: Uncompressed content
+        :return: Uncompressed size
+        """
+        raise NotImplementedError()
+
+    def exists(self, key: str) -> bool:
+        raise NotImplementedError()
+
+    def size(self, key: str) -> int:
+        """
+        :return: Uncompressed size of the blob
+        """
+        raise NotImplementedError()
+
+    def open(self, key: str):
+        """
+        :return: Binary file object with the uncompressed content
+        """
+        raise NotImplementedError()
+
+    def open_compressed(self, key: str):
+        """
+        :return: Binary file object with the gzip compressed content
+        """
+        raise NotImplementedError()
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError()
+
+    def list(self) -> list:
+        """
+        :return: List of tuples (key, created)
+        """
+        raise NotImplementedError()
+
+
+class FileBlobStore(BlobStore):
+    """
+    Blob store with gzip compressed files in a local directory.
+    """
+
+    def __init__(self, base_dir: str):
+        self.base_dir = base_dir
+
+    def _path(self, key: str) -> str:
+        if not re.fullmatch(r"[a-zA-Z0-9._-]+", key) or key.startswith("."):
+            raise ValueError(f"Invalid blob key {key}")
+        return os.path.join(self.base_dir, key)
+
+    def put(self, key: str, data: bytes) -> int:
+        path = self._path(key)
+        os.makedirs(self.base_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.base_dir, prefix=".blob-")
+        try:
+            with os.fdopen(fd, "wb") as f, gzip.GzipFile(fileobj=f, mode="wb", compresslevel=6) as gz:
+                gz.write(data)
+            os.replace(tmp_path, f"{path}.gz")
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+
+        with open(f"{path}.json", "w") as f:
+            json.dump({"size": len(data), "created": int(time.time())}, f)
+        return len(data)
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(f"{self._path(key)}.gz")
+
+    def _meta(self, key: str) -> dict:
+        try:
+            with open(f"{self._path(key)}.json", "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise BlobNotFoundError(f"Blob {key} not found")
+
+    def size(self, key: str) -> int:
+        return self._meta(key)["size"]
+
+    def open(self, key: str):
+        try:
+            return gzip.open(f"{self._path(key)}.gz", "rb")
+        except FileNotFoundError:
+            raise BlobNotFoundError(f"Blob {key} not found")
+
+    def open_compressed(self, key: str):
+        try:
+            return open(f"{self._path(key)}.gz", "rb")
+        except FileNotFoundError:
+            raise BlobNotFoundError(f"Blob {key} not found")
+
+    def delete(self, key: str) -> None:
+        path = self._path(key)
+        for suffix in (".gz", ".json"):
+            try:
+                os.unlink(f"{path}{suffix}")
+            except FileNotFoundError:
+                pass
+
+    def list(self) -> list:
+        if not os.path.exists(self.base_dir):
+            return []
+        blobs = []
+        for entry in os.scandir(self.base_dir):
+            if entry.is_file() and entry.name.endswith(".gz") and not entry.name.startswith("."):
+                blobs.append((entry.name[:-len(".gz")], int(entry.stat().st_mtime)))
+        return blobs
+
+
+BLOB_STORES = {
+    "file": lambda: FileBlobStore(os.path.join(settings.KONTAINER_DATA_DIR, "outputs")),
+}
+
+
+def get_blob_store() -> BlobStore:
+    """
+    Get the configured blob store (KONTAINER_BLOB_STORE).
+
+    :return: BlobStore instance
+    """
+    global blob_store_cache
+    if blob_store_cache is None:
+        factory = BLOB_STORES.get(settings.KONTAINER_BLOB_STORE, None)
+        if factory is None:
+            raise ValueError(f"Unknown blob store {settings.KONTAINER_BLOB_STORE}")
+        blob_store_cache = factory()
+    return blob_store_cache
+
+
+def set_blob_store(store: BlobStore | None) -> None:
+    """
+    Replace the blob store, e.g. in tests.
+
+    :param store: BlobStore instance or None to reset to the configured store
+    """
+    global blob_store_cache
+    blob_store_cache = store
+
+
+def iter_range(f, start=0, length=None, chunk_size=64 * 1024):
+    """
+    Yield a byte range of a binary stream in chunks.
+    Compressed streams are not seekable, so the bytes before the start offset are read and skipped.
+
+    :param f: Binary file object
+    :param start: Start offset
+    :param length: Number of bytes or None for the rest of the stream
+    """
+    remaining_skip = start
+    while remaining_skip > 0:
+        chunk = f.read(min(chunk_size, remaining_skip))
+        if not chunk:
+            return
+        remaining_skip -= len(chunk)
+
+    while length is None or length > 0:
+        chunk = f.read(chunk_size if length is None else min(chunk_size, length))
+        if not chunk:
+            return
+        if length is not None:
+            length -= len(chunk)
+        yield chunk
@@ -54,3 +54,61 @@ def modify_docker_compose_volumes(file_path, output_path, prefix):
         yaml.dump(compose_data, file, default_flow_style=False)
 
     print(f"Modified docker-compose.yml saved to {output_path}")
+
+
+def get_compose_service_dependencies(compose_data: dict) -> dict:
+    """
+    Get the dependency graph of the services in a docker-compose file.
+    Supports both the short (list) and the long (dict) syntax of 'depends_on'.
+
+    :param compose_data: Parsed docker-compose content
+    :return: Dictionary of service name -> set of service names it depends on
+    """
+    dependencies = {}
+    services = compose_data.get("services", {}) if compose_data else {}
+    for service, config in services.items():
+        depends_on = (config or {}).get("depends_on", [])
+        if isinstance(depends_on, dict):
+            depends_on = list(depends_on.keys())
+        dependencies[service] = set(depends_on)
+    return dependencies
+
+
+def parse_compose_depends_on_label(label: str) -> set:
+    """
+    Parse the 'com.docker.compose.depends_on' container label.
+    Format: "db:service_started:false,redis:service_healthy:true"
+
+    :param label: Label value
+    :return: Set of service names
+    """
+    if not label:
+        return set()
+    return set([dep.split(":")[0] for dep in label.split(",") if dep.strip()])
+
+
+def group_services_by_dependencies(dependencies: dict) -> list[list[str]]:
+    """
+    Group services into levels, ordered by their dependencies.
+    Services in the first level have no dependencies,
+    services in the following levels only depend on services in previous levels.
+    Dependencies on unknown services are ignored.
+    Services with circular dependencies are appended as last level.
+
+    :param dependencies: Dictionary of service name -> set of service names it depends on
+    :return: List of service levels
+    """
+    remaining = {s: set(d) & set(dependencies.keys()) - {s} for s, d in dependencies.items()}
+    levels = []
+    while remaining:
+        level = sorted([s for s, d in remaining.items() if len(d) == 0])
+        if len(level) == 0:
+            # circular dependencies
+            levels.append(sorted(remaining.keys()))
+            break
+        levels.append(level)
+        for s in level:
+            del remaining[s]
+        for d in remaining.values():
+            d.difference_update(level)
+    return levels
@@ -0,0 +1,171 @@
+import fcntl
+import hashlib
+import json
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from kontainer import settings
+
+# Download cache for remote files (compose files, templates, catalogs).
+#
+# data/cache/downloads/<sha1(url)>       # downloaded content
+# data/cache/downloads/<sha1(url)>.json  # metadata: url, etag, last_modified, size, fetched
+#
+# Cached entries are revalidated with conditional requests (If-None-Match / If-Modified-Since).
+# Entries fetched within max_age seconds are served without a request.
+# Downloads are streamed to a temp file and aborted, if they exceed the max size or the timeout.
+
+DOWNLOADS_DIR = os.path.join(settings.KONTAINER_DATA_DIR, "cache", "downloads")
+CHUNK_SIZE = 64 * 1024
+
+http_session_cache = None
+
+
+class DownloadError(Exception):
+    pass
+
+
+def get_http_session() -> requests.Session:
+    """
+    Get the shared, connection pooled http session.
+
+    :return: requests.Session instance
+    """
+    global http_session_cache
+    if http_session_cache is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=10, pool_maxsize=10, max_retries=2)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        session.headers.update({"User-Agent": "kontainer"})
+        http_session_cache = session
+    return http_session_cache
+
+
+def reset_http_session() -> None:
+    """
+    Drop the shared http session, e.g. in forked worker processes.
+    Connection pools must not be shared between processes.
+    """
+    global http_session_cache
+    http_session_cache = None
+
+
+def get_download_cache_path(url: str) -> str:
+    """
+    Get the path of the cached content of a url.
+
+    :param url: The url
+    :return: Path to the cached file
+    """
+    return os.path.join(DOWNLOADS_DIR, hashlib.sha1(url.encode("utf-8")).hexdigest())
+
+
+@contextmanager
+def _download_lock(cache_path: str):
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    with open(f"{cache_path}.lock", "w") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _read_meta(cache_path: str) -> dict | None:
+    try:
+        with open(f"{cache_path}.json", "r") as f:
+            meta = json.load(f)
+        return meta if os.path.exists(cache_path) else None
+    except (OSError, ValueError):
+        return None
+
+
+def _write_meta(cache_path: str, meta: dict) -> None:
+    with open(f"{cache_path}.json", "w") as f:
+        json.dump(meta, f)
+
+
+def download_cached(url: str, max_size=None, timeout=None, max_age=None) -> str:
+    """
+    Download a url to the download cache.
+
+    :param url: The url to download
+    :param max_size: Max size in bytes (default: KONTAINER_DOWNLOAD_MAX_SIZE)
+    :param timeout: Max seconds for the whole download (default: KONTAINER_DOWNLOAD_TIMEOUT)
+    :param max_age: Serve the cached file without revalidation,
+                    if it was fetched within the last max_age seconds (default: KONTAINER_DOWNLOAD_MAX_AGE)
+    :return: Path to the cached file
+    :raises DownloadError: If the download failed and no cached file is available
+    """
+    if max_size is None:
+        max_size = settings.KONTAINER_DOWNLOAD_MAX_SIZE
+    if timeout is None:
+        timeout = settings.KONTAINER_DOWNLOAD_TIMEOUT
+    if max_age is None:
+        max_age = settings.KONTAINER_DOWNLOAD_MAX_AGE
+
+    cache_path = get_download_cache_path(url)
+    with _download_lock(cache_path):
+        meta = _read_meta(cache_path)
+        if meta is not None and time.time() - meta.get("fetched", 0) < max_age:
+            return cache_path
+
+        headers = {}
+        if meta is not None and meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta is not None and meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+        try:
+            _download(url, cache_path, headers, meta, max_size, timeout)
+        except Exception as e:
+            if meta is None:
+                raise DownloadError(f"Failed to download {url}: {e}") from e
+            print(f"Failed to revalidate {url}, using cached file: {e}")
+
+    return cache_path
+
+
+def _download(url: str, cache_path: str, headers: dict, meta: dict | None, max_size: int, timeout: int) -> None:
+    started = time.time()
+    with get_http_session().get(url, headers=headers, stream=True, timeout=timeout) as r:
+        if r.status_code == 304 and meta is not None:
+            meta["fetched"] = int(time.time())
+            _write_meta(cache_path, meta)
+            return
+        r.raise_for_status()
+
+        content_length = r.headers.get("Content-Length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > max_size:
+            raise DownloadError(f"Content too large: {content_length} bytes (max {max_size})")
+
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(cache_path), prefix=".download-")
+        try:
+            size = 0
+            with os.fdopen(fd, "wb") as f:
+                for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
+                    size += len(chunk)
+                    if size > max_size:
+                        raise DownloadError(f"Content too large: more than {max_size} bytes")
+                    # the request timeout applies per read, this limits slow responses
+                    if time.time() - started > timeout:
+                        raise DownloadError(f"Download timed out after {timeout} seconds")
+                    f.write(chunk)
+            os.replace(tmp_path, cache_path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+
+    _write_meta(cache_path, {
+        "url": url,
+        "etag": r.headers.get("ETag"),
+        "last_modified": r.headers.get("Last-Modified"),
+        "size": size,
+        "fetched": int(time.time()),
+    })
@@ -43,6 +43,79 @@ def git_pull_head(working_dir=None, **kwargs) -> bytes:
     return git(["pull", "origin", cur_head_str], working_dir=working_dir, **kwargs)
 
 
+def git_fetch_reset(working_dir: str, ref: str, depth=None, filter=None, **kwargs) -> bytes:
+    """
+    Fetch a single ref from the remote repository and reset the working tree to it.
+
+    In contrast to a git pull, this does not require a merge
+    and keeps shallow and partial clones shallow and partial.
+
+    :param working_dir: Working directory
+    :param ref: Branch, tag or commit to fetch
+    :param depth: Optional depth to limit the fetched history to
+    :param filter: Optional object filter, e.g. 'blob:none'
+    :param kwargs: Additional arguments to pass to git fetch
+    :return:
+    """
+    out = git(["fetch", "origin", ref], working_dir=working_dir, depth=depth, filter=filter, force=True, **kwargs)
+    # Partial clones fetch missing objects on checkout, so the reset may need the private key too
+    out += git(["reset", "--hard", "FETCH_HEAD"],
+               working_dir=working_dir,
+               private_key_file=kwargs.get("private_key_file"),
+               timeout=kwargs.get("timeout"))
+    return out
+
+
+def git_sparse_checkout_set(working_dir: str, paths: list, **kwargs) -> bytes:
+    """
+    Limit the working tree of a repository to the given paths (cone mode).
+
+    :param working_dir: Working directory
+    :param paths: List of directories to check out
+    :param kwargs: Additional arguments to pass to git sparse-checkout
+    :return:
+    """
+    return git(["sparse-checkout", "set"] + paths, working_dir=working_dir, **kwargs)
+
+
+def git_rev_parse(working_dir: str, ref="HEAD", **kwargs) -> str:
+    """
+    Resolve a ref to a commit hash
+
+    :param working_dir: Working directory
+    :param ref: Ref to resolve
+    :param kwargs: Additional arguments to pass to git rev-parse
+    :return: Commit hash
+    """
+    return git(["rev-parse", ref], working_dir=working_dir, **kwargs).decode("utf-8").strip()
+
+
+def git_ls_remote(repo: str, ref: str, **kwargs) -> str | None:
+    """
+    Lookup the commit hash of a branch or tag in the remote repository,
+    without fetching any objects.
+
+    :param repo: Repository url
+    :param ref: Branch or tag name
+    :param kwargs: Additional arguments to pass to git ls-remote
+    :return: Commit hash or None if the ref does not exist
+    """
+    patterns = [f"refs/heads/{ref}", f"refs/tags/{ref}", f"refs/tags/{ref}^{{}}"]
+    out = git(["ls-remote", repo] + patterns, **kwargs).decode("utf-8")
+
+    refs = dict()
+    for line in out.splitlines():
+        if "\t" in line:
+            sha, name = line.split("\t", 1)
+            refs[name.strip()] = sha.strip()
+
+    # prefer the peeled commit of annotated tags
+    for pattern in [f"refs/tags/{ref}^{{}}", f"refs/heads/{ref}", f"refs/tags/{ref}"]:
+        if pattern in refs:
+            return refs[pattern]
+    return None
+
+
 def git_update(working_dir=None, force=False, reset=False, **kwargs) -> bytes:
     """
     Update a git repository.
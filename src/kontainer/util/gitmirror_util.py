@@ -0,0 +1,242 @@
+import fcntl
+import hashlib
+import os
+import re
+import shutil
+import time
+from contextlib import contextmanager
+
+from kontainer import settings
+from kontainer.util.git_util import git, git_rev_parse
+
+# Bare mirrors of remote git repositories, shared by all checkouts of the same repository.
+#
+# data/repos/mirrors/<normalized-repo-url>.git  # bare mirror
+# data/stacks/<ctx_id>/<stack_name>              # worktree of the mirror
+# data/repos/checkouts/<mirror-name>/<ref>       # shared read-only checkout, e.g. of a template repository
+#
+# Worktrees share the object database and the refs of the mirror,
+# so fetching the mirror once updates the refs for all dependent worktrees.
+# Worktrees are always checked out with a detached HEAD,
+# because git refuses to fetch into a branch, which is checked out in a worktree.
+
+MIRRORS_DIR = os.path.join(settings.KONTAINER_DATA_DIR, "repos", "mirrors")
+MIRROR_FETCH_STAMP = "kontainer-fetched"
+CHECKOUTS_DIR = os.path.join(settings.KONTAINER_DATA_DIR, "repos", "checkouts")
+
+
+def normalize_repo_url(repo_url: str) -> str:
+    """
+    Normalize a repository url, so that different notations of the same repository are equal.
+
+    'git@github.com:org/repo.git', 'ssh://git@github.com/org/repo' and 'https://github.com/org/repo.git'
+    all normalize to 'github.com/org/repo'.
+
+    :param repo_url: Repository url
+    :return: Normalized repository url
+    """
+    url = repo_url.strip()
+    url = re.sub(r"^[a-z+]+://", "", url)  # scheme
+    url = re.sub(r"^[^@/]+@", "", url)  # user info
+    url = re.sub(r"^([^/:]+):(?!\d+/)", r"\1/", url)  # scp-like syntax 'host:path'
+    url = re.sub(r"^([^/:]+):\d+/", r"\1/", url)  # port
+    url = url.rstrip("/")
+    if url.endswith(".git"):
+        url = url[:-4]
+
+    host, _, path = url.partition("/")
+    return f"{host.lower()}/{path}" if path else host.lower()
+
+
+def get_repo_mirror_dir(repo_url: str) -> str:
+    """
+    Get the path of the bare mirror for a repository url.
+
+    :param repo_url: Repository url
+    :return: Path to the mirror directory
+    """
+    normalized = normalize_repo_url(repo_url)
+    slug = re.sub(r"[^a-zA-Z0-9._-]+", "_", normalized).strip("_")
+    digest = hashlib.sha1(normalized.encode("utf-8")).hexdigest()[:8]
+    return os.path.join(MIRRORS_DIR, f"{slug}-{digest}.git")
+
+
+@contextmanager
+def mirror_lock(mirror_dir: str):
+    """
+    Exclusive lock on a mirror, shared by all processes on this host.
+
+    :param mirror_dir: Path to the mirror directory
+    """
+    os.makedirs(os.path.dirname(mirror_dir), exist_ok=True)
+    with open(f"{mirror_dir}.lock", "w") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def git_mirror_update(repo_url: str, private_key_file=None, filter=None, max_age=None, timeout=120) -> bytes:
+    """
+    Create or update the bare mirror of a repository.
+
+    :param repo_url: Repository url
+    :param private_key_file: Optional path to the SSH private key
+    :param filter: Optional object filter for new mirrors, e.g. 'blob:none'
+    :param max_age: Skip fetching, if the mirror has been fetched within the last max_age seconds
+    :param timeout: Timeout for the git commands
+    :return: The output of the git commands
+    """
+    mirror_dir = get_repo_mirror_dir(repo_url)
+    stamp_file = os.path.join(mirror_dir, MIRROR_FETCH_STAMP)
+
+    with mirror_lock(mirror_dir):
+        if not os.path.exists(mirror_dir):
+            out = git(["clone", "--bare", repo_url, mirror_dir],
+                      private_key_file=private_key_file,
+                      filter=filter,
+                      timeout=timeout)
+            # A bare clone has no fetch refspec, so map the remote branches and tags 1:1
+            out += git(["config", "remote.origin.fetch", "+refs/heads/*:refs/heads/*"], working_dir=mirror_dir)
+            out += git(["config", "--add", "remote.origin.fetch", "+refs/tags/*:refs/tags/*"], working_dir=mirror_dir)
+        elif max_age is not None and os.path.exists(stamp_file) and time.time() - os.path.getmtime(stamp_file) < max_age:
+            return b"Mirror is up to date: " + mirror_dir.encode() + b"\n"
+        else:
+            out = git(["fetch", "--prune", "origin"],
+                      working_dir=mirror_dir,
+                      private_key_file=private_key_file,
+                      timeout=timeout)
+            # Remove worktree metadata of deleted checkouts
+            out += git(["worktree", "prune"], working_dir=mirror_dir)
+
+        with open(stamp_file, "w") as f:
+            f.write(str(int(time.time())))
+    return out
+
+
+def git_mirror_rev_parse(repo_url: str, ref: str, max_age: int) -> str | None:
+    """
+    Resolve a branch or tag to a commit hash using the mirror,
+    if the mirror has been fetched within the last max_age seconds.
+
+    :param repo_url: Repository url
+    :param ref: Branch or tag name
+    :param max_age: Max seconds since the last fetch of the mirror
+    :return: Commit hash or None if the mirror is missing, stale or does not contain the ref
+    """
+    mirror_dir = get_repo_mirror_dir(repo_url)
+    stamp_file = os.path.join(mirror_dir, MIRROR_FETCH_STAMP)
+    if not os.path.exists(stamp_file) or time.time() - os.path.getmtime(stamp_file) >= max_age:
+        return None
+
+    try:
+        return git(["rev-parse", "--verify", "--quiet", f"{ref}^{{commit}}"], working_dir=mirror_dir, timeout=10) \
+            .decode("utf-8").strip() or None
+    except Exception:
+        return None
+
+
+def is_git_worktree(working_dir: str) -> bool:
+    """
+    Check if a directory is a linked worktree (as created from a mirror).
+
+    :param working_dir: Working directory
+    :return: True if the directory is a linked worktree
+    """
+    return os.path.isfile(os.path.join(working_dir, ".git"))
+
+
+def git_mirror_checkout(repo_url: str, dest: str, ref: str, private_key_file=None, sparse_paths=None, timeout=120) -> bytes:
+    """
+    Create or update a worktree of the repository mirror at the given ref.
+
+    The mirror must exist, see git_mirror_update().
+
+    :param repo_url: Repository url
+    :param dest: Destination directory of the worktree
+    :param ref: Branch, tag or commit to check out
+    :param private_key_file: Optional path to the SSH private key (partial mirrors fetch missing objects on checkout)
+    :param sparse_paths: Optional list of directories to limit the working tree to
+    :param timeout: Timeout for the git commands
+    :return: The output of the git commands
+    """
+    mirror_dir = get_repo_mirror_dir(repo_url)
+
+    out = b""
+    if not os.path.exists(dest):
+        with mirror_lock(mirror_dir):
+            out += git(["worktree", "add", "--detach", "--no-checkout", dest, ref],
+                       working_dir=mirror_dir,
+                       timeout=timeout)
+
+    if sparse_paths:
+        out += git(["sparse-checkout", "set"] + sparse_paths,
+                   working_dir=dest,
+                   private_key_file=private_key_file,
+                   timeout=timeout)
+
+    out += git(["reset", "--hard", ref],
+               working_dir=dest,
+               private_key_file=private_key_file,
+               timeout=timeout)
+    return out
+
+
+def get_repo_checkout_dir(repo_url: str, ref="HEAD") -> str:
+    """
+    Get the path of the shared checkout of a repository ref.
+
+    :param repo_url: Repository url
+    :param ref: Branch, tag or commit
+    :return: Path to the checkout directory
+    """
+    mirror_name = os.path.basename(get_repo_mirror_dir(repo_url))[:-len(".git")]
+    ref_slug = re.sub(r"[^a-zA-Z0-9._-]+", "_", ref).strip("_") or "HEAD"
+    return os.path.join(CHECKOUTS_DIR, mirror_name, ref_slug)
+
+
+@contextmanager
+def git_cached_checkout(repo_url: str, ref="HEAD", private_key_file=None, max_age=None, timeout=120):
+    """
+    Shared checkout of a repository ref, e.g. for reading templates.
+
+    The mirror is fetched, if it has not been fetched within the last max_age seconds.
+    The checkout is only updated, if the ref points to a different commit.
+    The checkout is locked while in use, so it is not updated while another process reads from it.
+    Do not modify the files in the checkout.
+
+    Usage:
+        with git_cached_checkout(repo_url, "main", max_age=300) as checkout_dir:
+            ...
+
+    :param repo_url: Repository url
+    :param ref: Branch, tag or commit (default: the default branch of the repository)
+    :param private_key_file: Optional path to the SSH private key
+    :param max_age: Skip fetching, if the mirror has been fetched within the last max_age seconds
+    :param timeout: Timeout for the git commands
+    """
+    mirror_dir = get_repo_mirror_dir(repo_url)
+    dest = get_repo_checkout_dir(repo_url, ref)
+
+    git_mirror_update(repo_url, private_key_file=private_key_file, max_age=max_age, timeout=timeout)
+
+    with mirror_lock(dest):
+        commit = git_rev_parse(mirror_dir, f"{ref}^{{commit}}", timeout=10)
+
+        local_commit = None
+        if os.path.exists(dest):
+            try:
+                local_commit = git_rev_parse(dest, "HEAD", timeout=10)
+            except Exception as e:
+                # e.g. the mirror has been removed
+                print(f"Removing broken checkout {dest}: {e}")
+                shutil.rmtree(dest)
+                git(["worktree", "prune"], working_dir=mirror_dir)
+
+        if local_commit != commit:
+            out = git_mirror_checkout(repo_url, dest, commit, private_key_file=private_key_file, timeout=timeout)
+            print(out)
+            print(f"Checked out {repo_url}@{ref} ({commit[:8]}) at {dest}")
+
+        yield dest
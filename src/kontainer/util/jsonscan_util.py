@@ -0,0 +1,135 @@
+import codecs
+import json
+
+# Incremental reader for large JSON documents with an array of objects,
+# e.g. template catalogs ({"version": "2", "templates": [{...}, {...}]}).
+#
+# The document is read in chunks and the entries are decoded one by one,
+# so only one entry (plus one chunk) is held in memory at a time.
+# The byte offset and length of each entry are returned, so single entries can be read again later
+# without parsing the whole document.
+
+CHUNK_SIZE = 64 * 1024
+WHITESPACE = " \t\n\r"
+
+
+class _ChunkedBuffer:
+    """
+    Decoded text buffer over a binary file, which keeps track of the byte offset of the buffer start.
+    """
+
+    def __init__(self, f):
+        self.f = f
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.text = ""
+        self.pos = 0
+        self.base_offset = 0  # byte offset of text[0]
+        self.eof = False
+
+    def read_more(self) -> bool:
+        if self.eof:
+            return False
+        chunk = self.f.read(CHUNK_SIZE)
+        if not chunk:
+            self.eof = True
+            self.text += self.decoder.decode(b"", final=True)
+        else:
+            self.text += self.decoder.decode(chunk)
+        return True
+
+    def byte_offset(self, pos: int) -> int:
+        return self.base_offset + len(self.text[:pos].encode("utf-8"))
+
+    def discard(self) -> None:
+        """Drop the consumed text"""
+        self.base_offset = self.byte_offset(self.pos)
+        self.text = self.text[self.pos:]
+        self.pos = 0
+
+    def skip(self, chars=WHITESPACE) -> str | None:
+        """Skip the given chars and return the next char (None at the end of the document)"""
+        while True:
+            while self.pos < len(self.text) and self.text[self.pos] in chars:
+                self.pos += 1
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not self.read_more():
+                return None
+
+    def expect(self, char: str) -> None:
+        if self.skip() != char:
+            raise ValueError(f"Expected '{char}' at byte {self.byte_offset(self.pos)}")
+        self.pos += 1
+
+    def decode_value(self, decoder: json.JSONDecoder):
+        """Decode the next JSON value, reading more chunks as needed"""
+        while True:
+            try:
+                value, end = decoder.raw_decode(self.text, self.pos)
+                # a value ending at the end of the buffer might be truncated (e.g. numbers)
+                if end < len(self.text) or self.eof:
+                    start = self.pos
+                    self.pos = end
+                    return value, start, end
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self.read_more()
+
+
+def iter_json_array_entries(path: str, array_key=None):
+    """
+    Iterate over the entries of a JSON array.
+
+    :param path: Path to the JSON file
+    :param array_key: Key of the array in the top-level object, e.g. 'templates'.
+                      If None, the top-level value must be the array.
+    :return: Generator of tuples (offset, length, entry)
+    """
+    decoder = json.JSONDecoder()
+    with open(path, "rb") as f:
+        buf = _ChunkedBuffer(f)
+
+        if array_key is not None:
+            # walk the top-level object until the array key
+            buf.expect("{")
+            while True:
+                if buf.skip() != '"':
+                    raise ValueError(f"Key '{array_key}' not found")
+                key, _, _ = buf.decode_value(decoder)
+                buf.expect(":")
+                buf.skip()
+                if key == array_key:
+                    break
+                buf.decode_value(decoder)
+                buf.discard()
+                buf.skip()
+                if buf.skip() == ",":
+                    buf.pos += 1
+
+        buf.expect("[")
+        while True:
+            char = buf.skip(WHITESPACE + ",")
+            if char == "]":
+                return
+            if char is None:
+                raise ValueError("Unexpected end of the document")
+
+            buf.discard()
+            entry, start, end = buf.decode_value(decoder)
+            offset = buf.byte_offset(start)
+            yield offset, buf.byte_offset(end) - offset, entry
+
+
+def read_json_entry(path: str, offset: int, length: int):
+    """
+    Read a single entry, which has been located with iter_json_array_entries().
+
+    :param path: Path to the JSON file
+    :param offset: Byte offset of the entry
+    :param length: Byte length of the entry
+    :return: Parsed entry
+    """
+    with open(path, "rb") as f:
+        f.seek(offset)
+        return json.loads(f.read(length))
@@ -0,0 +1,35 @@
+import redis
+
+from kontainer import settings
+
+redis_client_cache = None
+
+
+def get_redis_client() -> redis.Redis | None:
+    """
+    Get the shared redis client.
+    Uses KONTAINER_REDIS_URL, which defaults to the celery broker url.
+
+    Redis connection pools are reset automatically after a fork,
+    so the client can be shared with forked worker processes.
+
+    :return: Redis client or None if no redis url is configured
+    """
+    global redis_client_cache
+    if redis_client_cache is None:
+        redis_url = settings.KONTAINER_REDIS_URL
+        if not redis_url or not redis_url.startswith(("redis://", "rediss://", "unix://")):
+            return None
+
+        redis_client_cache = redis.Redis.from_url(redis_url, socket_connect_timeout=2, socket_timeout=10)
+    return redis_client_cache
+
+
+def redis_key(*parts) -> str:
+    """
+    Build a namespaced redis key.
+
+    :param parts: Key parts
+    :return: Redis key, e.g. 'kontainer:stacks:lock:local:mystack'
+    """
+    return ":".join(["kontainer"] + [str(p) for p in parts])
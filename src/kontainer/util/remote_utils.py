@@ -1,8 +1,290 @@
+import os
+import select
+import shlex
 import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
 
 import paramiko
 from paramiko.client import SSHClient
 
+from kontainer import settings
+
+# SSH transport pool
+#
+# Remote commands run on channels of pooled SSH transports (see ssh_channel()), so the TCP handshake,
+# the key exchange and the authentication are done once per host and user, not once per command.
+#
+# Transports are keyed by (hostname, port, username, private_key_file).
+# A transport carries at most KONTAINER_SSH_MAX_CHANNELS concurrent channels (sshd MaxSessions defaults to 10),
+# further channels are opened on an additional transport to the same host.
+# Transports send keepalives every KONTAINER_SSH_KEEPALIVE seconds and are closed after being
+# idle for KONTAINER_SSH_IDLE_TIMEOUT seconds. Broken transports are replaced by a new connection.
+#
+# Connections without a password and a private key file (e.g. contexts with an ssh:// docker host)
+# are authenticated with the keys of the ssh agent or the default key files, same as the ssh command line client.
+
+ssh_transport_pool_cache = None
+
+# (private_key_file, mtime) -> paramiko.PKey
+private_key_cache = dict()
+private_key_cache_lock = threading.Lock()
+
+# Key files, which are tried, if no password and no private key file is configured
+DEFAULT_PRIVATE_KEY_FILES = ("~/.ssh/id_ed25519", "~/.ssh/id_ecdsa", "~/.ssh/id_rsa")
+
+
+def load_private_key(private_key_file, private_key_pass=None, private_key_pass_file=None) -> paramiko.PKey:
+    """
+    Load a private key file. Parsed keys are cached until the key file is modified.
+
+    :param private_key_file: The path to the private key file.
+    :param private_key_pass: The passphrase for the private key (optional). Not recommended to use.
+    :param private_key_pass_file: The path to the file containing the passphrase for the private key (optional).
+    :return: The private key.
+    """
+    cache_key = (private_key_file, os.path.getmtime(private_key_file))
+    with private_key_cache_lock:
+        pkey = private_key_cache.get(cache_key, None)
+    if pkey is not None:
+        return pkey
+
+    key_passphrase = private_key_pass
+    if private_key_pass_file:
+        with open(private_key_pass_file, 'r') as f:
+            key_passphrase = f.read().strip()
+
+    pkey = paramiko.RSAKey.from_private_key_file(private_key_file, password=key_passphrase)
+    with private_key_cache_lock:
+        for stale_key in [k for k in private_key_cache if k[0] == private_key_file]:
+            del private_key_cache[stale_key]
+        private_key_cache[cache_key] = pkey
+    return pkey
+
+
+def load_default_private_keys() -> list:
+    """
+    Load the unencrypted default key files (DEFAULT_PRIVATE_KEY_FILES) of the current user.
+    Missing, encrypted and unsupported key files are skipped.
+
+    :return: List of private keys
+    """
+    pkeys = []
+    for path in DEFAULT_PRIVATE_KEY_FILES:
+        path = os.path.expanduser(path)
+        if not os.path.exists(path):
+            continue
+        cache_key = (path, os.path.getmtime(path))
+        with private_key_cache_lock:
+            pkey = private_key_cache.get(cache_key, None)
+        if pkey is None:
+            try:
+                pkey = paramiko.PKey.from_path(path)
+            except (paramiko.SSHException, OSError, ValueError) as e:
+                print(f"Skipping default key file {path}: {e}")
+                continue
+            with private_key_cache_lock:
+                private_key_cache[cache_key] = pkey
+        pkeys.append(pkey)
+    return pkeys
+
+
+class PooledTransport:
+    def __init__(self, key: tuple, transport: paramiko.Transport):
+        self.key = key
+        self.transport = transport
+        self.channels = 0
+        self.last_used = time.time()
+
+
+class SSHTransportPool:
+    """
+    Pool of authenticated SSH transports, which are shared by the remote commands.
+    """
+
+    def __init__(self, max_channels: int, idle_timeout: int, keepalive: int, connect_timeout: int):
+        self.max_channels = max_channels
+        self.idle_timeout = idle_timeout
+        self.keepalive = keepalive
+        self.connect_timeout = connect_timeout
+        self.transports = dict()
+        self.lock = threading.Lock()
+
+    def _connect(self, hostname, port, username, password=None, pkey=None) -> paramiko.Transport:
+        print(f"Connecting to {hostname}...")
+        sock = socket.create_connection((hostname, port), timeout=self.connect_timeout)
+        transport = paramiko.Transport(sock)
+        try:
+            transport.set_keepalive(self.keepalive)
+            transport.connect(username=username, password=password, pkey=pkey, hostkey=None)
+            if not transport.is_authenticated():
+                # without a password and a key, connect() only negotiates the session
+                self._auth_default_keys(transport, username)
+        except Exception:
+            transport.close()
+            raise
+        return transport
+
+    def _auth_default_keys(self, transport: paramiko.Transport, username) -> None:
+        """
+        Authenticate with the keys of the ssh agent or the default key files.
+
+        :raises paramiko.AuthenticationException: If no key is accepted
+        """
+        agent = paramiko.Agent()
+        try:
+            for pkey in list(agent.get_keys()) + load_default_private_keys():
+                try:
+                    transport.auth_publickey(username, pkey)
+                except paramiko.AuthenticationException:
+                    continue
+                if transport.is_authenticated():
+                    return
+        finally:
+            agent.close()
+        raise paramiko.AuthenticationException(f"No ssh agent key or default key file accepted for user {username}")
+
+    def acquire(self, hostname, username, password=None, private_key_file=None, private_key_pass=None,
+                private_key_pass_file=None, port=22) -> PooledTransport:
+        """
+        Get a transport with a free channel slot. The slot must be released with release().
+        """
+        key = (hostname, port, username, private_key_file)
+        self.evict()
+        with self.lock:
+            for pooled in self.transports.get(key, []):
+                if pooled.channels < self.max_channels and pooled.transport.is_active():
+                    pooled.channels += 1
+                    pooled.last_used = time.time()
+                    return pooled
+
+        pkey = load_private_key(private_key_file, private_key_pass, private_key_pass_file) \
+            if private_key_file else None
+        pooled = PooledTransport(key, self._connect(hostname, port, username, password=password, pkey=pkey))
+        pooled.channels = 1
+        with self.lock:
+            self.transports.setdefault(key, []).append(pooled)
+        return pooled
+
+    def release(self, pooled: PooledTransport) -> None:
+        with self.lock:
+            pooled.channels = max(pooled.channels - 1, 0)
+            pooled.last_used = time.time()
+
+    def discard(self, pooled: PooledTransport) -> None:
+        """
+        Remove a broken transport from the pool. Open channels of the transport are closed.
+        """
+        with self.lock:
+            transports = self.transports.get(pooled.key, [])
+            if pooled in transports:
+                transports.remove(pooled)
+            if len(transports) == 0:
+                self.transports.pop(pooled.key, None)
+        pooled.transport.close()
+
+    def evict(self) -> None:
+        """
+        Close idle and broken transports.
+        """
+        expired_before = time.time() - self.idle_timeout
+        evicted = []
+        with self.lock:
+            for key in list(self.transports.keys()):
+                keep = []
+                for pooled in self.transports[key]:
+                    if not pooled.transport.is_active() \
+                            or (pooled.channels == 0 and pooled.last_used < expired_before):
+                        evicted.append(pooled)
+                    else:
+                        keep.append(pooled)
+                if keep:
+                    self.transports[key] = keep
+                else:
+                    del self.transports[key]
+        for pooled in evicted:
+            pooled.transport.close()
+
+    @contextmanager
+    def channel(self, **ssh_config):
+        """
+        Open a session channel on a pooled transport.
+        If the transport is broken, the channel is opened on a new connection.
+
+        Usage:
+            with pool.channel(hostname="host", username="user", private_key_file="id_rsa") as channel:
+                channel.exec_command("uptime")
+
+        :param ssh_config: The connection parameters (see acquire())
+        """
+        pooled = self.acquire(**ssh_config)
+        try:
+            channel = pooled.transport.open_session(timeout=self.connect_timeout)
+        except (paramiko.SSHException, EOFError, OSError) as e:
+            print(f"SSH transport to {ssh_config.get('hostname')} lost, reconnecting: {e}")
+            self.release(pooled)
+            self.discard(pooled)
+            pooled = self.acquire(**ssh_config)
+            try:
+                channel = pooled.transport.open_session(timeout=self.connect_timeout)
+            except Exception:
+                self.release(pooled)
+                raise
+
+        try:
+            yield channel
+        finally:
+            channel.close()
+            self.release(pooled)
+
+    def close(self) -> None:
+        with self.lock:
+            transports = [pooled for pooled_list in self.transports.values() for pooled in pooled_list]
+            self.transports = dict()
+        for pooled in transports:
+            pooled.transport.close()
+
+
+def get_ssh_transport_pool() -> SSHTransportPool:
+    """
+    Get the shared SSH transport pool.
+
+    :return: SSHTransportPool instance
+    """
+    global ssh_transport_pool_cache
+    if ssh_transport_pool_cache is None:
+        ssh_transport_pool_cache = SSHTransportPool(max_channels=settings.KONTAINER_SSH_MAX_CHANNELS,
+                                                    idle_timeout=settings.KONTAINER_SSH_IDLE_TIMEOUT,
+                                                    keepalive=settings.KONTAINER_SSH_KEEPALIVE,
+                                                    connect_timeout=settings.KONTAINER_SSH_CONNECT_TIMEOUT)
+    return ssh_transport_pool_cache
+
+
+def reset_ssh_transport_pool() -> None:
+    """
+    Drop the shared SSH transport pool, e.g. in forked worker processes.
+    Transports must not be shared between processes, so they are not closed here.
+    """
+    global ssh_transport_pool_cache
+    ssh_transport_pool_cache = None
+
+
+def ssh_channel(ssh_config: dict):
+    """
+    Open a session channel on a pooled SSH transport.
+
+    Usage:
+        with ssh_channel({"hostname": "host", "username": "user"}) as channel:
+            ...
+
+    :param ssh_config: The connection parameters: hostname, username, password, private_key_file,
+                       private_key_pass, private_key_pass_file, port (see ssh_connect_sock)
+    :return: Context manager, which yields the channel and closes it on exit
+    """
+    return get_ssh_transport_pool().channel(**ssh_config)
+
 
 def ssh_connect(hostname, username, password=None,
                 private_key_file=None, private_key_pass=None, private_key_pass_file=None) -> SSHClient:
@@ -57,36 +339,37 @@ def ssh_connect_sock(hostname, username, password=None,
 
     pkey = None
     if private_key_file:
-        if private_key_pass_file:
-            with open(private_key_pass_file, 'r') as f:
-                key_passphrase = f.read().strip()
-        else:
-            key_passphrase = private_key_pass
-
-        pkey = paramiko.RSAKey.from_private_key_file(private_key_file, password=key_passphrase)
+        pkey = load_private_key(private_key_file, private_key_pass, private_key_pass_file)
 
     sock.connect(username=username, password=password, pkey=pkey, hostkey=None)
     return sock
 
 
-def exec_ssh_client_command(ssh: SSHClient, command, environment=None, timeout=None, fail_on_error=False, verbose=False) -> tuple[bytes,bytes,int] | None:
+# Max bytes read from a channel at once
+CHANNEL_READ_SIZE = 32 * 1024
+# Max seconds to wait for channel data, before the timeout and the exit status are checked again
+CHANNEL_POLL_INTERVAL = 0.5
+# Max bytes of stdout and stderr kept per host by fanout_ssh_command
+FANOUT_OUTPUT_MAX = 64 * 1024
+
+
+def _stream_channel_command(session: paramiko.Channel, command, on_output, environment=None, timeout=None,
+                            agent_forward=False, fail_on_error=False, verbose=False, stdin=None) -> int:
     """
-    Execute a command on the remote server using SSH.
+    Execute a command on an open session channel and pass the output to on_output, as it arrives.
 
-    :param ssh: The SSH client object.
-    :param command: The command to execute on the remote server.
-    :param environment: A dictionary of environment variables to set for the command.
-    :param timeout: The timeout for the command execution.
-    :param fail_on_error: If True, raise an exception if the command fails (has stderr output).
-    :param verbose: If True, print the command before executing it.
-    :return: The output of the command. Tuple of (stdout, stderr, exit_code).
+    stdout and stderr are drained concurrently, so commands with large output on either stream
+    do not block on a full channel window. stdin (a binary file object) is sent by a separate thread.
     """
     try:
+        # 🔑 Enable agent forwarding on this channel
+        if agent_forward:
+            paramiko.agent.AgentRequestHandler(session)
+
         print(f"Executing command on remote: {command}")
 
         if environment is None:
             environment = dict()
-
         environment["KONTAINER_REMOTE_ENV"] = "1"
         environment["KONTAINER_REMOTE_UTILS_VERSION"] = "0.1.0"
         environment["KONTAINER_REMOTE_HOME"] = "~/.kontainer"
@@ -105,34 +388,151 @@ def exec_ssh_client_command(ssh: SSHClient, command, environment=None, timeout=N
             {command}
             """
 
-        stdin, stdout, stderr = ssh.exec_command(command, timeout=timeout, environment=environment)
+        deadline = time.monotonic() + timeout if timeout is not None and timeout > 0 else None
+
+        def _remaining() -> float:
+            if deadline is None:
+                return CHANNEL_POLL_INTERVAL
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise socket.timeout(f"Command timed out after {timeout} seconds")
+            return min(remaining, CHANNEL_POLL_INTERVAL)
 
-        # Wait for command to finish and get the exit status
-        exit_code = stdout.channel.recv_exit_status()
+        session.update_environment(environment)
+        session.exec_command(command)
 
-        stdout_bytes = stdout.read()
-        stderr_bytes = stderr.read()
-        print(stdout_bytes.decode())
+        if stdin is not None:
+            def _send_stdin():
+                try:
+                    while chunk := stdin.read(CHANNEL_READ_SIZE):
+                        session.sendall(chunk)
+                    session.shutdown_write()
+                except Exception as e:
+                    print(f"Failed to send stdin to remote command: {e}")
+
+            threading.Thread(target=_send_stdin, name="kontainer-ssh-stdin", daemon=True).start()
+
+        while True:
+            wait = _remaining()
+            while session.recv_ready():
+                on_output("stdout", session.recv(CHANNEL_READ_SIZE))
+            while session.recv_stderr_ready():
+                on_output("stderr", session.recv_stderr(CHANNEL_READ_SIZE))
+            if session.eof_received or session.closed:
+                # stdout and stderr share the eof, the remaining data has been drained above
+                if not session.recv_ready() and not session.recv_stderr_ready():
+                    break
+                continue
+            # the channel fileno is readable, when data is available on stdout or stderr
+            select.select([session], [], [], wait)
+
+        # Wait for the exit status, which is sent after the output
+        while not session.exit_status_ready():
+            session.status_event.wait(_remaining())
+        exit_code = session.recv_exit_status()
+        print(f"Remote command exited with exit code {exit_code}")
 
         if exit_code != 0 and fail_on_error:
             raise Exception(f"Command failed with non-zero exit code: {exit_code}")
 
-        return stdout_bytes, stderr_bytes, exit_code
+        return exit_code
 
     except socket.timeout as e:
         print(f"❌ Command timed out after {timeout} seconds.")
+        session.close()
         raise e
-
     except Exception as e:
         print(f"❌ Command failed: {e}")
         raise e
 
+
+def _exec_channel_command(session: paramiko.Channel, command, environment=None, timeout=None,
+                          agent_forward=False, fail_on_error=False, verbose=False) -> tuple[bytes,bytes,int]:
+    """
+    Execute a command on an open session channel and collect the output.
+    """
+    output = {"stdout": [], "stderr": []}
+    exit_code = _stream_channel_command(session, command, lambda stream, data: output[stream].append(data),
+                                        environment=environment, timeout=timeout, agent_forward=agent_forward,
+                                        fail_on_error=fail_on_error, verbose=verbose)
+    return b"".join(output["stdout"]), b"".join(output["stderr"]), exit_code
+
+
+def stream_ssh_command(ssh: paramiko.transport.Transport | dict, command, on_output, environment=None, timeout=None,
+                       agent_forward=False, fail_on_error=False, verbose=False, stdin=None) -> int:
+    """
+    Execute a command on the remote server and stream the output.
+
+    Usage:
+        exit_code = stream_ssh_command(ssh_config, "docker compose pull",
+                                       lambda stream, data: print(stream, data.decode()), timeout=600)
+
+    :param ssh: The SSH Transport object or the connection parameters of a pooled transport (see ssh_channel).
+    :param command: The command to execute on the remote server.
+    :param on_output: Callback(stream, data), called with each chunk of output. stream is 'stdout' or 'stderr'.
+    :param environment: A dictionary of environment variables to set for the command.
+    :param timeout: Max seconds (wall clock) the command may run. The channel is closed on timeout.
+    :param agent_forward: If True, enable agent forwarding on the channel.
+    :param fail_on_error: If True, raise an exception if the command fails (non-zero exit code).
+    :param verbose: If True, print the command before executing it.
+    :param stdin: Binary file object, which is sent to the command as stdin (optional).
+    :return: The exit code of the command.
+    :raises socket.timeout: If the command did not finish in time.
+    """
+    if isinstance(ssh, dict):
+        with ssh_channel(ssh) as session:
+            return _stream_channel_command(session, command, on_output, environment=environment, timeout=timeout,
+                                           agent_forward=agent_forward, fail_on_error=fail_on_error,
+                                           verbose=verbose, stdin=stdin)
+
+    session = ssh.open_session()
+    try:
+        return _stream_channel_command(session, command, on_output, environment=environment, timeout=timeout,
+                                       agent_forward=agent_forward, fail_on_error=fail_on_error, verbose=verbose,
+                                       stdin=stdin)
     finally:
-        # ssh.close()
-        pass
+        session.close()
 
 
-def exec_ssh_sock_command(sock: paramiko.transport.Transport, command, environment=None, timeout=None,
+def exec_ssh_command(ssh_config: dict, command, environment=None, timeout=None,
+                     agent_forward=False, fail_on_error=False, verbose=False) -> tuple[bytes,bytes,int] | None:
+    """
+    Execute a command on the remote server on a channel of a pooled SSH transport.
+
+    :param ssh_config: The connection parameters (see ssh_channel).
+    :param command: The command to execute on the remote server.
+    :param environment: A dictionary of environment variables to set for the command.
+    :param timeout: The timeout for the command execution.
+    :param agent_forward: If True, enable agent forwarding on the channel.
+    :param fail_on_error: If True, raise an exception if the command fails (has stderr output).
+    :param verbose: If True, print the command before executing it.
+    :return: The output of the command. Tuple of (stdout, stderr, exit_code).
+    """
+    with ssh_channel(ssh_config) as session:
+        return _exec_channel_command(session, command, environment=environment, timeout=timeout,
+                                     agent_forward=agent_forward, fail_on_error=fail_on_error, verbose=verbose)
+
+
+def exec_ssh_client_command(ssh: SSHClient | dict, command, environment=None, timeout=None, fail_on_error=False, verbose=False) -> tuple[bytes,bytes,int] | None:
+    """
+    Execute a command on the remote server using SSH.
+
+    :param ssh: The SSH client object or the connection parameters of a pooled transport (see ssh_channel).
+    :param command: The command to execute on the remote server.
+    :param environment: A dictionary of environment variables to set for the command.
+    :param timeout: The timeout for the command execution.
+    :param fail_on_error: If True, raise an exception if the command fails (has stderr output).
+    :param verbose: If True, print the command before executing it.
+    :return: The output of the command. Tuple of (stdout, stderr, exit_code).
+    """
+    if isinstance(ssh, dict):
+        return exec_ssh_command(ssh, command, environment=environment, timeout=timeout,
+                                fail_on_error=fail_on_error, verbose=verbose)
+    return exec_ssh_sock_command(ssh.get_transport(), command, environment=environment, timeout=timeout,
+                                 fail_on_error=fail_on_error, verbose=verbose)
+
+
+def exec_ssh_sock_command(sock: paramiko.transport.Transport | dict, command, environment=None, timeout=None,
                           agent_forward=False, fail_on_error=False, verbose=False) -> tuple[bytes,bytes,int] | None:
     """
     Execute a command on the remote server using SSH Transport.
@@ -140,7 +540,7 @@ def exec_ssh_sock_command(sock: paramiko.transport.Transport, command, environme
     This is useful for executing commands on a remote server using an existing SSH Transport object.
     Additionally, it allows for agent forwarding.
 
-    :param sock: The SSH Transport object.
+    :param sock: The SSH Transport object or the connection parameters of a pooled transport (see ssh_channel).
     :param command: The command to execute on the remote server.
     :param environment: A dictionary of environment variables to set for the command.
     :param timeout: The timeout for the command execution.
@@ -149,70 +549,99 @@ def exec_ssh_sock_command(sock: paramiko.transport.Transport, command, environme
     :param verbose: If True, print the command before executing it.
     :return: The output of the command. Tuple of (stdout, stderr, exit_code).
     """
+    if isinstance(sock, dict):
+        return exec_ssh_command(sock, command, environment=environment, timeout=timeout,
+                                agent_forward=agent_forward, fail_on_error=fail_on_error, verbose=verbose)
 
     # Create a new session channel
     session = sock.open_session()
     try:
-        # 🔑 Enable agent forwarding on this channel
-        if agent_forward:
-            paramiko.agent.AgentRequestHandler(session)
-
-        print(f"Executing command on remote: {command}")
-
-        if environment is None:
-            environment = dict()
-        environment["KONTAINER_REMOTE_ENV"] = "1"
-        environment["KONTAINER_REMOTE_UTILS_VERSION"] = "0.1.0"
-        environment["KONTAINER_REMOTE_HOME"] = "~/.kontainer"
-        # environment["KONTAINER_REMOTE_GIT_BIN"] = "/usr/bin/git"
-        # environment["KONTAINER_REMOTE_DOCKER_BIN"] = "/usr/bin/docker"
-
-        if verbose:
-            command = f"""
-            set -x
-            {command}
-            """
-
-        if fail_on_error:
-            command = f"""
-            set -e
-            {command}
-            """
-
-        session.exec_command(command)
-
-        # Wait for command to finish with a timeout
-        if session.recv_ready() or session.recv_stderr_ready():
-            # Already ready — no need to wait
-            pass
-        elif timeout is not None and timeout > 0:
-            session.settimeout(timeout)
-
-        # Wait until command finishes
-        exit_code = session.recv_exit_status() # Blocks
+        return _exec_channel_command(session, command, environment=environment, timeout=timeout,
+                                     agent_forward=agent_forward, fail_on_error=fail_on_error, verbose=verbose)
+    finally:
+        session.close()
 
-        stdout = session.makefile('rb')
-        stderr = session.makefile_stderr('rb')
 
-        stdout_bytes = stdout.read()
-        stderr_bytes = stderr.read()
-        print(stdout_bytes.decode())
-        print(f"Error: {stderr_bytes.decode()}")
+def remote_shell_path(path: str) -> str:
+    """
+    Quote a remote path for the shell. Paths starting with '~/' are resolved in the home directory.
 
-        if exit_code != 0 and fail_on_error:
-            raise Exception(f"Command failed with non-zero exit code: {exit_code}")
+    :param path: The remote path, e.g. '~/.kontainer/stacks/ctx/app'
+    :return: The quoted path, e.g. "$HOME"/'.kontainer/stacks/ctx/app'
+    """
+    if path.startswith("~/"):
+        return f'"$HOME"/{shlex.quote(path[2:])}'
+    return shlex.quote(path)
 
-        return stdout_bytes, stderr_bytes, exit_code
 
-    except socket.timeout as e:
-        print(f"❌ Command timed out after {timeout} seconds.")
-        raise e
-    except Exception as e:
-        print(f"❌ Command failed: {e}")
-        raise e
-
-    finally:
-        session.close()
+def fanout_ssh_command(targets: dict, command, max_concurrency=None, timeout=None, on_result=None) -> dict:
+    """
+    Execute a command on many remote servers concurrently, on channels of the pooled ssh transports.
+
+    Each host has its own timeout. Errors (connection failures, timeouts) are reported in the result of the host,
+    they do not affect the other hosts. At most FANOUT_OUTPUT_MAX bytes of stdout and stderr are kept per host.
+
+    Usage:
+        results = fanout_ssh_command({"prod1": ssh_config1, "prod2": ssh_config2}, "df -h /",
+                                     max_concurrency=10, timeout=30,
+                                     on_result=lambda target_id, result: print(target_id, result["exit_code"]))
+
+    :param targets: Dictionary of target id -> connection parameters (see ssh_channel)
+    :param command: The command to execute on each remote server.
+    :param max_concurrency: Max number of hosts, on which the command runs at the same time
+                            (default: KONTAINER_FANOUT_CONCURRENCY)
+    :param timeout: Max seconds (wall clock) the command may run on each host (default: KONTAINER_FANOUT_TIMEOUT)
+    :param on_result: Optional callback(target_id, result), called as soon as the command has finished on a host.
+    :return: Dictionary of target id -> result
+             {"exit_code": 0, "stdout": "...", "stderr": "...", "truncated": False, "duration": 0.3, "error": None}
+    """
+    if max_concurrency is None:
+        max_concurrency = settings.KONTAINER_FANOUT_CONCURRENCY
+    if timeout is None:
+        timeout = settings.KONTAINER_FANOUT_TIMEOUT
+
+    def _run(ssh_config) -> dict:
+        started = time.monotonic()
+        output = {"stdout": bytearray(), "stderr": bytearray()}
+        truncated = False
+
+        def _on_output(stream, data):
+            nonlocal truncated
+            remaining = FANOUT_OUTPUT_MAX - len(output[stream])
+            if len(data) > remaining:
+                truncated = True
+            output[stream] += data[:max(remaining, 0)]
+
+        exit_code = None
+        error = None
+        try:
+            exit_code = stream_ssh_command(ssh_config, command, _on_output, timeout=timeout)
+        except socket.timeout:
+            error = f"Timed out after {timeout} seconds"
+        except Exception as e:
+            error = str(e)
+        return {
+            "exit_code": exit_code,
+            "stdout": output["stdout"].decode("utf-8", errors="replace"),
+            "stderr": output["stderr"].decode("utf-8", errors="replace"),
+            "truncated": truncated,
+            "duration": round(time.monotonic() - started, 3),
+            "error": error,
+        }
+
+    results = dict()
+    if len(targets) == 0:
+        return results
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(targets))),
+                            thread_name_prefix="kontainer-fanout") as pool:
+        futures = {pool.submit(_run, ssh_config): target_id for target_id, ssh_config in targets.items()}
+        for future in as_completed(futures):
+            target_id = futures[future]
+            results[target_id] = future.result()
+            if on_result is not None:
+                on_result(target_id, results[target_id])
+    return results
 
 
 def exec_remote_command(hostname: str, username:str, cmd: str | list):
@@ -1,6 +1,9 @@
+import shlex
+
 import paramiko
 
-from kontainer.util.remote_utils import ssh_connect, exec_ssh_client_command, ssh_connect_sock, exec_ssh_sock_command
+from kontainer.util.remote_utils import ssh_connect, exec_ssh_command, stream_ssh_command
+from kontainer.util.subprocess_util import kwargs_to_cmdargs
 
 
 def rgit_ssh(ssh_config=None) -> paramiko.SSHClient:
@@ -21,15 +24,16 @@ def rgit_ssh(ssh_config=None) -> paramiko.SSHClient:
     return ssh_connect(**ssh_config)
 
 
-def rgit_clone(repo_url: str, dest: str, ssh_config, **kwargs) -> bytes:
+def rgit_clone(repo_url: str, dest: str, ssh_config, output_callback=None, **kwargs) -> bytes:
     """
     Run a git clone command
 
     :param repo_url: Repository to clone
     :param ssh_config: SSH configuration
     :param dest: Destination directory on the remote server
+    :param output_callback: Optional callback(stream, data), called with the output as it arrives
     :param kwargs: Additional arguments to pass to git clone
-    :return:
+    :return: The stdout of the clone
     """
 
     command = f"""
@@ -47,15 +51,19 @@ def rgit_clone(repo_url: str, dest: str, ssh_config, **kwargs) -> bytes:
     fi
     """
 
-    # Using a ssh transport here, because we want agent forwarding
-    ssh_sock = ssh_connect_sock(**ssh_config)
-    try:
-        stdout, stderr, rc = exec_ssh_sock_command(ssh_sock, command, agent_forward=True)
-        if rc != 0:
-            raise ValueError(f"Remote cloning repository exit with non-zero exit code: {rc}")
-        return stdout
-    finally:
-        ssh_sock.close()
+    stdout = []
+
+    def _on_output(stream, data):
+        if stream == "stdout":
+            stdout.append(data)
+        if output_callback is not None:
+            output_callback(stream, data)
+
+    # Using a pooled ssh transport here, with agent forwarding on the channel
+    rc = stream_ssh_command(ssh_config, command, _on_output, agent_forward=True)
+    if rc != 0:
+        raise ValueError(f"Remote cloning repository exit with non-zero exit code: {rc}")
+    return b"".join(stdout)
 
 
 def rgit_pull_head(working_dir: str, ssh_config, **kwargs) -> bytes:
@@ -76,16 +84,26 @@ def rgit_pull_head(working_dir: str, ssh_config, **kwargs) -> bytes:
     return rgit(["pull", "origin", cur_head_str], ssh_config, working_dir=working_dir, **kwargs)
 
 
-def rgit(args: list, ssh_config: dict, **kwargs) -> bytes:
+def rgit(args: list, ssh_config: dict, working_dir=None, timeout=None, **kwargs) -> bytes:
     """
-    Run a git command
+    Run a git command on the remote server
 
     :param ssh_config: SSH configuration
     :param args: Arguments to pass to git
+    :param working_dir: Working directory on the remote server
+    :param timeout: Timeout in seconds
     :param kwargs: Additional arguments to pass to git
-    :return:
+    :return: The output of the git command
     """
-    out = b""
-    print("rgit", ssh_config, args, **kwargs)
-
-    return out
\ No newline at end of file
+    command = " ".join(["git"] + [shlex.quote(str(arg)) for arg in list(args) + kwargs_to_cmdargs(kwargs)])
+    if working_dir is not None:
+        # keep the home directory expansion of '~/...' paths
+        if working_dir.startswith("~/"):
+            command = f"cd ~/{shlex.quote(working_dir[2:])} && {command}"
+        else:
+            command = f"cd {shlex.quote(working_dir)} && {command}"
+
+    stdout, stderr, rc = exec_ssh_command(ssh_config, command, timeout=timeout, agent_forward=True)
+    if rc != 0:
+        raise ValueError(f"Remote git command exit with non-zero exit code {rc}: {stderr.decode('utf-8', errors='replace')}")
+    return stdout
\ No newline at end of file
@@ -0,0 +1,187 @@
+import hashlib
+import json
+import os
+import posixpath
+import stat
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import paramiko
+
+from kontainer.util.remote_utils import ssh_channel
+
+# SFTP directory sync
+#
+# Local directories are synced to remote hosts file by file, over sftp channels of the pooled ssh transports.
+# A manifest of the synced files (relative path -> sha256, size, mode) is stored in the remote directory.
+# Only files, whose hash or mode differs from the remote manifest, are uploaded (in parallel).
+# Files of the remote manifest, which no longer exist locally, are deleted.
+# Other remote files, e.g. data written by containers into bind mounts, are never touched.
+#
+# The manifest is written last, so an interrupted sync is completed by the next sync.
+
+REMOTE_MANIFEST = ".kontainer-manifest.json"
+# Max parallel uploads (sftp channels) of a sync
+SFTP_SYNC_WORKERS = 4
+
+# local file path -> (size, mtime_ns, sha256)
+file_hash_cache = dict()
+file_hash_cache_lock = threading.Lock()
+
+
+def _file_hash(path: str, st: os.stat_result) -> str:
+    """
+    Hash a local file. Hashes are cached until the size or the modification time of the file changes.
+    """
+    with file_hash_cache_lock:
+        cached = file_hash_cache.get(path, None)
+    if cached is not None and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+        return cached[2]
+
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(1024 * 1024):
+            h.update(chunk)
+    digest = h.hexdigest()
+    with file_hash_cache_lock:
+        file_hash_cache[path] = (st.st_size, st.st_mtime_ns, digest)
+    return digest
+
+
+def build_manifest(local_dir: str, exclude=(".git",)) -> dict:
+    """
+    Build the manifest of a local directory.
+
+    :param local_dir: The local directory
+    :param exclude: File and directory names, which are skipped
+    :return: Dictionary of relative path (posix) -> {"sha256": ..., "size": ..., "mode": ...}
+    """
+    files = dict()
+    for root, dirs, names in os.walk(local_dir):
+        dirs[:] = [d for d in dirs if d not in exclude]
+        for name in names:
+            if name in exclude or name == REMOTE_MANIFEST:
+                continue
+            path = os.path.join(root, name)
+            st = os.stat(path)
+            if not stat.S_ISREG(st.st_mode):
+                continue
+            rel_path = os.path.relpath(path, local_dir).replace(os.sep, "/")
+            files[rel_path] = {"sha256": _file_hash(path, st), "size": st.st_size, "mode": stat.S_IMODE(st.st_mode)}
+    return files
+
+
+def _sftp_path(path: str) -> str:
+    # sftp paths are relative to the home directory, '~' is not expanded
+    if path == "~":
+        return "."
+    if path.startswith("~/"):
+        return path[2:]
+    return path
+
+
+@contextmanager
+def sftp_client(ssh_config: dict, timeout=None):
+    """
+    Open an sftp session on a channel of a pooled ssh transport.
+
+    :param ssh_config: The connection parameters (see ssh_channel)
+    :param timeout: Timeout in seconds of each sftp operation (optional)
+    """
+    with ssh_channel(ssh_config) as channel:
+        if timeout is not None:
+            channel.settimeout(timeout)
+        channel.invoke_subsystem("sftp")
+        sftp = paramiko.SFTPClient(channel)
+        try:
+            yield sftp
+        finally:
+            sftp.close()
+
+
+def _read_remote_manifest(sftp: paramiko.SFTPClient, remote_dir: str) -> dict:
+    try:
+        with sftp.open(posixpath.join(remote_dir, REMOTE_MANIFEST), "r") as f:
+            return json.loads(f.read()).get("files", None) or {}
+    except (IOError, ValueError):
+        return {}
+
+
+def _makedirs(sftp: paramiko.SFTPClient, path: str, created: set) -> None:
+    parts = [p for p in path.split("/") if p not in ("", ".")]
+    current = "/" if path.startswith("/") else ""
+    for part in parts:
+        current = posixpath.join(current, part) if current else part
+        if current in created:
+            continue
+        try:
+            sftp.stat(current)
+        except IOError:
+            sftp.mkdir(current)
+        created.add(current)
+
+
+def sync_directory(ssh_config: dict, local_dir: str, remote_dir: str, exclude=(".git",), timeout=None) -> dict:
+    """
+    Sync a local directory to a remote directory over sftp. Only changed files are sent.
+
+    :param ssh_config: The connection parameters (see ssh_channel)
+    :param local_dir: The local directory
+    :param remote_dir: The remote directory, e.g. '~/.kontainer/stacks/ctx/app'
+    :param exclude: File and directory names, which are not synced
+    :param timeout: Timeout in seconds of each sftp operation (optional)
+    :return: Dictionary with the number of uploaded and deleted files, the uploaded bytes and the duration
+    """
+    started = time.time()
+    local_files = build_manifest(local_dir, exclude)
+    remote_dir = _sftp_path(remote_dir)
+
+    with sftp_client(ssh_config, timeout=timeout) as sftp:
+        remote_files = _read_remote_manifest(sftp, remote_dir)
+        changed = [rel_path for rel_path, meta in local_files.items()
+                   if remote_files.get(rel_path, {}).get("sha256") != meta["sha256"]
+                   or remote_files.get(rel_path, {}).get("mode") != meta["mode"]]
+        deleted = [rel_path for rel_path in remote_files.keys() if rel_path not in local_files]
+
+        if changed or deleted or not remote_files:
+            created = set()
+            _makedirs(sftp, remote_dir, created)
+            for rel_path in changed:
+                _makedirs(sftp, posixpath.dirname(posixpath.join(remote_dir, rel_path)), created)
+
+            def _upload(rel_paths):
+                with sftp_client(ssh_config, timeout=timeout) as worker:
+                    for rel_path in rel_paths:
+                        remote_path = posixpath.join(remote_dir, rel_path)
+                        tmp_path = f"{remote_path}.kontainer-tmp"
+                        worker.put(os.path.join(local_dir, rel_path), tmp_path)
+                        worker.chmod(tmp_path, local_files[rel_path]["mode"])
+                        worker.posix_rename(tmp_path, remote_path)
+
+            workers = min(SFTP_SYNC_WORKERS, len(changed))
+            if workers > 0:
+                with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="kontainer-sftp") as pool:
+                    # raises the first upload error
+                    list(pool.map(_upload, [changed[i::workers] for i in range(workers)]))
+
+            for rel_path in deleted:
+                try:
+                    sftp.remove(posixpath.join(remote_dir, rel_path))
+                except IOError as e:
+                    print(f"Failed to delete remote file {rel_path}: {e}")
+
+            manifest_path = posixpath.join(remote_dir, REMOTE_MANIFEST)
+            with sftp.open(f"{manifest_path}.kontainer-tmp", "w") as f:
+                f.write(json.dumps({"files": local_files, "updated": time.time()}))
+            sftp.posix_rename(f"{manifest_path}.kontainer-tmp", manifest_path)
+
+    result = {
+        "uploaded": len(changed),
+        "deleted": len(deleted),
+        "bytes": sum(local_files[rel_path]["size"] for rel_path in changed),
+        "duration": round(time.time() - started, 3),
+    }
+    print(f"Synced {local_dir} to {ssh_config.get('hostname')}:{remote_dir}: {result}")
+    return result
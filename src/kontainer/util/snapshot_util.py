@@ -0,0 +1,92 @@
+import json
+import os
+import tempfile
+import time
+
+import redis
+
+from kontainer import settings
+from kontainer.util.redis_util import get_redis_client, redis_key
+
+# Snapshots of expensive, precomputed data (docker df, volume sizes, registry digests).
+#
+# Snapshots are written by the periodic jobs (see kontainer.jobs) and read by the api endpoints,
+# so user requests do not have to wait for the computation.
+#
+# redis: kontainer:snapshots:<ctx_id>:<name>          # {"data": ..., "updated": 1700000000.0}
+# file:  data/cache/snapshots/<ctx_id>/<name>.json    # without redis
+
+SNAPSHOTS_DIR = os.path.join(settings.KONTAINER_DATA_DIR, "cache", "snapshots")
+
+
+def _snapshot_file(name: str, ctx_id: str) -> str:
+    return os.path.join(SNAPSHOTS_DIR, ctx_id, f"{name}.json")
+
+
+def save_snapshot(name: str, ctx_id: str, data, ttl=None) -> None:
+    """
+    Save a snapshot.
+
+    :param name: Snapshot name, e.g. 'df'
+    :param ctx_id: The context id
+    :param data: JSON serializable data
+    :param ttl: Expire the snapshot after ttl seconds (default: KONTAINER_SNAPSHOT_TTL, redis only)
+    """
+    payload = json.dumps({"data": data, "updated": time.time()}, default=str)
+
+    client = get_redis_client()
+    if client is not None:
+        try:
+            client.set(redis_key("snapshots", ctx_id, name), payload,
+                       ex=ttl if ttl is not None else settings.KONTAINER_SNAPSHOT_TTL)
+            return
+        except redis.exceptions.ConnectionError as e:
+            print(f"Redis not available, saving snapshot {name} to file: {e}")
+
+    snapshot_file = _snapshot_file(name, ctx_id)
+    os.makedirs(os.path.dirname(snapshot_file), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(snapshot_file), prefix=".snapshot-")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(payload)
+        os.replace(tmp_path, snapshot_file)
+    except Exception:
+        os.unlink(tmp_path)
+        raise
+
+
+def load_snapshot(name: str, ctx_id: str, max_age=None) -> dict | None:
+    """
+    Load a snapshot.
+
+    :param name: Snapshot name, e.g. 'df'
+    :param ctx_id: The context id
+    :param max_age: Ignore snapshots older than max_age seconds (default: KONTAINER_SNAPSHOT_MAX_AGE)
+    :return: Dictionary with 'data' and 'updated' (timestamp) or None, if there is no recent snapshot
+    """
+    if max_age is None:
+        max_age = settings.KONTAINER_SNAPSHOT_MAX_AGE
+
+    payload = None
+    client = get_redis_client()
+    if client is not None:
+        try:
+            payload = client.get(redis_key("snapshots", ctx_id, name))
+        except redis.exceptions.ConnectionError as e:
+            print(f"Redis not available, loading snapshot {name} from file: {e}")
+            client = None
+
+    if client is None:
+        try:
+            with open(_snapshot_file(name, ctx_id), "r") as f:
+                payload = f.read()
+        except FileNotFoundError:
+            payload = None
+
+    if payload is None:
+        return None
+
+    snapshot = json.loads(payload)
+    if time.time() - snapshot.get("updated", 0) > max_age:
+        return None
+    return snapshot
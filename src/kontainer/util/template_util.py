@@ -0,0 +1,188 @@
+import os
+import re
+import shutil
+import threading
+from collections import OrderedDict
+
+# Template rendering for template directories.
+#
+# Template files are tokenized once into literal and placeholder segments and cached per file and mtime
+# (least recently used files are evicted, if more than COMPILED_TEMPLATE_CACHE_SIZE files are cached).
+# Rendering is a single pass over the segments, replacing '{{ key }}' placeholders with parameter values.
+# Unknown placeholders are kept as they are (same text and spacing as in the template file).
+# Binary files and files without placeholders are copied without decoding (copy_file_range / hard link).
+# Large files with placeholders are rendered line by line, without holding them in memory.
+
+PLACEHOLDER_RE = re.compile(rb"\{\{\s*([A-Za-z0-9_.-]+)\s*\}\}")
+
+# Files larger than this are not cached as segments, but streamed when rendered
+STREAM_THRESHOLD = 1024 * 1024
+# Files with a NUL byte in the first n bytes are treated as binary
+BINARY_CHECK_SIZE = 8192
+
+# Max number of cached compiled template files
+COMPILED_TEMPLATE_CACHE_SIZE = 256
+
+# path -> ((mtime_ns, size), CompiledTemplate), least recently used first
+compiled_template_cache = OrderedDict()
+compiled_template_cache_lock = threading.Lock()
+
+
+class CompiledTemplate:
+    """
+    A tokenized template file.
+
+    Attributes:
+        path (str): Path to the template file.
+        binary (bool): Whether the file is binary.
+        has_placeholders (bool): Whether the file contains placeholders.
+        segments (list): Literal bytes and placeholders (name, raw bytes), alternating.
+                         None for binary files, files without placeholders and large files.
+    """
+
+    def __init__(self, path: str, binary=False, has_placeholders=False, segments=None):
+        self.path = path
+        self.binary = binary
+        self.has_placeholders = has_placeholders
+        self.segments = segments
+
+    def render(self, parameters: dict, dest: str) -> None:
+        """
+        Render the template to the destination file.
+
+        :param parameters: Template parameters
+        :param dest: Destination file path
+        """
+        values = {k: str(v).encode("utf-8") for k, v in parameters.items()}
+
+        if self.segments is None:
+            # stream large files line by line (placeholders never span multiple lines)
+            def _replace(match):
+                return values.get(match.group(1).decode("utf-8"), match.group(0))
+
+            with open(self.path, "rb") as src, open(dest, "wb") as f:
+                for line in src:
+                    f.write(PLACEHOLDER_RE.sub(_replace, line))
+            return
+
+        out = []
+        for i, segment in enumerate(self.segments):
+            if i % 2 == 0:
+                out.append(segment)
+            else:
+                name, raw = segment
+                out.append(values.get(name, raw))
+        with open(dest, "wb") as f:
+            f.write(b"".join(out))
+
+
+def compile_template_file(path: str) -> CompiledTemplate:
+    """
+    Tokenize a template file. The result is cached per file path and mtime.
+
+    :param path: Path to the template file
+    :return: CompiledTemplate instance
+    """
+    st = os.stat(path)
+    with compiled_template_cache_lock:
+        cached = compiled_template_cache.get(path)
+        if cached is not None and cached[0] == (st.st_mtime_ns, st.st_size):
+            compiled_template_cache.move_to_end(path)
+            return cached[1]
+
+    with open(path, "rb") as f:
+        head = f.read(BINARY_CHECK_SIZE)
+        if b"\0" in head:
+            compiled = CompiledTemplate(path, binary=True)
+        elif st.st_size > STREAM_THRESHOLD:
+            has_placeholders = PLACEHOLDER_RE.search(head) is not None
+            if not has_placeholders:
+                f.seek(0)
+                has_placeholders = any(PLACEHOLDER_RE.search(line) for line in f)
+            compiled = CompiledTemplate(path, has_placeholders=has_placeholders)
+        else:
+            content = head + f.read()
+            segments = []
+            pos = 0
+            for match in PLACEHOLDER_RE.finditer(content):
+                segments.append(content[pos:match.start()])
+                segments.append((match.group(1).decode("utf-8"), match.group(0)))
+                pos = match.end()
+            segments.append(content[pos:])
+            compiled = CompiledTemplate(path,
+                                        has_placeholders=len(segments) > 1,
+                                        segments=segments if len(segments) > 1 else None)
+
+    with compiled_template_cache_lock:
+        compiled_template_cache[path] = ((st.st_mtime_ns, st.st_size), compiled)
+        compiled_template_cache.move_to_end(path)
+        while len(compiled_template_cache) > COMPILED_TEMPLATE_CACHE_SIZE:
+            compiled_template_cache.popitem(last=False)
+    return compiled
+
+
+def copy_file_fast(src: str, dest: str, link=False) -> None:
+    """
+    Copy a file without reading it into python.
+    Uses copy_file_range (in-kernel copy, reflinks on supported filesystems), if available.
+
+    :param src: Source file path
+    :param dest: Destination file path
+    :param link: If True, hard link the file instead of copying it, if possible.
+                 Only use this, if the destination file is never modified in place.
+    """
+    if link:
+        try:
+            os.link(src, dest)
+            return
+        except OSError:
+            pass
+
+    if hasattr(os, "copy_file_range"):
+        try:
+            with open(src, "rb") as fsrc, open(dest, "wb") as fdest:
+                remaining = os.fstat(fsrc.fileno()).st_size
+                while remaining > 0:
+                    copied = os.copy_file_range(fsrc.fileno(), fdest.fileno(), remaining)
+                    if copied == 0:
+                        break
+                    remaining -= copied
+            shutil.copymode(src, dest)
+            return
+        except OSError:
+            pass
+
+    shutil.copy(src, dest)
+
+
+def render_template_dir(template_dir: str, dest_dir: str, parameters=None, link=False) -> list:
+    """
+    Render all files of a template directory into the destination directory.
+
+    :param template_dir: Template directory
+    :param dest_dir: Destination directory
+    :param parameters: Template parameters
+    :param link: If True, hard link files without placeholders instead of copying them
+    :return: List of rendered file paths, relative to the destination directory
+    """
+    if parameters is None:
+        parameters = dict()
+
+    rendered = []
+    for root, dirs, files in os.walk(template_dir):
+        dirs[:] = [d for d in dirs if d != ".git"]
+        for file in files:
+            file_path = os.path.join(root, file)
+            rel_path = os.path.relpath(file_path, template_dir)
+            dest_file_path = os.path.join(dest_dir, rel_path)
+            os.makedirs(os.path.dirname(dest_file_path), exist_ok=True)
+
+            compiled = compile_template_file(file_path)
+            if compiled.binary or not compiled.has_placeholders:
+                copy_file_fast(file_path, dest_file_path, link=link)
+            else:
+                compiled.render(parameters, dest_file_path)
+                shutil.copymode(file_path, dest_file_path)
+            rendered.append(rel_path)
+
+    return rendered
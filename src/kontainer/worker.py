@@ -0,0 +1,30 @@
+from celery import signals
+
+from kontainer import settings
+
+# Celery worker process setup
+#
+# Prefork worker processes inherit the module state of the parent process.
+# Docker clients, stack managers, http sessions and ssh transports, which were created in the parent,
+# hold connections which must not be shared, so they are dropped in each new worker process.
+# Then the docker clients of the contexts served by the worker (KONTAINER_WORKER_CONTEXTS) are created,
+# so the first task of a context does not pay for the connection setup.
+
+
+@signals.worker_process_init.connect
+def _on_worker_process_init(**kwargs):
+    from kontainer.docker.dkr import reset_docker_manager_cache, get_docker_manager_cached
+    from kontainer.stacks.stacksmanager import reset_stacks_manager_cache
+    from kontainer.util.download_util import reset_http_session
+    from kontainer.util.remote_utils import reset_ssh_transport_pool
+
+    reset_docker_manager_cache()
+    reset_stacks_manager_cache()
+    reset_http_session()
+    reset_ssh_transport_pool()
+
+    for ctx_id in settings.KONTAINER_WORKER_CONTEXTS:
+        try:
+            get_docker_manager_cached(ctx_id).ping()
+        except Exception as e:
+            print(f"Failed to connect to docker context {ctx_id}: {e}")
@@ -0,0 +1,60 @@
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+import redis
+
+from kontainer.stacks import locks
+from kontainer.stacks.locks import stack_lock, dispatch_stack_task
+
+
+class TestStackLock(TestCase):
+    def _client(self, release_error):
+        client = MagicMock()
+        client.lock.return_value.acquire.return_value = True
+        client.lock.return_value.release.side_effect = release_error
+        return client
+
+    def test_release_errors_do_not_hide_the_result(self):
+        for error in (redis.exceptions.ConnectionError("connection lost"),
+                      redis.exceptions.LockNotOwnedError("expired")):
+            with patch("kontainer.stacks.locks.get_redis_client", return_value=self._client(error)):
+                with stack_lock("local", "app", timeout=1):
+                    result = "done"
+            self.assertEqual("done", result)
+
+    def test_release_errors_do_not_hide_the_error(self):
+        client = self._client(redis.exceptions.ConnectionError("connection lost"))
+        with patch("kontainer.stacks.locks.get_redis_client", return_value=client):
+            with self.assertRaisesRegex(ValueError, "operation failed"):
+                with stack_lock("local", "app", timeout=1):
+                    raise ValueError("operation failed")
+
+
+class TestDispatchStackTask(TestCase):
+    def setUp(self):
+        self.task = MagicMock()
+        self.task.name = "kontainer.stacks.tasks.stack_sync_task"
+        self.executor = MagicMock()
+        self.executor.get_status.return_value = {"state": "PENDING"}
+        patchers = [patch("kontainer.stacks.locks.get_task_executor", return_value=self.executor),
+                    patch.dict(locks.local_pending, clear=True)]
+        for p in patchers:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def test_pending_marker_expires(self):
+        client = MagicMock()
+        with patch("kontainer.stacks.locks.get_redis_client", return_value=client), \
+                patch("kontainer.settings.KONTAINER_STACK_PENDING_MAX_AGE", 30):
+            dispatch_stack_task(self.task, "local", "app")
+        self.assertEqual(30, client.set.call_args.kwargs["ex"])
+
+    def test_lost_local_task_is_not_coalesced_forever(self):
+        # the result backend reports a lost task as pending forever
+        with patch("kontainer.stacks.locks.get_redis_client", return_value=None):
+            task_id, _ = dispatch_stack_task(self.task, "local", "app")
+            self.assertEqual((task_id, True), dispatch_stack_task(self.task, "local", "app"))
+            with patch("kontainer.settings.KONTAINER_STACK_PENDING_MAX_AGE", 0):
+                new_task_id, coalesced = dispatch_stack_task(self.task, "local", "app")
+        self.assertFalse(coalesced)
+        self.assertNotEqual(task_id, new_task_id)
@@ -0,0 +1,67 @@
+import time
+from unittest import TestCase
+from unittest.mock import patch
+
+from kontainer.stacks.workflows import new_workflow, run_deploy_workflow, is_workflow_active, DEPLOY_STEP_FUNCTIONS
+
+
+class TestDeployWorkflow(TestCase):
+    def setUp(self):
+        self.calls = []
+        self.fail_build = True
+
+        def _step(name, skipped=False):
+            def _run(stack, run):
+                self.calls.append(name)
+                if name == "build" and self.fail_build:
+                    raise Exception("build failed")
+                return name.encode(), skipped
+            return _run
+
+        steps = {"sync": _step("sync", skipped=True), "pull": _step("pull"),
+                 "build": _step("build"), "up": _step("up")}
+        patchers = [patch.dict(DEPLOY_STEP_FUNCTIONS, steps),
+                    patch("kontainer.stacks.workflows.save_workflow")]
+        for p in patchers:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def test_retry_continues_with_the_failed_step(self):
+        workflow = new_workflow("w1", "local", "app")
+        with self.assertRaises(Exception):
+            run_deploy_workflow(object(), workflow)
+
+        self.assertEqual("failed", workflow["state"])
+        self.assertEqual(["skipped", "success", "failed", "pending"], [s["state"] for s in workflow["steps"]])
+        self.assertEqual("build failed", workflow["steps"][2]["error"])
+        self.assertIsNotNone(workflow["steps"][2]["duration"])
+
+        self.calls.clear()
+        self.fail_build = False
+        progress = []
+        out = run_deploy_workflow(object(), workflow, progress_callback=lambda c, t, m: progress.append(c))
+
+        self.assertEqual(["build", "up"], self.calls)
+        self.assertEqual("success", workflow["state"])
+        self.assertEqual(2, workflow["steps"][2]["attempts"])
+        self.assertIn(b"=== up ===", out)
+        self.assertEqual([2, 3, 4], progress)
+
+
+class TestWorkflowActive(TestCase):
+    def _running_workflow(self, task_state, updated_ago=0):
+        workflow = new_workflow("w1", "local", "app")
+        workflow.update(state="running", task_id="t1", updated=time.time() - updated_ago)
+        executor = patch("kontainer.stacks.workflows.get_task_executor")
+        self.addCleanup(executor.stop)
+        executor.start().return_value.get_status.return_value = {"state": task_state}
+        return workflow
+
+    def test_started_task_is_active(self):
+        self.assertTrue(is_workflow_active(self._running_workflow("PROGRESS")))
+
+    def test_dead_task_can_be_retried(self):
+        # unknown to the result backend, e.g. after a worker restart
+        self.assertFalse(is_workflow_active(self._running_workflow("PENDING")))
+        # killed, but still reported as started
+        self.assertFalse(is_workflow_active(self._running_workflow("STARTED", updated_ago=100000)))
@@ -0,0 +1,39 @@
+import pickle
+from datetime import datetime, timedelta, timezone
+from unittest import TestCase
+
+from kontainer.scheduler import parse_schedule, get_job_schedules, get_job_offset, get_beat_schedule
+
+
+class TestSchedules(TestCase):
+    def test_offset_delays_the_schedule(self):
+        schedule = parse_schedule("*/5 * * * *", offset=40)
+        now = datetime.now(timezone.utc)
+        # the last cron tick, as seen by the delayed schedule
+        shifted = now - timedelta(seconds=40)
+        last_tick = shifted.replace(second=0, microsecond=0) - timedelta(minutes=shifted.minute % 5)
+
+        # run at the last tick (plus offset) -> due at the next tick plus offset
+        due, next_check = schedule.is_due(last_tick + timedelta(seconds=40))
+        self.assertFalse(due)
+        expected = (last_tick + timedelta(minutes=5, seconds=40) - now).total_seconds()
+        self.assertAlmostEqual(expected, next_check, delta=1)
+
+        due, _ = schedule.is_due(last_tick - timedelta(minutes=5) + timedelta(seconds=40))
+        self.assertTrue(due)
+
+    def test_disabled_and_invalid_schedules_are_skipped(self):
+        schedules = get_job_schedules({"a": "0 3 * * *", "b": "", "c": "x", "d": "* * * * foo"})
+        self.assertEqual(["a"], list(schedules.keys()))
+
+    def test_offset_is_stable_and_bounded(self):
+        self.assertEqual(get_job_offset("job", 60), get_job_offset("job", 60))
+        self.assertTrue(0 <= get_job_offset("job", 60) <= 60)
+        self.assertEqual(0, get_job_offset("job", 0))
+
+    def test_beat_schedule_can_be_pickled(self):
+        # celery beat stores the schedule entries in a shelve file
+        beat_schedule = get_beat_schedule("kontainer.jobs.run_job_task", {"job": parse_schedule("*/5 * * * *", 40)})
+        schedule = pickle.loads(pickle.dumps(beat_schedule))["job:job"]["schedule"]
+        self.assertEqual(40, schedule.offset)
+        self.assertEqual(beat_schedule["job:job"]["schedule"], schedule)
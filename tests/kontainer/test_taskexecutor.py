@@ -0,0 +1,80 @@
+import time
+from unittest import TestCase
+from unittest.mock import patch, MagicMock
+
+from celery import Celery
+from celery.backends.redis import RedisBackend
+
+from kontainer.taskevents import get_task_event_bus, set_task_event_bus, wait_for_task, MemoryTaskEventBus
+from kontainer.taskexecutor import LocalTaskExecutor, CeleryTaskExecutor, set_task_executor, get_task_executor
+
+app = Celery("test_taskexecutor")
+
+
+@app.task(bind=True)
+def add_task(self, a, b):
+    get_task_executor().update_state(self, "PROGRESS", {"current": 1, "total": 1})
+    return a + b
+
+
+@app.task(bind=True)
+def fail_task(self):
+    raise ValueError("failed")
+
+
+class TestLocalTaskExecutor(TestCase):
+    def setUp(self):
+        self.executor = LocalTaskExecutor(max_workers=2, result_ttl=60)
+        set_task_executor(self.executor)
+
+    def tearDown(self):
+        self.executor.shutdown()
+        set_task_executor(None)
+
+    def _wait(self, task_id: str) -> dict:
+        deadline = time.time() + 5
+        while time.time() < deadline:
+            status = self.executor.get_status(task_id)
+            if status["state"] in ("SUCCESS", "FAILURE"):
+                return status
+            time.sleep(0.01)
+        self.fail(f"Task {task_id} did not finish")
+
+    def test_success(self):
+        task_id = self.executor.submit(add_task, args=[1, 2])
+        status = self._wait(task_id)
+        self.assertEqual("SUCCESS", status["state"])
+        self.assertEqual(3, status["info"])
+        self.assertEqual(add_task.name, status["task_name"])
+
+    def test_failure(self):
+        status = self._wait(self.executor.submit(fail_task, task_id="task-1"))
+        self.assertEqual("FAILURE", status["state"])
+        self.assertIsInstance(status["info"], ValueError)
+
+    def test_unknown_and_expired_tasks_are_pending(self):
+        self.assertEqual("PENDING", self.executor.get_status("unknown")["state"])
+
+        task_id = self.executor.submit(add_task, args=[1, 2])
+        self._wait(task_id)
+        self.executor.result_ttl = 0
+        time.sleep(0.01)
+        self.assertEqual("PENDING", self.executor.get_status(task_id)["state"])
+
+    def test_wait_without_redis(self):
+        # the redis url defaults to the broker url, but local tasks must not need a redis server
+        set_task_event_bus(None)
+        self.addCleanup(set_task_event_bus, None)
+        with patch("kontainer.settings.KONTAINER_TASK_EXECUTOR", "local"), \
+                patch("kontainer.settings.KONTAINER_REDIS_URL", "redis://127.0.0.1:1/0"):
+            self.assertIsInstance(get_task_event_bus(), MemoryTaskEventBus)
+            task_id = self.executor.submit(add_task, args=[1, 2])
+            self.assertTrue(wait_for_task(task_id, 5))
+
+
+class TestCeleryTaskExecutor(TestCase):
+    def test_get_statuses_of_no_tasks(self):
+        celery_app = MagicMock()
+        celery_app.backend = MagicMock(spec=RedisBackend)
+        self.assertEqual([], CeleryTaskExecutor(celery_app).get_statuses([]))
+        celery_app.backend.client.mget.assert_not_called()
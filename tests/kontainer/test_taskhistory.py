@@ -0,0 +1,42 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from kontainer.taskhistory import SqliteTaskHistory, get_task_identity
+
+
+class TestSqliteTaskHistory(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.history = SqliteTaskHistory(os.path.join(self.tmp.name, "tasks.db"), max_size=100)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _record(self, task_id: str, state: str, stack: str, created: float, **fields):
+        identity = get_task_identity("kontainer.stacks.tasks.stack_start_task", ["local", stack])
+        identity["created"] = created
+        self.history.record(task_id, state, identity, **fields)
+
+    def test_list_by_stack_and_state(self):
+        self._record("t1", "PENDING", "s1", 1.0)
+        self._record("t2", "PENDING", "s2", 2.0)
+        self._record("t1", "SUCCESS", "s1", 3.0, finished=3.0)
+
+        tasks = self.history.list(ctx_id="local", stack="s1")
+        self.assertEqual(["t1"], [t["task_id"] for t in tasks])
+        self.assertEqual("SUCCESS", tasks[0]["state"])
+        # created is set by the first event
+        self.assertEqual(1.0, tasks[0]["created"])
+
+        self.assertEqual(["t2"], [t["task_id"] for t in self.history.list(state="PENDING")])
+        self.assertEqual(["t2", "t1"], [t["task_id"] for t in self.history.list(task_type="stack_start_task")])
+
+    def test_pending_does_not_override_later_state(self):
+        self._record("t1", "STARTED", "s1", 1.0)
+        self._record("t1", "PENDING", "s1", 2.0)
+        self.assertEqual("STARTED", self.history.list()[0]["state"])
+
+    def test_task_identity(self):
+        identity = get_task_identity("kontainer.stacks.tasks.repository_sync_task", ["local", "https://example.com/r"])
+        self.assertEqual(("repository_sync_task", "local", None), (identity["type"], identity["ctx_id"], identity["stack"]))
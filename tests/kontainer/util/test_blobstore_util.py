@@ -0,0 +1,34 @@
+import tempfile
+from unittest import TestCase
+
+from kontainer.util.blobstore_util import FileBlobStore, BlobNotFoundError, iter_range
+
+
+class TestFileBlobStore(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = FileBlobStore(self.tmp.name)
+        self.data = b"".join(f"line {i}\n".encode() for i in range(20000))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_put_and_read_range(self):
+        self.assertEqual(len(self.data), self.store.put("task-1", self.data))
+        self.assertTrue(self.store.exists("task-1"))
+        self.assertEqual(len(self.data), self.store.size("task-1"))
+        self.assertEqual(["task-1"], [key for key, _ in self.store.list()])
+
+        with self.store.open("task-1") as f:
+            self.assertEqual(self.data[100000:100123], b"".join(iter_range(f, 100000, 123, chunk_size=50)))
+
+    def test_delete(self):
+        self.store.put("task-1", self.data)
+        self.store.delete("task-1")
+        self.assertFalse(self.store.exists("task-1"))
+        with self.assertRaises(BlobNotFoundError):
+            self.store.open("task-1")
+
+    def test_invalid_key(self):
+        with self.assertRaises(ValueError):
+            self.store.put("../task-1", self.data)
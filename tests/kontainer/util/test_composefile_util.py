@@ -0,0 +1,32 @@
+from unittest import TestCase
+
+from kontainer.util.composefile_util import get_compose_service_dependencies, group_services_by_dependencies, \
+    parse_compose_depends_on_label
+
+
+class TestComposeServiceDependencies(TestCase):
+    def test_get_compose_service_dependencies(self):
+        compose_data = {
+            "services": {
+                "web": {"depends_on": ["api"]},
+                "api": {"depends_on": {"db": {"condition": "service_healthy"}}},
+                "db": {},
+            }
+        }
+        dependencies = get_compose_service_dependencies(compose_data)
+        self.assertEqual({"web": {"api"}, "api": {"db"}, "db": set()}, dependencies)
+
+    def test_parse_compose_depends_on_label(self):
+        label = "db:service_started:false,redis:service_healthy:true"
+        self.assertEqual({"db", "redis"}, parse_compose_depends_on_label(label))
+        self.assertEqual(set(), parse_compose_depends_on_label(""))
+
+    def test_group_services_by_dependencies(self):
+        dependencies = {"web": {"api"}, "api": {"db", "cache"}, "db": set(), "cache": {"unknown"}, "worker": {"db"}}
+        levels = group_services_by_dependencies(dependencies)
+        self.assertEqual([["cache", "db"], ["api", "worker"], ["web"]], levels)
+
+    def test_group_services_with_circular_dependencies(self):
+        dependencies = {"a": {"b"}, "b": {"a"}, "c": set()}
+        levels = group_services_by_dependencies(dependencies)
+        self.assertEqual([["c"], ["a", "b"]], levels)
@@ -0,0 +1,38 @@
+import json
+import os
+import tempfile
+from unittest import TestCase
+
+from kontainer.util.jsonscan_util import iter_json_array_entries, read_json_entry
+
+
+class TestIterJsonArrayEntries(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.entries = [{"title": f"Äpp {i}", "n": i, "nested": {"templates": [i]}} for i in range(50)]
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _write(self, data) -> str:
+        path = os.path.join(self.tmp.name, "catalog.json")
+        with open(path, "w") as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+        return path
+
+    def test_entries_of_keyed_array(self):
+        path = self._write({"version": "2", "meta": {"templates": []}, "count": 50, "templates": self.entries})
+        result = list(iter_json_array_entries(path, "templates"))
+        self.assertEqual(self.entries, [entry for _, _, entry in result])
+
+        offset, length, entry = result[42]
+        self.assertEqual(entry, read_json_entry(path, offset, length))
+
+    def test_entries_of_top_level_array(self):
+        path = self._write(self.entries)
+        self.assertEqual(self.entries, [entry for _, _, entry in iter_json_array_entries(path)])
+
+    def test_missing_key(self):
+        path = self._write({"version": "2"})
+        with self.assertRaises(ValueError):
+            list(iter_json_array_entries(path, "templates"))
@@ -0,0 +1,198 @@
+import os
+import socket
+import tempfile
+import threading
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+import paramiko
+
+from kontainer.util.remote_utils import SSHTransportPool, stream_ssh_command, fanout_ssh_command, FANOUT_OUTPUT_MAX
+
+
+class FakeSSHTransportPool(SSHTransportPool):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.connected = []
+
+    def _connect(self, hostname, port, username, password=None, pkey=None):
+        transport = MagicMock()
+        transport.is_active.return_value = True
+        self.connected.append(transport)
+        return transport
+
+
+class TestSSHTransportPool(TestCase):
+    def setUp(self):
+        self.pool = FakeSSHTransportPool(max_channels=2, idle_timeout=300, keepalive=30, connect_timeout=5)
+        self.config = {"hostname": "host1", "username": "user"}
+
+    def test_channels_share_transports_up_to_max_channels(self):
+        with self.pool.channel(**self.config):
+            with self.pool.channel(**self.config):
+                self.assertEqual(1, len(self.pool.connected))
+                with self.pool.channel(**self.config):
+                    self.assertEqual(2, len(self.pool.connected))
+        with self.pool.channel(**self.config):
+            self.assertEqual(2, len(self.pool.connected))
+        with self.pool.channel(hostname="host2", username="user"):
+            self.assertEqual(3, len(self.pool.connected))
+
+    def test_reconnect_broken_transport(self):
+        with self.pool.channel(**self.config):
+            pass
+        broken = self.pool.connected[0]
+        broken.open_session.side_effect = paramiko.SSHException("connection reset")
+
+        with self.pool.channel(**self.config) as channel:
+            self.assertIs(self.pool.connected[1].open_session.return_value, channel)
+        broken.close.assert_called_once()
+        self.assertEqual([self.pool.connected[1]], [p.transport for p in self.pool.transports[("host1", 22, "user", None)]])
+
+    def test_evict_idle_transports(self):
+        with self.pool.channel(**self.config):
+            pass
+        self.pool.idle_timeout = -1
+        self.pool.evict()
+        self.pool.connected[0].close.assert_called_once()
+        self.assertEqual({}, self.pool.transports)
+
+
+class _PublicKeyServer(paramiko.ServerInterface):
+    def __init__(self, accepted_key):
+        self.accepted_key = accepted_key
+
+    def check_auth_publickey(self, username, key):
+        return paramiko.AUTH_SUCCESSFUL if key == self.accepted_key else paramiko.AUTH_FAILED
+
+    def get_allowed_auths(self, username):
+        return "publickey"
+
+
+class TestDefaultKeyAuth(TestCase):
+    def test_connect_without_credentials_uses_default_key_files(self):
+        key = paramiko.ECDSAKey.generate()
+        key_dir = tempfile.mkdtemp()
+        key.write_private_key_file(os.path.join(key_dir, "id_ecdsa"))
+        paramiko.RSAKey.generate(1024).write_private_key_file(os.path.join(key_dir, "id_rsa"))
+
+        client_sock, server_sock = socket.socketpair()
+        server = paramiko.Transport(server_sock)
+        server.add_server_key(paramiko.RSAKey.generate(1024))
+        server.start_server(event=threading.Event(), server=_PublicKeyServer(key))
+        self.addCleanup(server.close)
+
+        agent = MagicMock()
+        agent.get_keys.return_value = []
+        pool = SSHTransportPool(max_channels=2, idle_timeout=300, keepalive=30, connect_timeout=5)
+        with patch("socket.create_connection", return_value=client_sock), \
+                patch("paramiko.Agent", return_value=agent), \
+                patch("kontainer.util.remote_utils.DEFAULT_PRIVATE_KEY_FILES",
+                      (os.path.join(key_dir, "id_rsa"), os.path.join(key_dir, "id_ecdsa"))):
+            transport = pool._connect("host1", 22, "user")
+        self.addCleanup(transport.close)
+        self.assertTrue(transport.is_authenticated())
+
+
+class _ExecServer(paramiko.ServerInterface):
+    def __init__(self, handler):
+        self.handler = handler
+
+    def check_auth_password(self, username, password):
+        return paramiko.AUTH_SUCCESSFUL
+
+    def get_allowed_auths(self, username):
+        return "password"
+
+    def check_channel_request(self, kind, chanid):
+        return paramiko.OPEN_SUCCEEDED
+
+    def check_channel_exec_request(self, channel, command):
+        threading.Thread(target=self.handler, args=(channel, command), daemon=True).start()
+        return True
+
+
+class TestStreamSSHCommand(TestCase):
+    def _connect(self, handler) -> paramiko.Transport:
+        client_sock, server_sock = socket.socketpair()
+        server = paramiko.Transport(server_sock)
+        server.add_server_key(paramiko.RSAKey.generate(1024))
+        server.start_server(event=threading.Event(), server=_ExecServer(handler))
+        client = paramiko.Transport(client_sock)
+        client.connect(username="user", password="secret")
+        self.addCleanup(client.close)
+        self.addCleanup(server.close)
+        return client
+
+    def test_large_output_on_both_streams(self):
+        def _handler(channel, command):
+            # more than the channel window on both streams, before the exit status
+            for _ in range(64):
+                channel.sendall(b"o" * 32 * 1024)
+                channel.sendall_stderr(b"e" * 32 * 1024)
+            channel.send_exit_status(3)
+            channel.close()
+
+        received = {"stdout": 0, "stderr": 0}
+
+        def _on_output(stream, data):
+            received[stream] += len(data)
+
+        exit_code = stream_ssh_command(self._connect(_handler), "cmd", _on_output, timeout=30)
+        self.assertEqual(3, exit_code)
+        self.assertEqual({"stdout": 64 * 32 * 1024, "stderr": 64 * 32 * 1024}, received)
+
+    def test_timeout(self):
+        def _handler(channel, command):
+            channel.sendall(b"started")
+
+        chunks = []
+        with self.assertRaises(socket.timeout):
+            stream_ssh_command(self._connect(_handler), "sleep", lambda stream, data: chunks.append(data), timeout=1)
+        self.assertEqual([b"started"], chunks)
+
+
+class TestFanoutSSHCommand(TestCase):
+    def test_concurrency_limit_and_per_host_results(self):
+        lock = threading.Lock()
+        running = {"now": 0, "max": 0}
+
+        def fake_stream(ssh_config, command, on_output, timeout=None, **kwargs):
+            with lock:
+                running["now"] += 1
+                running["max"] = max(running["max"], running["now"])
+            try:
+                threading.Event().wait(0.05)
+                if ssh_config["hostname"] == "down":
+                    raise paramiko.SSHException("connection refused")
+                if ssh_config["hostname"] == "slow":
+                    raise socket.timeout()
+                on_output("stdout", b"x" * (FANOUT_OUTPUT_MAX + 10))
+                on_output("stderr", b"warning")
+                return 0
+            finally:
+                with lock:
+                    running["now"] -= 1
+
+        targets = {f"ctx{i}": {"hostname": f"host{i}"} for i in range(5)}
+        targets.update(down={"hostname": "down"}, slow={"hostname": "slow"})
+        reported = []
+        with patch("kontainer.util.remote_utils.stream_ssh_command", side_effect=fake_stream):
+            results = fanout_ssh_command(targets, "uptime", max_concurrency=3, timeout=5,
+                                         on_result=lambda target_id, result: reported.append(target_id))
+
+        self.assertEqual(3, running["max"])
+        self.assertEqual(sorted(targets.keys()), sorted(reported))
+        self.assertEqual(0, results["ctx0"]["exit_code"])
+        self.assertEqual(FANOUT_OUTPUT_MAX, len(results["ctx0"]["stdout"]))
+        self.assertTrue(results["ctx0"]["truncated"])
+        self.assertEqual("warning", results["ctx0"]["stderr"])
+        self.assertEqual("connection refused", results["down"]["error"])
+        self.assertEqual("Timed out after 5 seconds", results["slow"]["error"])
+        self.assertIsNone(results["slow"]["exit_code"])
+
+    def test_default_timeout(self):
+        with patch("kontainer.util.remote_utils.stream_ssh_command", return_value=0) as stream, \
+                patch("kontainer.settings.KONTAINER_FANOUT_TIMEOUT", 42):
+            fanout_ssh_command({"ctx1": {"hostname": "host1"}}, "uptime")
+        self.assertEqual(42, stream.call_args.kwargs["timeout"])
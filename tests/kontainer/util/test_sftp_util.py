@@ -0,0 +1,139 @@
+import os
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+from unittest import TestCase
+from unittest.mock import patch
+
+from kontainer.util.sftp_util import build_manifest, sync_directory, REMOTE_MANIFEST
+
+
+class TestBuildManifest(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        root = self.tmp.name
+        os.makedirs(os.path.join(root, "sub"))
+        os.makedirs(os.path.join(root, ".git"))
+        for path, content in (("a.txt", "a"), ("sub/b.sh", "b"), (".git/HEAD", "ref"), (REMOTE_MANIFEST, "{}")):
+            with open(os.path.join(root, path), "w") as f:
+                f.write(content)
+        os.chmod(os.path.join(root, "sub/b.sh"), 0o755)
+
+    def test_manifest(self):
+        manifest = build_manifest(self.tmp.name)
+        self.assertEqual(["a.txt", "sub/b.sh"], sorted(manifest.keys()))
+        self.assertEqual(0o755, manifest["sub/b.sh"]["mode"])
+        self.assertEqual(1, manifest["a.txt"]["size"])
+
+    def test_changed_content_changes_the_hash(self):
+        before = build_manifest(self.tmp.name)["a.txt"]["sha256"]
+        path = os.path.join(self.tmp.name, "a.txt")
+        with open(path, "w") as f:
+            f.write("changed")
+        self.assertNotEqual(before, build_manifest(self.tmp.name)["a.txt"]["sha256"])
+
+
+class FakeSFTPClient:
+    """
+    SFTP client on a local directory, which records the write operations.
+    """
+
+    def __init__(self, root: str, ops: list, lock: threading.Lock):
+        self.root = root
+        self.ops = ops
+        self.lock = lock
+
+    def _path(self, path):
+        return os.path.join(self.root, path)
+
+    def _record(self, *op):
+        with self.lock:
+            self.ops.append(op)
+
+    def open(self, path, mode="r"):
+        if "w" in mode:
+            # paramiko files accept str and bytes
+            self._record("write", path)
+            return open(self._path(path), mode)
+        return open(self._path(path), mode + "b")
+
+    def stat(self, path):
+        return os.stat(self._path(path))
+
+    def mkdir(self, path):
+        os.mkdir(self._path(path))
+
+    def put(self, local_path, remote_path):
+        self._record("put", remote_path)
+        shutil.copyfile(local_path, self._path(remote_path))
+
+    def chmod(self, path, mode):
+        os.chmod(self._path(path), mode)
+
+    def posix_rename(self, old_path, new_path):
+        self._record("rename", old_path, new_path)
+        os.replace(self._path(old_path), self._path(new_path))
+
+    def remove(self, path):
+        self._record("remove", path)
+        os.remove(self._path(path))
+
+
+class TestSyncDirectory(TestCase):
+    def setUp(self):
+        self.local = tempfile.mkdtemp()
+        self.remote = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.local)
+        self.addCleanup(shutil.rmtree, self.remote)
+        self.ops = []
+        lock = threading.Lock()
+
+        @contextmanager
+        def _sftp_client(ssh_config, timeout=None):
+            yield FakeSFTPClient(self.remote, self.ops, lock)
+
+        patcher = patch("kontainer.util.sftp_util.sftp_client", _sftp_client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        os.makedirs(os.path.join(self.local, "sub"))
+        for path, content in (("a.txt", "a"), ("sub/b.sh", "b"), ("c.txt", "c")):
+            self._write(self.local, path, content)
+
+    @staticmethod
+    def _write(root, path, content):
+        with open(os.path.join(root, path), "w") as f:
+            f.write(content)
+
+    def _sync(self) -> dict:
+        self.ops.clear()
+        return sync_directory({"hostname": "host1"}, self.local, "app")
+
+    def test_only_changes_are_sent(self):
+        result = self._sync()
+        self.assertEqual((3, 0), (result["uploaded"], result["deleted"]))
+        # uploaded to a temporary file and renamed, the manifest is written last
+        self.assertIn(("rename", "app/sub/b.sh.kontainer-tmp", "app/sub/b.sh"), self.ops)
+        self.assertEqual(("rename", f"app/{REMOTE_MANIFEST}.kontainer-tmp", f"app/{REMOTE_MANIFEST}"), self.ops[-1])
+
+        # data written on the remote host, e.g. by a container, is not part of the manifest
+        self._write(self.remote, "app/data.db", "data")
+        self._write(self.local, "a.txt", "changed")
+        os.chmod(os.path.join(self.local, "sub/b.sh"), 0o755)
+        os.remove(os.path.join(self.local, "c.txt"))
+
+        result = self._sync()
+        self.assertEqual((2, 1), (result["uploaded"], result["deleted"]))
+        self.assertEqual({"app/a.txt.kontainer-tmp", "app/sub/b.sh.kontainer-tmp"},
+                         {op[1] for op in self.ops if op[0] == "put"})
+        self.assertEqual([("remove", "app/c.txt")], [op for op in self.ops if op[0] == "remove"])
+        with open(os.path.join(self.remote, "app/a.txt")) as f:
+            self.assertEqual("changed", f.read())
+        self.assertEqual(0o755, os.stat(os.path.join(self.remote, "app/sub/b.sh")).st_mode & 0o777)
+        self.assertTrue(os.path.exists(os.path.join(self.remote, "app/data.db")))
+
+        result = self._sync()
+        self.assertEqual((0, 0), (result["uploaded"], result["deleted"]))
+        self.assertEqual([], self.ops)
@@ -0,0 +1,61 @@
+import os
+import tempfile
+from unittest import TestCase
+from unittest.mock import patch
+
+from kontainer.util import template_util
+from kontainer.util.template_util import render_template_dir
+
+
+class TestRenderTemplateDir(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.template_dir = os.path.join(self.tmp.name, "template")
+        self.dest_dir = os.path.join(self.tmp.name, "dest")
+        os.makedirs(os.path.join(self.template_dir, "assets"))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _write(self, rel_path, content: bytes):
+        with open(os.path.join(self.template_dir, rel_path), "wb") as f:
+            f.write(content)
+
+    def _read(self, rel_path) -> bytes:
+        with open(os.path.join(self.dest_dir, rel_path), "rb") as f:
+            return f.read()
+
+    def test_render_placeholders(self):
+        self._write("docker-compose.yml", b"image: {{ image }}:{{tag}}\nport: {{ port }}\nkeep: {{ unknown }}\n")
+        render_template_dir(self.template_dir, self.dest_dir, {"image": "nginx", "tag": "1.25", "port": 8080})
+        self.assertEqual(b"image: nginx:1.25\nport: 8080\nkeep: {{ unknown }}\n", self._read("docker-compose.yml"))
+
+    def test_streamed_and_cached_rendering_are_the_same(self):
+        self._write("app.yml", b"image: {{image}}\nkeep: {{unknown}} {{  other  }}\n")
+        expected = b"image: nginx\nkeep: {{unknown}} {{  other  }}\n"
+        render_template_dir(self.template_dir, self.dest_dir, {"image": "nginx"})
+        self.assertEqual(expected, self._read("app.yml"))
+
+        template_util.compiled_template_cache.clear()
+        self.addCleanup(template_util.compiled_template_cache.clear)
+        with patch.object(template_util, "STREAM_THRESHOLD", 0):
+            render_template_dir(self.template_dir, self.dest_dir, {"image": "nginx"})
+        self.assertIsNone(template_util.compile_template_file(os.path.join(self.template_dir, "app.yml")).segments)
+        self.assertEqual(expected, self._read("app.yml"))
+
+    def test_cache_is_bounded(self):
+        with patch.object(template_util, "COMPILED_TEMPLATE_CACHE_SIZE", 2):
+            for i in range(4):
+                self._write(f"file{i}.txt", b"{{ x }}")
+            render_template_dir(self.template_dir, self.dest_dir, {"x": 1})
+            self.assertEqual(2, len(template_util.compiled_template_cache))
+
+    def test_binary_and_static_files_are_copied(self):
+        binary = b"\x89PNG\r\n\x00{{ image }}\xff"
+        self._write("assets/logo.png", binary)
+        self._write("assets/static.txt", b"no placeholders")
+        rendered = render_template_dir(self.template_dir, self.dest_dir, {"image": "nginx"})
+        self.assertEqual(binary, self._read("assets/logo.png"))
+        self.assertEqual(b"no placeholders", self._read("assets/static.txt"))
+        self.assertEqual(sorted([os.path.join("assets", "logo.png"), os.path.join("assets", "static.txt")]),
+                         sorted(rendered))